@@ -7,12 +7,173 @@ load_dotenv(
     override=True,
 )
 
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-3.1-pro-preview")
 GEMINI_IMAGE_MODEL = os.getenv("GEMINI_IMAGE_MODEL", "gemini-3-pro-image-preview")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# Most image alternatives requested per upstream call (candidateCount); 1 for
+# models that do not support multiple candidates.
+GEMINI_IMAGE_MAX_CANDIDATES = int(os.getenv("GEMINI_IMAGE_MAX_CANDIDATES", "4"))
 VEO_API_KEY = os.getenv("VEO_API_KEY", GEMINI_API_KEY)
 VEO_MODEL = os.getenv("VEO_MODEL", "veo-3.1-generate-preview")
 VEO_BASE_URL = os.getenv("VEO_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
 
+# Optional JSON file remembering which generateContent payload variant each model accepts.
+GEMINI_VARIANT_CACHE_PATH = os.getenv("GEMINI_VARIANT_CACHE_PATH", "")
+
+# Text bundle cache shared by /v1/constraints, /v1/hexcodes, /v1/summary and /v1/veo.
+TEXT_BUNDLE_CACHE_TTL_SEC = float(os.getenv("TEXT_BUNDLE_CACHE_TTL_SEC", "900"))
+TEXT_BUNDLE_CACHE_MAX_ENTRIES = int(os.getenv("TEXT_BUNDLE_CACHE_MAX_ENTRIES", "256"))
+
+# Shared Veo operation poller: adaptive intervals under a global read budget.
+VEO_POLL_MAX_RPS = float(os.getenv("VEO_POLL_MAX_RPS", "2"))
+VEO_POLL_MIN_INTERVAL_SEC = float(os.getenv("VEO_POLL_MIN_INTERVAL_SEC", "2"))
+VEO_POLL_MAX_INTERVAL_SEC = float(os.getenv("VEO_POLL_MAX_INTERVAL_SEC", "20"))
+VEO_EXPECTED_RENDER_SEC = float(os.getenv("VEO_EXPECTED_RENDER_SEC", "75"))
+VEO_DOWNLOAD_MAX_RESUMES = int(os.getenv("VEO_DOWNLOAD_MAX_RESUMES", "3"))
+
+# Background Veo job engine (POST /v1/veo/jobs).
+VEO_JOB_MAX_WAIT_SEC = float(os.getenv("VEO_JOB_MAX_WAIT_SEC", "900"))
+VEO_JOB_RETENTION = int(os.getenv("VEO_JOB_RETENTION", "200"))
+# Job snapshots shared by every worker on the host (any worker can serve a job).
+VEO_JOB_STORE_PATH = os.getenv(
+    "VEO_JOB_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "veo_jobs.sqlite3"),
+)
+
+# Directory served under /static; generated media lives in its generated/ subdirectory.
+STATIC_DIR = os.getenv("STATIC_DIR", os.path.join(os.path.dirname(__file__), "..", "static"))
+
+# Content-addressed store for generated media (static/generated).
+ASSET_INDEX_PATH = os.getenv(
+    "ASSET_INDEX_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "assets.sqlite3"),
+)
+ASSET_STORE_MAX_BYTES = int(os.getenv("ASSET_STORE_MAX_BYTES", str(5 * 1024**3)))
+ASSET_STORE_MAX_AGE_SEC = float(os.getenv("ASSET_STORE_MAX_AGE_DAYS", "30")) * 86400
+ASSET_STORE_GC_INTERVAL_SEC = float(os.getenv("ASSET_STORE_GC_INTERVAL_SEC", "300"))
+# Served assets are marked as used in batches, at most this often.
+ASSET_ACCESS_FLUSH_SEC = float(os.getenv("ASSET_ACCESS_FLUSH_SEC", "60"))
+
+# WebP preview renditions of generated images (needs Pillow; skipped without it).
+# Rendered in a process pool after each image is stored, or on first request.
+RENDITIONS_ENABLED = _env_bool("RENDITIONS_ENABLED", True)
+RENDITION_THUMB_PX = int(os.getenv("RENDITION_THUMB_PX", "256"))
+RENDITION_MEDIUM_PX = int(os.getenv("RENDITION_MEDIUM_PX", "1024"))
+RENDITION_WEBP_QUALITY = int(os.getenv("RENDITION_WEBP_QUALITY", "80"))
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "2"))
+
+# Finished Veo renders by prompt package (Veo prompt + reference image hashes),
+# so an identical /v1/veo request reuses the staged MP4 instead of re-rendering.
+VEO_RENDER_CACHE_ENABLED = _env_bool("VEO_RENDER_CACHE_ENABLED", True)
+VEO_RENDER_CACHE_PATH = os.getenv(
+    "VEO_RENDER_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "veo_renders.sqlite3"),
+)
+VEO_RENDER_CACHE_MAX_BYTES = int(os.getenv("VEO_RENDER_CACHE_MAX_BYTES", str(2 * 1024**3)))
+VEO_RENDER_CACHE_MAX_AGE_SEC = float(os.getenv("VEO_RENDER_CACHE_MAX_AGE_DAYS", "7")) * 86400
+
+# Encoded reference images (Veo referenceImages / Gemini inlineData).
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", str(64 * 1024**2)))
+
+# Plan store: "memory" (per process) or "sqlite" (shared by workers on one host).
+PLAN_STORE_BACKEND = os.getenv("PLAN_STORE_BACKEND", "memory").strip().lower()
+PLAN_STORE_PATH = os.getenv(
+    "PLAN_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "plans.sqlite3"),
+)
+PLAN_STORE_MAX_PLANS = int(os.getenv("PLAN_STORE_MAX_PLANS", "1000"))
+PLAN_TTL_SEC = float(os.getenv("PLAN_TTL_SEC", "86400"))
+PLAN_SWEEP_INTERVAL_SEC = float(os.getenv("PLAN_SWEEP_INTERVAL_SEC", "600"))
+
+# Cross-process result cache + single-flight lock (one SQLite file per host).
+SHARED_CACHE_ENABLED = _env_bool("SHARED_CACHE_ENABLED", True)
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "shared_cache.sqlite3"),
+)
+SHARED_CACHE_LEASE_SEC = float(os.getenv("SHARED_CACHE_LEASE_SEC", "30"))
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "5000"))
+# Identical image prompts / Veo requests within these windows share one result.
+IMAGE_RESULT_CACHE_TTL_SEC = float(os.getenv("IMAGE_RESULT_CACHE_TTL_SEC", "60"))
+VEO_START_DEDUP_TTL_SEC = float(os.getenv("VEO_START_DEDUP_TTL_SEC", "300"))
+VEO_DOWNLOAD_CACHE_TTL_SEC = float(os.getenv("VEO_DOWNLOAD_CACHE_TTL_SEC", "86400"))
+# Idempotency-Key records for generation POSTs: a retry with the same key joins
+# the original request or replays its response. Kept in their own SQLite file, so
+# they work with SHARED_CACHE_ENABLED=0 and are not evicted by cache churn.
+IDEMPOTENCY_TTL_SEC = float(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+IDEMPOTENCY_STORE_PATH = os.getenv(
+    "IDEMPOTENCY_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "idempotency.sqlite3"),
+)
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+# POST /v1/batch: prompts per call, image variants per section, and how many
+# upstream work units (text bundles, image sets) run at once per batch.
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "32"))
+BATCH_MAX_VARIANTS = int(os.getenv("BATCH_MAX_VARIANTS", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Upstream admission control: per operation (and per model) concurrency and
+# start-rate limits, plus a bounded priority queue that sheds load with 503.
+UPSTREAM_LIMITS = {
+    "gemini_text": {
+        "concurrency": int(os.getenv("GEMINI_TEXT_MAX_CONCURRENCY", "8")),
+        "rps": float(os.getenv("GEMINI_TEXT_MAX_RPS", "5")),
+    },
+    "gemini_image": {
+        "concurrency": int(os.getenv("GEMINI_IMAGE_MAX_CONCURRENCY", "4")),
+        "rps": float(os.getenv("GEMINI_IMAGE_MAX_RPS", "2")),
+    },
+    "veo_start": {
+        "concurrency": int(os.getenv("VEO_START_MAX_CONCURRENCY", "2")),
+        "rps": float(os.getenv("VEO_START_MAX_RPS", "0.5")),
+    },
+    # Poll pacing is handled by the Veo poller (VEO_POLL_MAX_RPS).
+    "veo_poll": {
+        "concurrency": int(os.getenv("VEO_POLL_MAX_CONCURRENCY", "4")),
+        "rps": 0.0,
+    },
+}
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "32"))
+UPSTREAM_QUEUE_TIMEOUT_SEC = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SEC", "30"))
+
+# Upstream resilience: classified retries with jittered backoff, optional hedging
+# of idempotent text calls past their p95 latency, per-model circuit breakers.
+UPSTREAM_RETRY_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_MAX_ATTEMPTS", "3"))
+UPSTREAM_RETRY_BASE_DELAY_SEC = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY_SEC", "0.5"))
+UPSTREAM_RETRY_MAX_DELAY_SEC = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY_SEC", "8"))
+UPSTREAM_RETRY_MAX_RETRY_AFTER_SEC = float(os.getenv("UPSTREAM_RETRY_MAX_RETRY_AFTER_SEC", "30"))
+UPSTREAM_HEDGE_ENABLED = _env_bool("UPSTREAM_HEDGE_ENABLED")
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_HEDGE_MIN_DELAY_SEC = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY_SEC", "1"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT_SEC = float(os.getenv("CIRCUIT_RESET_TIMEOUT_SEC", "30"))
+
+# Shared upstream HTTP client pools (see services/clients.py).
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+VEO_MAX_CONNECTIONS = int(os.getenv("VEO_MAX_CONNECTIONS", "16"))
+HTTP_KEEPALIVE_EXPIRY_SEC = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SEC", "90"))
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED")
+
+# Record/replay of upstream traffic (see services/cassette.py):
+# off | record | replay | auto (replay if recorded, otherwise record).
+UPSTREAM_CASSETTE_MODE = os.getenv("UPSTREAM_CASSETTE_MODE", "off").strip().lower()
+UPSTREAM_CASSETTE_PATH = os.getenv(
+    "UPSTREAM_CASSETTE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "cassettes"),
+)
+# Replay timing multiplier: 1 = original timing, 0 = as fast as possible.
+UPSTREAM_CASSETTE_TIME_SCALE = float(os.getenv("UPSTREAM_CASSETTE_TIME_SCALE", "1"))
+
 if not GEMINI_API_KEY:
     raise RuntimeError("Missing GEMINI_API_KEY. Put it in backend/.env")
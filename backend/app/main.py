@@ -1,16 +1,38 @@
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.app.config import (
+    ASSET_ACCESS_FLUSH_SEC,
     GEMINI_API_KEY,
     GEMINI_IMAGE_MODEL,
     GEMINI_MODEL,
+    PLAN_SWEEP_INTERVAL_SEC,
+    STATIC_DIR,
     VEO_API_KEY,
     VEO_MODEL,
 )
+from backend.app.middleware import MetricsMiddleware
+from backend.app.routes.idempotency import idempotency_store
+from backend.app.static_files import MediaStaticFiles
+from backend.app.services.assets import asset_store
+from backend.app.services.clients import clients_info, close_clients, start_clients
+from backend.app.services.gemini import payload_variant_info, text_bundle_cache
+from backend.app.services.limiter import limiter_stats
+from backend.app.services.metrics import registry as metrics_registry
+from backend.app.services.references import reference_encoder
+from backend.app.services.renditions import renditions
+from backend.app.services.resilience import resilience_stats
+from backend.app.services.runtime_metrics import register_runtime_collectors
+from backend.app.services.shared_cache import shared_cache
+from backend.app.services.veo import veo_poller
+from backend.app.services.veo_jobs import veo_jobs
+from backend.app.services.veo_renders import veo_render_cache
+from backend.app.store import plan_store, sweep_plans
 from backend.app.routes.constraints import router as constraints_router
 from backend.app.routes.hexcodes import router as hexcodes_router
 from backend.app.routes.summary import router as summary_router
@@ -18,8 +40,54 @@ from backend.app.routes.moodboard import router as moodboard_router
 from backend.app.routes.storyboard import router as storyboard_router
 from backend.app.routes.veo import router as veo_router
 from backend.app.routes.final_image import router as final_image_router
+from backend.app.routes.batch import router as batch_router
+from backend.app.routes.starter import router as starter_router
+from backend.app.routes.renditions import router as renditions_router
 
-app = FastAPI()
+
+async def _sweep_plans_periodically() -> None:
+    while True:
+        await asyncio.sleep(PLAN_SWEEP_INTERVAL_SEC)
+        await asyncio.to_thread(sweep_plans)
+
+
+async def _flush_asset_access_periodically() -> None:
+    while True:
+        await asyncio.sleep(ASSET_ACCESS_FLUSH_SEC)
+        await asyncio.to_thread(asset_store.flush_access)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per upstream provider for the whole process lifetime.
+    await start_clients()
+    plan_sweeper = asyncio.create_task(_sweep_plans_periodically())
+    access_flusher = asyncio.create_task(_flush_asset_access_periodically())
+    try:
+        yield
+    finally:
+        plan_sweeper.cancel()
+        access_flusher.cancel()
+        await veo_jobs.shutdown()
+        await veo_poller.shutdown()
+        await renditions.shutdown()
+        await asyncio.to_thread(asset_store.flush_access)
+        await close_clients()
+        for store in (
+            veo_jobs.store,
+            asset_store,
+            plan_store,
+            shared_cache,
+            veo_render_cache,
+            idempotency_store,
+        ):
+            await asyncio.to_thread(store.close)
+
+
+app = FastAPI(lifespan=lifespan)
+
+register_runtime_collectors()
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,9 +104,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-static_dir = Path(__file__).resolve().parent.parent / "static"
+static_dir = Path(STATIC_DIR)
 static_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+app.mount("/static", MediaStaticFiles(directory=str(static_dir)), name="static")
 
 
 def _mask_key(key: str | None) -> str | None:
@@ -53,6 +121,16 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Collectors run on the event loop; read the SQLite-backed figures first.
+    await asyncio.to_thread(veo_render_cache.index_stats)
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.get("/debug/runtime-config")
 async def debug_runtime_config():
     return {
@@ -62,6 +140,19 @@ async def debug_runtime_config():
         "gemini_api_key_masked": _mask_key(GEMINI_API_KEY),
         "veo_api_key_masked": _mask_key(VEO_API_KEY),
         "same_key": GEMINI_API_KEY == VEO_API_KEY,
+        "text_bundle_cache": text_bundle_cache.stats(),
+        "shared_cache": shared_cache.stats(),
+        "idempotency_store": idempotency_store.stats(),
+        "http_clients": clients_info(),
+        "upstream_limiters": limiter_stats(),
+        "upstream_resilience": resilience_stats(),
+        "gemini_payload_variants": payload_variant_info(),
+        "veo_poller": veo_poller.stats(),
+        "asset_store": await asyncio.to_thread(asset_store.stats),
+        "veo_render_cache": await asyncio.to_thread(veo_render_cache.stats),
+        "reference_encoder": reference_encoder.stats(),
+        "renditions": renditions.stats(),
+        "plan_store": await asyncio.to_thread(plan_store.stats),
     }
 
 app.include_router(constraints_router)
@@ -71,3 +162,6 @@ app.include_router(moodboard_router)
 app.include_router(storyboard_router)
 app.include_router(veo_router)
 app.include_router(final_image_router)
+app.include_router(batch_router)
+app.include_router(starter_router)
+app.include_router(renditions_router)
@@ -0,0 +1,60 @@
+import json
+from typing import Literal
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.app.config import BATCH_MAX_CONCURRENCY, BATCH_MAX_PROMPTS, BATCH_MAX_VARIANTS
+from backend.app.services.batch import run_batch
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
+
+router = APIRouter()
+
+Section = Literal["constraints", "hexcodes", "summary", "moodboard", "storyboard"]
+
+
+class BatchIn(BaseModel):
+    prompts: list[str] = Field(min_length=1, max_length=BATCH_MAX_PROMPTS)
+    sections: list[Section] = Field(min_length=1)
+    # Alternative images per image section, from as few upstream calls as possible.
+    variants: int = Field(1, ge=1, le=BATCH_MAX_VARIANTS)
+    concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+
+
+def _ndjson_line(item: dict) -> str:
+    error = item.pop("error", None)
+    if error is not None:
+        http_error = upstream_http_error(error)
+        item["error"] = {
+            "status_code": http_error.status_code,
+            "detail": http_error.detail,
+            "retry_after": (http_error.headers or {}).get("Retry-After"),
+        }
+    return json.dumps(item) + "\n"
+
+
+@router.post("/v1/batch")
+async def batch(payload: BatchIn):
+    """
+    Streams one NDJSON line per (prompt, section) as it finishes, in completion
+    order, followed by a {"done": true, ...} summary line.
+    """
+    async def lines():
+        # Bulk work: interactive previews from other requests go first. Set here,
+        # where the work tasks are created, since the body is produced after return.
+        set_request_priority("standard")
+        async for item in run_batch(
+            payload.prompts,
+            list(payload.sections),
+            variants=payload.variants,
+            concurrency=payload.concurrency,
+        ):
+            yield _ndjson_line(item)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
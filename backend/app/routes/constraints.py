@@ -1,24 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from pydantic import BaseModel
 
-from backend.app.services.gemini import gemini_generate_text_bundle
+from backend.app.services.plans import BUNDLE_SECTIONS, resolve_bundle
+from backend.app.routes.errors import upstream_http_error
+from backend.app.routes.streaming import bundle_event_stream
+from backend.app.services.limiter import set_request_priority
 
 router = APIRouter()
 
 class PromptIn(BaseModel):
     prompt: str
+    plan_id: str | None = None
 
 @router.post("/v1/constraints")
 async def constraints(payload: PromptIn):
+    set_request_priority("interactive")
     try:
-        bundle = await gemini_generate_text_bundle(payload.prompt)
-
-        negatives = bundle.get("negatives")
-        if not isinstance(negatives, list) or not negatives:
-            raise ValueError("Gemini bundle missing required keys")
-
-        # Return a single prompt string for UI consumption.
-        return {"negatives": ", ".join(negatives)}
+        plan_id, bundle = await resolve_bundle(payload.prompt, payload.plan_id)
+        return {**BUNDLE_SECTIONS["constraints"](bundle), "plan_id": plan_id}
 
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise upstream_http_error(e)
+
+@router.post("/v1/constraints/stream")
+async def constraints_stream(payload: PromptIn):
+    return bundle_event_stream(payload.prompt, payload.plan_id, BUNDLE_SECTIONS["constraints"])
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+from backend.app.services.metrics import HTTP_CANCELLED
+
+T = TypeVar("T")
+
+# Not sent to anyone (the client is gone); shows up in access logs and metrics.
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has already been read, so the next message is the disconnect.
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Runs a handler's work until it finishes or the client disconnects. On
+    disconnect the work is cancelled and a 499 is raised. Upstream calls, polls
+    and downloads shared with other requests keep running while any of those
+    requests still wait on them.
+    """
+    task = asyncio.ensure_future(work)
+    disconnected = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not task.done():
+            task.cancel()
+        disconnected.cancel()
+    if task.done() and not task.cancelled():
+        return task.result()
+
+    await asyncio.gather(task, return_exceptions=True)
+    route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+    HTTP_CANCELLED.inc(method=request.method, route=route)
+    raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
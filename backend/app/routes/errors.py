@@ -0,0 +1,26 @@
+from fastapi import HTTPException
+
+from backend.app.services.limiter import UpstreamOverloaded
+from backend.app.services.pipeline import PipelineError
+from backend.app.services.plans import PlanNotFound, PlanPromptMismatch
+
+
+def upstream_http_error(error: Exception) -> HTTPException:
+    """
+    Maps a failed upstream call to an HTTP error: 503 + Retry-After when our own
+    admission control shed it, 404/409 for a plan_id that is unknown or belongs to
+    another prompt, 502 otherwise.
+    """
+    cause = error.error if isinstance(error, PipelineError) else error
+    detail = error.report() if isinstance(error, PipelineError) else str(error)
+    if isinstance(cause, UpstreamOverloaded):
+        return HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(cause.retry_after)},
+        )
+    if isinstance(cause, PlanNotFound):
+        return HTTPException(status_code=404, detail=detail)
+    if isinstance(cause, PlanPromptMismatch):
+        return HTTPException(status_code=409, detail=detail)
+    return HTTPException(status_code=502, detail=detail)
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, Request, Response
 from pydantic import BaseModel
 
 from backend.app.services.nanobanana import generate_and_store_image
+from backend.app.services.plans import plan_for_prompt, save_to_plan
+from backend.app.routes.idempotency import run_idempotent
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
 
 router = APIRouter()
 
@@ -13,6 +19,26 @@ class FinalImageIn(BaseModel):
     summary: str | None = None
     moodboard_url: str | None = None
     storyboard_url: str | None = None
+    plan_id: str | None = None
+
+
+def _fill_from_plan(payload: FinalImageIn, plan: dict) -> FinalImageIn:
+    """
+    Uses stored plan data for any section the client did not send.
+    """
+    bundle = plan.get("bundle") or {}
+    filled = {}
+    if not payload.constraints and isinstance(bundle.get("negatives"), list):
+        filled["constraints"] = ", ".join(bundle["negatives"])
+    if not payload.hexcodes and bundle.get("palette"):
+        filled["hexcodes"] = json.dumps(bundle["palette"])
+    if not payload.summary and bundle.get("summary"):
+        filled["summary"] = json.dumps(bundle["summary"])
+    if not payload.moodboard_url and plan.get("moodboard"):
+        filled["moodboard_url"] = plan["moodboard"]["image_url"]
+    if not payload.storyboard_url and plan.get("storyboard"):
+        filled["storyboard_url"] = plan["storyboard"]["image_url"]
+    return payload.model_copy(update=filled)
 
 
 def _build_final_image_prompt(payload: FinalImageIn) -> str:
@@ -39,14 +65,23 @@ def _build_final_image_prompt(payload: FinalImageIn) -> str:
 
 
 @router.post("/v1/final-image")
-async def final_image(payload: FinalImageIn):
+async def final_image(payload: FinalImageIn, request: Request, response: Response):
+    set_request_priority("final")
+    return await run_idempotent(request, response, payload, lambda: _final_image(payload))
+
+
+async def _final_image(payload: FinalImageIn) -> dict:
     try:
+        plan = await plan_for_prompt(payload.plan_id, payload.prompt)
+        if plan is not None:
+            payload = _fill_from_plan(payload, plan)
         prompt = _build_final_image_prompt(payload)
         image = await generate_and_store_image(
             prompt,
             prefix="final-image",
             description="Final generated image",
         )
+        await save_to_plan(payload.plan_id, {"final_image": image})
         return {"final_image": image}
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise upstream_http_error(e)
@@ -0,0 +1,77 @@
+import hashlib
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+
+from backend.app.config import (
+    IDEMPOTENCY_MAX_KEYS,
+    IDEMPOTENCY_STORE_PATH,
+    IDEMPOTENCY_TTL_SEC,
+    SHARED_CACHE_LEASE_SEC,
+)
+from backend.app.routes.disconnect import cancel_on_disconnect
+from backend.app.services.shared_cache import SharedCache
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_MAX_KEY_LENGTH = 255
+
+# Same lease/replay machinery as the shared cache, but always enabled: a client
+# that sends a key relies on it, whatever SHARED_CACHE_ENABLED says.
+idempotency_store = SharedCache(
+    Path(IDEMPOTENCY_STORE_PATH),
+    lease_sec=SHARED_CACHE_LEASE_SEC,
+    max_entries=IDEMPOTENCY_MAX_KEYS,
+)
+
+
+async def run_idempotent(
+    request: Request,
+    response: Response,
+    payload: BaseModel,
+    work: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Runs a generation request at most once per Idempotency-Key (per route).
+
+    A repeated key joins the original execution while it is running, on any
+    worker, and replays its response for IDEMPOTENCY_TTL_SEC afterwards (marked
+    with Idempotent-Replayed: true). Reusing a key with a different body is a
+    422. Failures are not recorded, so a retry after an error runs again.
+
+    With a key the work is not cancelled when the client disconnects: the client
+    has said it will retry, and the retry should find the result. Without one,
+    the request behaves as before.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return await cancel_on_disconnect(request, work())
+    if not key or len(key) > _MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} must be 1-{_MAX_KEY_LENGTH} characters",
+        )
+
+    fingerprint = hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+    executed = False
+
+    async def compute() -> dict:
+        nonlocal executed
+        executed = True
+        return {"fingerprint": fingerprint, "body": await work()}
+
+    record = await idempotency_store.get_or_compute(
+        idempotency_store.make_key("idempotency", [request.method, request.url.path, key]),
+        compute,
+        ttl_sec=IDEMPOTENCY_TTL_SEC,
+    )
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_HEADER} was already used with a different request body",
+        )
+    if not executed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return record["body"]
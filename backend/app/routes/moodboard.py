@@ -1,15 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Request, Response
 from pydantic import BaseModel
 
 from backend.app.services.nanobanana import build_moodboard_prompt, generate_and_store_image
+from backend.app.services.plans import save_to_plan
+from backend.app.routes.idempotency import run_idempotent
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
 
 router = APIRouter()
 
 class MoodboardIn(BaseModel):
     prompt: str
+    plan_id: str | None = None
 
 @router.post("/v1/moodboard")
-async def moodboard(payload: MoodboardIn):
+async def moodboard(payload: MoodboardIn, request: Request, response: Response):
+    set_request_priority("interactive")
+    return await run_idempotent(request, response, payload, lambda: _moodboard(payload))
+
+
+async def _moodboard(payload: MoodboardIn) -> dict:
     base = build_moodboard_prompt(payload.prompt)
 
     try:
@@ -18,7 +28,8 @@ async def moodboard(payload: MoodboardIn):
             prefix="moodboard",
             description="Moodboard image",
         )
+        await save_to_plan(payload.plan_id, {"moodboard": moodboard_image})
         return {"moodboard": moodboard_image}
 
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise upstream_http_error(e)
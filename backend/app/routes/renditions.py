@@ -0,0 +1,40 @@
+import asyncio
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+
+from backend.app.services.assets import asset_store
+from backend.app.services.renditions import renditions
+from backend.app.static_files import immutable_file_response
+
+router = APIRouter()
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+@router.get("/v1/renditions/{name}/{filename}")
+async def rendition(name: str, filename: str, request: Request):
+    """
+    Serves a WebP rendition of a generated image, rendering it on first use.
+    Falls back to a redirect to the original image when renditions are
+    unavailable (no Pillow) or the image cannot be rendered.
+    """
+    digest, _, ext = filename.partition(".")
+    if name not in renditions.sizes or ext != "webp" or not _SHA256.match(digest):
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+
+    path = None
+    if renditions.enabled:
+        try:
+            path = await renditions.ensure(name, digest)
+        except Exception:
+            path = None  # counted in renditions stats; serve the original instead
+    if path is not None:
+        asset_store.record_access(digest)  # a used preview keeps its source
+        return immutable_file_response(path, f'"{digest}-{name}"', request.headers, media_type="image/webp")
+
+    relpath = await asyncio.to_thread(asset_store.relpath_for, digest)
+    if relpath is None:
+        raise HTTPException(status_code=404, detail="Unknown image")
+    return RedirectResponse(asset_store.url_for(relpath), status_code=307)
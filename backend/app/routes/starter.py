@@ -0,0 +1,63 @@
+import json
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from backend.app.services.starter import run_starter
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
+
+router = APIRouter()
+
+class StarterIn(BaseModel):
+    prompt: str
+    plan_id: str | None = None
+
+
+def _serializable(event: dict) -> dict:
+    error = event.pop("error", None)
+    if error is not None:
+        http_error = upstream_http_error(error)
+        event["error"] = {
+            "status_code": http_error.status_code,
+            "detail": http_error.detail,
+            "retry_after": (http_error.headers or {}).get("Retry-After"),
+        }
+    return event
+
+
+def _sse(event: dict) -> str:
+    if "done" in event:
+        name = "done"
+    elif "section" not in event:
+        name = "plan"
+    elif event["status"] == "error":
+        name = "error"
+    else:
+        name = event["section"]
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.post("/v1/starter")
+async def starter(payload: StarterIn, request: Request):
+    """
+    All five starter sections (constraints, hexcodes, summary, moodboard,
+    storyboard) from one text bundle and two concurrent image generations,
+    streamed as each is ready. Server-sent events by default; NDJSON when the
+    client sends Accept: application/x-ndjson. The plan_id event identifies the
+    plan for later /v1/final-image and /v1/veo calls.
+    """
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+
+    async def body():
+        set_request_priority("interactive")
+        async for event in run_starter(payload.prompt, payload.plan_id):
+            event = _serializable(event)
+            yield json.dumps(event) + "\n" if ndjson else _sse(event)
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,47 @@
+import json
+from typing import Callable
+
+from fastapi.responses import StreamingResponse
+
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
+from backend.app.services.plans import stream_bundle
+
+
+def _event(name: str, data) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def bundle_event_stream(prompt: str, plan_id: str | None, shape: Callable[[dict], dict]) -> StreamingResponse:
+    """
+    SSE variant of a bundle route. Sends one event per bundle member (negatives,
+    palette, summary) as soon as it has been generated, then "done" with the same
+    body the non-streaming route returns, or "error" with its status and detail.
+    """
+
+    async def events():
+        set_request_priority("interactive")
+        bundle: dict = {}
+        try:
+            async for key, value in stream_bundle(prompt, plan_id):
+                if key == "plan_id":
+                    yield _event("done", {**shape(bundle), "plan_id": value})
+                    continue
+                bundle[key] = value
+                yield _event(key, value)
+        except Exception as e:
+            http_error = upstream_http_error(e)
+            yield _event(
+                "error",
+                {
+                    "status_code": http_error.status_code,
+                    "detail": http_error.detail,
+                    "retry_after": (http_error.headers or {}).get("Retry-After"),
+                },
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,22 +1,29 @@
 import asyncio
 import json
-from typing import Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from backend.app.services.gemini import gemini_generate_text_bundle
+from backend.app.routes.idempotency import run_idempotent
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import set_request_priority
+from backend.app.services.pipeline import Pipeline
 from backend.app.services.nanobanana import (
     build_moodboard_prompt,
     build_storyboard_prompt,
     generate_and_store_image,
-    static_image_url_to_veo_reference,
 )
+from backend.app.services.plans import plan_for_prompt, resolve_bundle, save_to_plan
+from backend.app.services.references import reference_encoder, resolve_static_path
 from backend.app.services.veo import (
-    veo_get_operation,
+    extract_video_url,
+    veo_poller,
     veo_start_generation,
     download_and_store_veo_video,
 )
+from backend.app.services.veo_jobs import veo_jobs
+from backend.app.services.veo_renders import veo_render_cache
 
 router = APIRouter()
 
@@ -24,32 +31,18 @@ router = APIRouter()
 class PromptIn(BaseModel):
     prompt: str
     wait: bool = False
+    # Ignored: polling is scheduled by the shared adaptive Veo poller.
     poll_interval_sec: int = 10
     max_wait_sec: int = 180
+    plan_id: str | None = None
+    # Render again even if an identical prompt package was already rendered.
+    force: bool = False
 
 
-def _collect_candidate_urls(node: Any, out: list[str]) -> None:
-    if isinstance(node, dict):
-        for k, v in node.items():
-            key = str(k).lower()
-            if isinstance(v, str) and key in {"uri", "videouri", "downloaduri"} and v.startswith("http"):
-                out.append(v)
-            _collect_candidate_urls(v, out)
-    elif isinstance(node, list):
-        for item in node:
-            _collect_candidate_urls(item, out)
-
-
-def _extract_video_url(operation: dict) -> str | None:
-    candidates: list[str] = []
-    _collect_candidate_urls(operation, candidates)
-    if not candidates:
-        return None
-    for url in candidates:
-        lower = url.lower()
-        if ".mp4" in lower or ":download" in lower or "/download/" in lower:
-            return url
-    return candidates[0]
+class VeoJobIn(BaseModel):
+    prompt: str
+    plan_id: str | None = None
+    force: bool = False
 
 
 def _build_veo_prompt(
@@ -75,13 +68,35 @@ def _build_veo_prompt(
     )
 
 
-@router.post("/v1/veo")
-async def veo_input(payload: PromptIn):
+async def _reusable_image(plan: dict | None, key: str) -> dict | None:
+    image = (plan or {}).get(key)
+    if not isinstance(image, dict) or not image.get("image_url"):
+        return None
     try:
-        bundle = await gemini_generate_text_bundle(payload.prompt)
-        negatives_list = bundle.get("negatives")
-        hexcodes = bundle.get("palette")
-        summary = bundle.get("summary")
+        await asyncio.to_thread(resolve_static_path, image["image_url"])
+    except ValueError:
+        return None  # evicted from the asset store; regenerate
+    return image
+
+
+def _veo_prepare_pipeline(prompt: str, plan_id: str | None = None) -> Pipeline:
+    """
+    Stages that turn a user prompt into a Veo request. The text bundle and both
+    reference images only depend on the prompt, so they run concurrently. Sections
+    already stored in the plan are reused instead of regenerated.
+    """
+
+    async def plan() -> dict | None:
+        return await plan_for_prompt(plan_id, prompt)
+
+    async def bundle(plan: dict | None) -> dict:
+        if plan is not None and isinstance(plan.get("bundle"), dict):
+            used_plan_id, data = plan_id, plan["bundle"]
+        else:
+            used_plan_id, data = await resolve_bundle(prompt)
+        negatives_list = data.get("negatives")
+        hexcodes = data.get("palette")
+        summary = data.get("summary")
 
         if not isinstance(negatives_list, list) or not negatives_list:
             raise ValueError("Gemini bundle missing negatives")
@@ -90,83 +105,234 @@ async def veo_input(payload: PromptIn):
         if not isinstance(summary, dict):
             raise ValueError("Gemini bundle missing summary")
 
-        negatives = ", ".join(negatives_list)
+        return {
+            "plan_id": used_plan_id,
+            "negatives": ", ".join(negatives_list),
+            "hexcodes": hexcodes,
+            "summary": summary,
+        }
 
-        moodboard_task = generate_and_store_image(
-            build_moodboard_prompt(payload.prompt),
+    async def moodboard(plan: dict | None) -> dict:
+        stored = await _reusable_image(plan, "moodboard")
+        if stored is not None:
+            return stored
+        return await generate_and_store_image(
+            build_moodboard_prompt(prompt),
             prefix="moodboard",
             description="Moodboard image",
         )
-        storyboard_task = generate_and_store_image(
-            build_storyboard_prompt(payload.prompt),
+
+    async def storyboard(plan: dict | None) -> dict:
+        stored = await _reusable_image(plan, "storyboard")
+        if stored is not None:
+            return stored
+        return await generate_and_store_image(
+            build_storyboard_prompt(prompt),
             prefix="storyboard",
             description="Storyboard image",
         )
-        moodboard, storyboard = await asyncio.gather(moodboard_task, storyboard_task)
 
-        veo_prompt = _build_veo_prompt(
-            user_prompt=payload.prompt,
-            negatives=negatives,
-            hexcodes=hexcodes,
-            summary=summary,
+    async def veo_prompt(bundle: dict, moodboard: dict, storyboard: dict) -> str:
+        return _build_veo_prompt(
+            user_prompt=prompt,
+            negatives=bundle["negatives"],
+            hexcodes=bundle["hexcodes"],
+            summary=bundle["summary"],
             moodboard=moodboard,
             storyboard=storyboard,
         )
 
-        reference_images = [
-            static_image_url_to_veo_reference(moodboard["image_url"], reference_type="asset"),
-            static_image_url_to_veo_reference(storyboard["image_url"], reference_type="style"),
-        ]
+    async def references(moodboard: dict, storyboard: dict) -> list[dict]:
+        return list(
+            await asyncio.gather(
+                reference_encoder.veo_reference(moodboard["image_url"], reference_type="asset"),
+                reference_encoder.veo_reference(storyboard["image_url"], reference_type="style"),
+            )
+        )
+
+    async def render_key(veo_prompt: str, moodboard: dict, storyboard: dict) -> str:
+        images = await asyncio.gather(
+            reference_encoder.encode(moodboard["image_url"]),
+            reference_encoder.encode(storyboard["image_url"]),
+        )
+        return veo_render_cache.render_key(veo_prompt, [image.sha256 for image in images])
+
+    async def save(bundle: dict, moodboard: dict, storyboard: dict) -> None:
+        await save_to_plan(bundle["plan_id"], {"moodboard": moodboard, "storyboard": storyboard})
+
+    return (
+        Pipeline("veo")
+        .stage("plan", plan)
+        .stage("bundle", bundle, deps=("plan",))
+        .stage("moodboard", moodboard, deps=("plan",))
+        .stage("storyboard", storyboard, deps=("plan",))
+        .stage("veo_prompt", veo_prompt, deps=("bundle", "moodboard", "storyboard"))
+        .stage("references", references, deps=("moodboard", "storyboard"))
+        .stage("render_key", render_key, deps=("veo_prompt", "moodboard", "storyboard"))
+        .stage("save", save, deps=("bundle", "moodboard", "storyboard"))
+    )
+
+
+def _veo_inputs(outputs: dict) -> dict:
+    bundle = outputs["bundle"]
+    return {
+        "negatives": bundle["negatives"],
+        "hexcodes": bundle["hexcodes"],
+        "summary": bundle["summary"],
+        "moodboard": outputs["moodboard"],
+        "storyboard": outputs["storyboard"],
+    }
+
+
+async def _prepare_veo_request(prompt: str, plan_id: str | None = None) -> dict:
+    """
+    Builds the Veo request for a prompt:
+    {"prompt", "reference_images", "render_key", "inputs", "plan_id", "timings"}.
+    """
+    outputs, timings = await _veo_prepare_pipeline(prompt, plan_id).run()
+    return {
+        "prompt": outputs["veo_prompt"],
+        "reference_images": outputs["references"],
+        "render_key": outputs["render_key"],
+        "inputs": _veo_inputs(outputs),
+        "plan_id": outputs["bundle"]["plan_id"],
+        "timings": timings,
+    }
+
+
+def _render_cache_status(cached: dict | None, force: bool) -> str:
+    # "hit": staged MP4 reused, "attached": joined a running render,
+    # "miss": started a new render, "bypass": new render forced.
+    if force:
+        return "bypass"
+    if cached is None:
+        return "miss"
+    return "hit" if cached["status"] == "done" else "attached"
 
+
+@router.post("/v1/veo")
+async def veo_input(payload: PromptIn, request: Request, response: Response):
+    set_request_priority("final")
+    # A render that is left behind keeps its render cache entry; the next
+    # identical request attaches to it instead of starting over.
+    return await run_idempotent(request, response, payload, lambda: _veo_input(payload))
+
+
+async def _veo_input(payload: PromptIn) -> dict:
+    pipeline = _veo_prepare_pipeline(payload.prompt, payload.plan_id)
+
+    async def cached(render_key: str) -> dict | None:
+        if payload.force:
+            return None
+        return await asyncio.to_thread(veo_render_cache.lookup, render_key)
+
+    async def start(veo_prompt: str, references: list[dict], render_key: str, cached: dict | None) -> dict:
+        if cached is not None:
+            # Same prompt package: reuse the finished render or join the running one.
+            return {"name": cached["operation_name"], "done": cached["status"] == "done"}
         operation = await veo_start_generation(
-            veo_prompt,
-            reference_images=reference_images,
+            veo_prompt, reference_images=references, force=payload.force
         )
-        operation_name = operation.get("name")
-        if not operation_name:
+        if not operation.get("name"):
             raise ValueError("Veo did not return operation name")
+        await asyncio.to_thread(veo_render_cache.record_started, render_key, operation["name"])
+        return operation
+
+    async def wait(start: dict, cached: dict | None) -> dict:
+        if not payload.wait or (cached is not None and cached["status"] == "done"):
+            return start
+        return await veo_poller.wait(start["name"], timeout=payload.max_wait_sec) or start
 
-        latest_operation = operation
-        if payload.wait:
-            waited = 0
-            while waited < payload.max_wait_sec:
-                latest_operation = await veo_get_operation(operation_name)
-                if latest_operation.get("done"):
-                    break
-                await asyncio.sleep(payload.poll_interval_sec)
-                waited += payload.poll_interval_sec
-
-        remote_video_url = _extract_video_url(latest_operation)
+    async def download(wait: dict, render_key: str, cached: dict | None) -> dict:
+        if cached is not None and cached["status"] == "done":
+            return {"video_url": cached["video_url"], "local_video_url": cached["local_video_url"]}
+        if wait.get("done") and wait.get("error"):
+            await asyncio.to_thread(veo_render_cache.forget, render_key, wait["name"])
+        remote_video_url = extract_video_url(wait)
         local_video_url = None
-        local_video_error = None
-        if remote_video_url and payload.wait and latest_operation.get("done"):
+        if remote_video_url and payload.wait and wait.get("done"):
             try:
-                local_video_url = await download_and_store_veo_video(remote_video_url, prefix="veo")
+                local_video_url = await download_and_store_veo_video(
+                    remote_video_url, prefix="veo", prompt=payload.prompt
+                )
             except Exception as download_error:
-                # Keep the remote URL as fallback even if local proxy download fails.
-                local_video_url = None
-                local_video_error = str(download_error)
-
-        if payload.wait and latest_operation.get("done") and remote_video_url and not local_video_url:
-            raise ValueError(
-                f"Veo generated a video URL but backend failed to stage it locally: {local_video_error or 'unknown error'}"
+                raise ValueError(
+                    f"Veo generated a video URL but backend failed to stage it locally: {download_error}"
+                ) from download_error
+            await asyncio.to_thread(
+                veo_render_cache.record_done, render_key, wait["name"], remote_video_url, local_video_url
             )
+        return {"video_url": remote_video_url, "local_video_url": local_video_url}
 
-        return {
-            "veo": {
-                "prompt": veo_prompt,
-                "operation": latest_operation,
-                "video_url": remote_video_url,
-                "local_video_url": local_video_url,
-                "local_video_error": local_video_error,
-                "inputs": {
-                    "negatives": negatives,
-                    "hexcodes": hexcodes,
-                    "summary": summary,
-                    "moodboard": moodboard,
-                    "storyboard": storyboard,
-                },
-            }
-        }
+    pipeline.stage("cached", cached, deps=("render_key",))
+    pipeline.stage("start", start, deps=("veo_prompt", "references", "render_key", "cached"))
+    pipeline.stage("wait", wait, deps=("start", "cached"))
+    pipeline.stage("download", download, deps=("wait", "render_key", "cached"))
+
+    try:
+        outputs, timings = await pipeline.run()
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise upstream_http_error(e)
+
+    return {
+        "veo": {
+            "prompt": outputs["veo_prompt"],
+            "operation": outputs["wait"],
+            "video_url": outputs["download"]["video_url"],
+            "local_video_url": outputs["download"]["local_video_url"],
+            "inputs": _veo_inputs(outputs),
+            "plan_id": outputs["bundle"]["plan_id"],
+            "render_cache": _render_cache_status(outputs["cached"], payload.force),
+            "timings": timings,
+        }
+    }
+
+
+@router.post("/v1/veo/jobs", status_code=202)
+async def create_veo_job(payload: VeoJobIn, request: Request, response: Response):
+    async def submit() -> dict:
+        try:
+            await plan_for_prompt(payload.plan_id, payload.prompt)
+        except Exception as e:
+            raise upstream_http_error(e)
+        job = veo_jobs.submit(
+            payload.prompt,
+            lambda prompt: _prepare_veo_request(prompt, payload.plan_id),
+            force=payload.force,
+        )
+        return {"job": job.snapshot()}
+
+    # A replayed key returns the original job (poll it by id for its current state).
+    return await run_idempotent(request, response, payload, submit)
+
+
+@router.get("/v1/veo/jobs")
+async def list_veo_jobs():
+    return {"jobs": await veo_jobs.recent()}
+
+
+@router.get("/v1/veo/jobs/{job_id}")
+async def get_veo_job(job_id: str):
+    snapshot = await veo_jobs.load(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Unknown Veo job: {job_id}")
+    return {"job": snapshot}
+
+
+@router.get("/v1/veo/jobs/{job_id}/events")
+async def stream_veo_job(job_id: str):
+    if await veo_jobs.load(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown Veo job: {job_id}")
+
+    async def events():
+        async for snapshot in veo_jobs.subscribe(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {snapshot['version']}\nevent: {snapshot['status']}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
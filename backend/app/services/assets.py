@@ -0,0 +1,281 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from backend.app.config import (
+    ASSET_INDEX_PATH,
+    ASSET_STORE_GC_INTERVAL_SEC,
+    ASSET_STORE_MAX_AGE_SEC,
+    ASSET_STORE_MAX_BYTES,
+    STATIC_DIR,
+)
+
+GENERATED_DIR = Path(STATIC_DIR).resolve() / "generated"
+GENERATED_URL_PREFIX = "/static/generated/"
+# Derived files of a stored asset: renditions/<name>/<sha[:2]>/<sha>.<ext>.
+RENDITIONS_DIR = GENERATED_DIR / "renditions"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    sha256 TEXT PRIMARY KEY,
+    relpath TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mime TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    prompt TEXT,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_last_accessed ON assets (last_accessed);
+"""
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AssetStore:
+    """
+    Content-addressed store for generated media under static/generated.
+
+    Files live at <root>/<sha[:2]>/<sha>.<ext>, so identical bytes are stored once
+    and directories stay small. A SQLite index records kind, mime, size, prompt and
+    created/last-accessed times, and gc() evicts least-recently-used assets to stay
+    within the size and age budgets. Files written before the store existed
+    (<prefix>-<uuid>.<ext>) are left alone and keep resolving.
+
+    Serving an asset or one of its renditions counts as an access. Those are
+    collected in memory by record_access() and written in one batch by
+    flush_access(), so the static handler never waits on SQLite.
+
+    Except record_access(), all methods block on disk and SQLite; call them
+    from a worker thread.
+    """
+
+    def __init__(self, root: Path, index_path: Path, max_bytes: int, max_age_sec: float, gc_interval_sec: float):
+        self.root = root
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.gc_interval_sec = gc_interval_sec
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._last_gc = 0.0
+        # sha256 -> time of the last access not yet written to the index.
+        self._accessed: dict[str, float] = {}
+        self._accessed_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """
+        Closes the SQLite connection; the store reconnects if used again.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def url_for(self, relpath: str) -> str:
+        return f"{GENERATED_URL_PREFIX}{relpath}"
+
+    def ingest(
+        self,
+        tmp_path: Path,
+        *,
+        kind: str,
+        mime: str,
+        ext: str,
+        prompt: str | None = None,
+        sha256: str | None = None,
+    ) -> str:
+        """
+        Moves a finished temp file into the store and returns its path relative to
+        the store root. If the same bytes are already stored the temp file is dropped.
+        """
+        digest = sha256 or sha256_file(tmp_path)
+        relpath = f"{digest[:2]}/{digest}.{ext}"
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT relpath FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+            if row is not None and (self.root / row[0]).exists():
+                tmp_path.unlink(missing_ok=True)
+                db.execute("UPDATE assets SET last_accessed = ? WHERE sha256 = ?", (now, digest))
+                return row[0]
+
+            size = tmp_path.stat().st_size
+            final_path = self.root / relpath
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, final_path)
+            db.execute(
+                "INSERT OR REPLACE INTO assets "
+                "(sha256, relpath, kind, mime, size, prompt, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, relpath, kind, mime, size, prompt, now, now),
+            )
+        self.maybe_gc()
+        return relpath
+
+    def ingest_bytes(self, data: bytes, *, kind: str, mime: str, ext: str, prompt: str | None = None) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f".{digest}.part"
+        tmp_path.write_bytes(data)
+        return self.ingest(tmp_path, kind=kind, mime=mime, ext=ext, prompt=prompt, sha256=digest)
+
+    def touch(self, url: str) -> None:
+        """
+        Marks an asset as recently used. Unknown and legacy URLs are ignored.
+        """
+        if not url.startswith(GENERATED_URL_PREFIX):
+            return
+        relpath = url[len(GENERATED_URL_PREFIX):]
+        with self._lock:
+            self._db().execute(
+                "UPDATE assets SET last_accessed = ? WHERE relpath = ?", (time.time(), relpath)
+            )
+
+    def record_access(self, digest: str) -> None:
+        """
+        Notes that an asset was served. Only touches memory, so it is safe to
+        call on the event loop; flush_access() writes the times.
+        """
+        with self._accessed_lock:
+            self._accessed[digest] = time.time()
+
+    def flush_access(self) -> int:
+        """
+        Writes the accesses recorded since the last flush and returns how many
+        assets were marked as used.
+        """
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return 0
+        with self._lock:
+            self._db().executemany(
+                "UPDATE assets SET last_accessed = MAX(last_accessed, ?) WHERE sha256 = ?",
+                [(when, digest) for digest, when in accessed.items()],
+            )
+        return len(accessed)
+
+    def relpath_for(self, digest: str) -> str | None:
+        with self._lock:
+            row = self._db().execute("SELECT relpath FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def lookup(self, url: str) -> dict | None:
+        if not url.startswith(GENERATED_URL_PREFIX):
+            return None
+        relpath = url[len(GENERATED_URL_PREFIX):]
+        with self._lock:
+            row = self._db().execute(
+                "SELECT sha256, kind, mime, size, prompt, created_at, last_accessed "
+                "FROM assets WHERE relpath = ?",
+                (relpath,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("sha256", "kind", "mime", "size", "prompt", "created_at", "last_accessed")
+        return dict(zip(keys, row))
+
+    def remove(self, url: str) -> int:
+        """
+        Deletes one asset and returns the bytes freed. Unknown and legacy URLs are ignored.
+        """
+        if not url.startswith(GENERATED_URL_PREFIX):
+            return 0
+        relpath = url[len(GENERATED_URL_PREFIX):]
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT sha256, size FROM assets WHERE relpath = ?", (relpath,)).fetchone()
+            if row is None:
+                return 0
+            self._delete(db, row[0], relpath)
+        return row[1]
+
+    def maybe_gc(self) -> None:
+        if time.monotonic() - self._last_gc >= self.gc_interval_sec:
+            self.gc()
+
+    def gc(self) -> dict:
+        """
+        Evicts assets older than max_age_sec (by last access), then the least
+        recently used ones until the store fits in max_bytes.
+        """
+        self._last_gc = time.monotonic()
+        self.flush_access()
+        removed = 0
+        freed = 0
+        with self._lock:
+            db = self._db()
+            victims: list[tuple[str, str, int]] = []
+            if self.max_age_sec > 0:
+                victims += db.execute(
+                    "SELECT sha256, relpath, size FROM assets WHERE last_accessed < ?",
+                    (time.time() - self.max_age_sec,),
+                ).fetchall()
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM assets").fetchone()[0]
+            total -= sum(v[2] for v in victims)
+            if self.max_bytes > 0 and total > self.max_bytes:
+                stale = {v[0] for v in victims}
+                for row in db.execute("SELECT sha256, relpath, size FROM assets ORDER BY last_accessed"):
+                    if total <= self.max_bytes:
+                        break
+                    if row[0] in stale:
+                        continue
+                    victims.append(row)
+                    total -= row[2]
+
+            for digest, relpath, size in victims:
+                self._delete(db, digest, relpath)
+                removed += 1
+                freed += size
+        return {"removed": removed, "freed_bytes": freed}
+
+    def _delete(self, db: sqlite3.Connection, digest: str, relpath: str) -> None:
+        # Renditions go with their source.
+        paths = [self.root / relpath, *RENDITIONS_DIR.glob(f"*/{digest[:2]}/{digest}.*")]
+        for path in paths:
+            path.unlink(missing_ok=True)
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass  # shard directory still has other assets
+        db.execute("DELETE FROM assets WHERE sha256 = ?", (digest,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM assets"
+            ).fetchone()
+        return {
+            "assets": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "max_age_sec": self.max_age_sec,
+        }
+
+
+asset_store = AssetStore(
+    root=GENERATED_DIR,
+    index_path=Path(ASSET_INDEX_PATH),
+    max_bytes=ASSET_STORE_MAX_BYTES,
+    max_age_sec=ASSET_STORE_MAX_AGE_SEC,
+    gc_interval_sec=ASSET_STORE_GC_INTERVAL_SEC,
+)
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from backend.app.services.nanobanana import (
+    build_moodboard_prompt,
+    build_storyboard_prompt,
+    generate_and_store_image_variants,
+)
+from backend.app.services.plans import BUNDLE_SECTIONS, resolve_bundle, save_to_plan
+
+
+# Sections derived from the per-prompt text bundle (same shapes as the single routes).
+TEXT_SECTIONS = BUNDLE_SECTIONS
+# Image sections: (prompt builder, description).
+IMAGE_SECTIONS = {
+    "moodboard": (build_moodboard_prompt, "Moodboard image"),
+    "storyboard": (build_storyboard_prompt, "Storyboard image"),
+}
+SECTIONS = (*TEXT_SECTIONS, *IMAGE_SECTIONS)
+
+
+async def run_batch(
+    prompts: list[str],
+    sections: list[str],
+    variants: int = 1,
+    concurrency: int = 4,
+) -> AsyncIterator[dict]:
+    """
+    Produces every requested section for every prompt and yields one item per
+    (prompt, section) as soon as it is ready, then a final summary.
+
+    Work is deduplicated before anything starts: one text bundle (and plan) per
+    unique prompt, one image set per unique (section, prompt). At most
+    `concurrency` of those upstream work units run at once. Failed items carry
+    the exception under "error"; they do not stop the rest of the batch.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    unique_prompts = list(dict.fromkeys(p.strip() for p in prompts))
+    sections = list(dict.fromkeys(sections))
+
+    async def bounded(fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with semaphore:
+            return await fn()
+
+    async def generate_images(section: str, prompt: str) -> list[dict]:
+        build_prompt, description = IMAGE_SECTIONS[section]
+        return await generate_and_store_image_variants(
+            build_prompt(prompt), prefix=section, description=description, count=variants
+        )
+
+    bundles: dict[str, asyncio.Task] = {}
+    images: dict[tuple[str, str], asyncio.Task] = {}
+    if any(section in TEXT_SECTIONS for section in sections):
+        for prompt in unique_prompts:
+            bundles[prompt] = asyncio.create_task(bounded(lambda p=prompt: resolve_bundle(p)))
+    for section in (s for s in sections if s in IMAGE_SECTIONS):
+        for prompt in unique_prompts:
+            images[section, prompt] = asyncio.create_task(
+                bounded(lambda s=section, p=prompt: generate_images(s, p))
+            )
+
+    async def plan_id_for(prompt: str) -> str | None:
+        task = bundles.get(prompt)
+        if task is None:
+            return None
+        try:
+            plan_id, _ = await asyncio.shield(task)
+        except Exception:
+            return None  # reported by the text items themselves
+        return plan_id
+
+    async def run_item(index: int, prompt_index: int, section: str) -> dict:
+        prompt = prompts[prompt_index].strip()
+        item: dict = {"index": index, "prompt_index": prompt_index, "section": section}
+        try:
+            if section in TEXT_SECTIONS:
+                plan_id, bundle = await asyncio.shield(bundles[prompt])
+                result = TEXT_SECTIONS[section](bundle)
+            else:
+                generated = await asyncio.shield(images[section, prompt])
+                result = {section: generated[0]}
+                if variants > 1:
+                    result[f"{section}_variants"] = generated
+                plan_id = await plan_id_for(prompt)
+                await save_to_plan(plan_id, result)
+        except Exception as e:
+            item.update(status="error", error=e)
+        else:
+            item.update(status="ok", result={**result, "plan_id": plan_id})
+        item["elapsed_sec"] = round(time.perf_counter() - started, 4)
+        return item
+
+    items = [
+        asyncio.create_task(run_item(index, prompt_index, section))
+        for index, (prompt_index, section) in enumerate(
+            (p, s) for p in range(len(prompts)) for s in sections
+        )
+    ]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(items):
+            item = await next_done
+            errors += item["status"] == "error"
+            yield item
+    finally:
+        # Client went away (or we are done): stop whatever is still running.
+        pending = [t for t in (*items, *bundles.values(), *images.values()) if not t.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*items, *bundles.values(), *images.values(), return_exceptions=True)
+
+    yield {
+        "done": True,
+        "items": len(items),
+        "errors": errors,
+        "unique_prompts": len(unique_prompts),
+        "upstream_work_units": len(bundles) + len(images),
+        "duration_sec": round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class InflightTasks:
+    """
+    Computations in flight by key, shared by every caller asking for that key.
+
+    Callers are counted per computation: cancelling one caller only stops its
+    own wait while others still wait, and the computation itself is cancelled
+    once every caller has gone away (e.g. their clients disconnected).
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.cancelled = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def get(self, key: Hashable) -> asyncio.Task | None:
+        return self._tasks.get(key)
+
+    def start(self, key: Hashable, work: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(work)
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def wait(self, key: Hashable, task: asyncio.Task) -> Any:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield so one cancelled caller does not cancel work others still wait on.
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody wants the result anymore; later callers start afresh.
+                    self._forget(key, task)
+                    task.cancel()
+                    self.cancelled += 1
+
+
+class SingleFlightCache:
+    """
+    Async TTL + LRU cache with in-flight request coalescing.
+
+    Concurrent callers asking for the same key while it is being computed
+    await the same task instead of starting another upstream call; the call
+    is cancelled if all of them are. Failures are never cached. With weigh/max_weight set, entries are also
+    evicted to keep their total weight (e.g. bytes) within budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_sec: float,
+        max_entries: int,
+        max_weight: int = 0,
+        weigh: Callable[[Any], int] | None = None,
+    ):
+        self.name = name
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight = InflightTasks()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0 or self.ttl_sec <= 0:
+            return
+        size = self.weigh(value) if self.weigh else 0
+        if self.max_weight and size > self.max_weight:
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+        self.weight += size
+        while len(self._entries) > self.max_entries or (self.max_weight and self.weight > self.max_weight):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and self.weigh:
+            self.weight -= self.weigh(entry[1])
+
+    def invalidate(self, key: Hashable) -> None:
+        self._drop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.weight = 0
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._inflight.start(key, self._run(key, compute))
+        return await self._inflight.wait(key, task)
+
+    async def _run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "ttl_sec": self.ttl_sec if math.isfinite(self.ttl_sec) else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "cancelled": self._inflight.cancelled,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
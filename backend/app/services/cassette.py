@@ -0,0 +1,411 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+# Modes:
+#   record  - forward every request and append the exchange to the cassette
+#   replay  - never touch the network; unmatched requests get a 501
+#   auto    - replay when a recording is available, otherwise forward and record
+MODES = {"off", "record", "replay", "auto"}
+
+# Base64 runs at least this long are moved out of the index into blobs/.
+BLOB_MIN_CHARS = 4096
+_B64_RUN = re.compile(rb"[A-Za-z0-9+/]{%d,}={0,2}" % BLOB_MIN_CHARS)
+# Request fields that never take part in matching and are never stored.
+_SECRET_QUERY_PARAMS = {"key"}
+# Response headers worth replaying; everything else describes the original connection.
+_KEPT_HEADERS = {"content-type", "retry-after", "content-range", "location"}
+# Chunks arriving closer together than this are merged in the timing track.
+_CHUNK_MERGE_SEC = 0.005
+# A recorded body is written to its spool file whenever this much is buffered.
+_SPOOL_FLUSH_BYTES = 1024 * 1024
+
+
+def _normalize_json(value):
+    if isinstance(value, dict):
+        return {k: _normalize_json(v) for k, v in sorted(value.items())}
+    if isinstance(value, list):
+        return [_normalize_json(v) for v in value]
+    if isinstance(value, str) and len(value) >= BLOB_MIN_CHARS:
+        # Inline images etc.: match on content without keeping megabytes in the key input.
+        return "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+    return value
+
+
+def match_key(method: str, url: httpx.URL, body: bytes, byte_range: str | None = None) -> str:
+    """
+    Identifies a request independently of credentials and JSON formatting:
+    method, URL without the API key, Range header (resumed downloads) and the
+    body with sorted keys (large strings replaced by their hash).
+    """
+    query = sorted((k, v) for k, v in parse_qsl(url.query.decode("ascii")) if k not in _SECRET_QUERY_PARAMS)
+    target = f"{url.scheme}://{url.host}{':' + str(url.port) if url.port else ''}{url.path}"
+    if query:
+        target += "?" + urlencode(query)
+    if byte_range:
+        target += f" range={byte_range}"
+    try:
+        normalized = json.dumps(_normalize_json(json.loads(body)), separators=(",", ":")).encode("utf-8")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        normalized = hashlib.sha256(body).hexdigest().encode("ascii")
+    digest = hashlib.sha256(f"{method.upper()} {target}\n".encode("utf-8") + normalized)
+    return digest.hexdigest()
+
+
+def _redacted_url(url: httpx.URL) -> str:
+    query = [(k, v) for k, v in parse_qsl(url.query.decode("ascii")) if k not in _SECRET_QUERY_PARAMS]
+    return str(url.copy_with(query=urlencode(query).encode("ascii") if query else None))
+
+
+class Cassette:
+    """
+    On-disk recording of upstream HTTP exchanges.
+
+    Layout (one directory):
+        exchanges.jsonl   one JSON line per exchange: match key, status,
+                          replayable headers, time to headers and a chunk
+                          timing track, and the body as segments
+        blobs/<sha256>    large base64 runs (stored decoded) and binary bodies
+        blobs/.*.part     bodies being recorded
+
+    Body segments are either literal text, {"b64": sha} (re-encoded on replay)
+    or {"bin": sha} (raw bytes). Exchanges with the same match key are replayed
+    in recording order; polling sequences therefore play back as recorded.
+    """
+
+    def __init__(self, path: str, mode: str, time_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.time_scale = max(time_scale, 0.0)
+        self._index_path = self.path / "exchanges.jsonl"
+        self._blob_dir = self.path / "blobs"
+        self._exchanges: dict[str, list[dict]] | None = None
+        self._cursors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.recorded = 0
+        self.misses = 0
+
+    # Index
+
+    def _load(self) -> dict[str, list[dict]]:
+        if self._exchanges is None:
+            exchanges: dict[str, list[dict]] = {}
+            if self._index_path.exists():
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            exchange = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # torn write from a crashed recorder
+                        exchanges.setdefault(exchange["key"], []).append(exchange)
+            self._exchanges = exchanges
+        return self._exchanges
+
+    def next_recording(self, key: str) -> dict | None:
+        """
+        Returns the next unplayed recording for key. In replay mode the last
+        one repeats once the sequence is exhausted; in auto mode exhaustion
+        means "go to the network" (e.g. a poll that has not finished yet).
+        """
+        with self._lock:
+            recordings = self._load().get(key)
+            if not recordings:
+                return None
+            cursor = self._cursors.get(key, 0)
+            if cursor >= len(recordings):
+                return recordings[-1] if self.mode == "replay" else None
+            self._cursors[key] = cursor + 1
+            return recordings[cursor]
+
+    # Blobs
+
+    def _put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_dir / digest
+        if not path.exists():
+            self._blob_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{digest}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return digest
+
+    def _put_blob_file(self, path: Path) -> str:
+        """
+        Moves a spooled body into blobs/ without reading it into memory.
+        """
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        if (self._blob_dir / digest).exists():
+            path.unlink(missing_ok=True)
+        else:
+            os.replace(path, self._blob_dir / digest)
+        return digest
+
+    def _get_blob(self, digest: str) -> bytes:
+        return (self._blob_dir / digest).read_bytes()
+
+    def spool_path(self) -> Path:
+        """
+        A fresh file for a body being recorded; write() consumes it.
+        """
+        self._blob_dir.mkdir(parents=True, exist_ok=True)
+        return self._blob_dir / f".{uuid.uuid4().hex}.part"
+
+    def _encode_body(self, body: bytes) -> list:
+        try:
+            body.decode("utf-8")
+        except UnicodeDecodeError:
+            return [{"bin": self._put_blob(body)}] if body else []
+
+        segments: list = []
+        position = 0
+        for match in _B64_RUN.finditer(body):
+            run = match.group(0)
+            try:
+                raw = base64.b64decode(run, validate=True)
+            except (binascii.Error, ValueError):
+                continue
+            if base64.b64encode(raw) != run:
+                continue  # not canonical; keep it verbatim so replay is byte-exact
+            if match.start() > position:
+                segments.append(body[position:match.start()].decode("utf-8"))
+            segments.append({"b64": self._put_blob(raw)})
+            position = match.end()
+        if position < len(body):
+            segments.append(body[position:].decode("utf-8"))
+        return segments
+
+    def decode_body(self, segments: list) -> bytes:
+        parts = []
+        for segment in segments:
+            if isinstance(segment, str):
+                parts.append(segment.encode("utf-8"))
+            elif "b64" in segment:
+                parts.append(base64.b64encode(self._get_blob(segment["b64"])))
+            else:
+                parts.append(self._get_blob(segment["bin"]))
+        return b"".join(parts)
+
+    # Recording
+
+    def write(
+        self,
+        key: str,
+        request: httpx.Request,
+        response: httpx.Response,
+        body_path: Path,
+        headers_sec: float,
+        chunks: list[tuple[float, int]],
+    ) -> None:
+        """
+        Appends one exchange. body_path holds the spooled response body; media
+        bodies move into blobs/ as they are, text bodies are split into segments.
+        """
+        if _is_text(response.headers.get("content-type", "")):
+            body = body_path.read_bytes()
+            body_path.unlink(missing_ok=True)
+            segments = self._encode_body(body)
+        elif body_path.stat().st_size:
+            segments = [{"bin": self._put_blob_file(body_path)}]
+        else:
+            body_path.unlink(missing_ok=True)
+            segments = []
+        exchange = {
+            "key": key,
+            "method": request.method,
+            "url": _redacted_url(request.url),
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS],
+            "headers_sec": round(headers_sec, 4),
+            "chunks": [[round(t, 4), size] for t, size in chunks],
+            "body": segments,
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock:
+            exchanges = self._load()
+            self.path.mkdir(parents=True, exist_ok=True)
+            # One append per exchange; O_APPEND keeps lines whole across workers.
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            exchanges.setdefault(key, []).append(exchange)
+            # Recorded in this session: do not replay it back to ourselves.
+            self._cursors[key] = self._cursors.get(key, 0) + 1
+            self.recorded += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "time_scale": self.time_scale,
+            "exchanges": sum(len(v) for v in (self._exchanges or {}).values()),
+            "replayed": self.replayed,
+            "recorded": self.recorded,
+            "misses": self.misses,
+        }
+
+
+def _is_text(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return content_type.startswith("text/") or "json" in content_type
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, chunks: list, time_scale: float):
+        self._body = body
+        self._chunks = chunks or [[0.0, len(body)]]
+        self._time_scale = time_scale
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        started = time.monotonic()
+        position = 0
+        for offset_sec, size in self._chunks:
+            delay = offset_sec * self._time_scale - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield self._body[position:position + size]
+            position += size
+        if position < len(self._body):
+            yield self._body[position:]
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """
+    Passes the upstream body through unchanged, spooling it to disk in blocks
+    of _SPOOL_FLUSH_BYTES, and writes the exchange once the caller has read it
+    to the end. Abandoned streams are not recorded.
+    """
+
+    def __init__(self, inner: httpx.AsyncByteStream, on_complete, headers_at: float, spool_path: Path):
+        self._inner = inner
+        self._on_complete = on_complete
+        self._headers_at = headers_at
+        self._spool_path = spool_path
+        self._spool = None
+        self._pending = bytearray()
+        self._chunks: list[tuple[float, int]] = []
+        self._finished = False
+        self._closed = False
+
+    def _write(self, data: bytes) -> None:
+        if self._spool is None:
+            self._spool = open(self._spool_path, "wb")
+        self._spool.write(data)
+
+    async def _flush(self) -> None:
+        data = bytes(self._pending)
+        self._pending.clear()
+        await asyncio.to_thread(self._write, data)
+
+    def _close_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._inner:
+            offset = time.monotonic() - self._headers_at
+            if self._chunks and offset - self._chunks[-1][0] < _CHUNK_MERGE_SEC:
+                self._chunks[-1] = (self._chunks[-1][0], self._chunks[-1][1] + len(chunk))
+            else:
+                self._chunks.append((offset, len(chunk)))
+            self._pending.extend(chunk)
+            if len(self._pending) >= _SPOOL_FLUSH_BYTES:
+                await self._flush()
+            yield chunk
+        self._finished = True
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+        if self._closed:
+            return
+        self._closed = True
+        if self._finished:
+            await self._flush()  # also creates the file for an empty body
+        await asyncio.to_thread(self._close_spool)
+        if self._finished:
+            await self._on_complete(self._spool_path, self._chunks)
+        else:
+            await asyncio.to_thread(self._spool_path.unlink, missing_ok=True)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records upstream traffic to a Cassette or replays it
+    with the original timing (scaled by the cassette's time_scale).
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, cassette: Cassette):
+        self._inner = inner
+        self._cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = self._cassette
+        body = await request.aread()
+        key = match_key(request.method, request.url, body, request.headers.get("range"))
+
+        if cassette.mode in {"replay", "auto"}:
+            recording = await asyncio.to_thread(cassette.next_recording, key)
+            if recording is not None:
+                return await self._replay(request, recording)
+            if cassette.mode == "replay":
+                cassette.misses += 1
+                message = f"No cassette recording for {request.method} {_redacted_url(request.url)}"
+                return httpx.Response(
+                    501,
+                    json={"error": {"code": 501, "status": "CASSETTE_MISS", "message": message}},
+                    request=request,
+                )
+
+        return await self._record(request, key)
+
+    async def _replay(self, request: httpx.Request, recording: dict) -> httpx.Response:
+        cassette = self._cassette
+        body = await asyncio.to_thread(cassette.decode_body, recording["body"])
+        if recording["headers_sec"] and cassette.time_scale:
+            await asyncio.sleep(recording["headers_sec"] * cassette.time_scale)
+        cassette.replayed += 1
+        return httpx.Response(
+            recording["status"],
+            headers=recording["headers"],
+            stream=_ReplayStream(body, recording["chunks"], cassette.time_scale),
+            request=request,
+        )
+
+    async def _record(self, request: httpx.Request, key: str) -> httpx.Response:
+        # Ask for an uncompressed body so recordings stay plain text and blobs dedupe.
+        request.headers["accept-encoding"] = "identity"
+        started = time.monotonic()
+        response = await self._inner.handle_async_request(request)
+        headers_at = time.monotonic()
+
+        async def on_complete(body_path: Path, chunks: list[tuple[float, int]]) -> None:
+            await asyncio.to_thread(
+                self._cassette.write, key, request, response, body_path, headers_at - started, chunks
+            )
+
+        spool_path = await asyncio.to_thread(self._cassette.spool_path)
+        response.stream = _RecordingStream(response.stream, on_complete, headers_at, spool_path)
+        return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
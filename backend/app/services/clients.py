@@ -0,0 +1,105 @@
+import importlib.util
+
+import httpx
+
+from backend.app.config import (
+    GEMINI_MAX_CONNECTIONS,
+    HTTP2_ENABLED,
+    HTTP_KEEPALIVE_EXPIRY_SEC,
+    UPSTREAM_CASSETTE_MODE,
+    UPSTREAM_CASSETTE_PATH,
+    UPSTREAM_CASSETTE_TIME_SCALE,
+    VEO_MAX_CONNECTIONS,
+)
+from backend.app.services.cassette import Cassette, CassetteTransport
+
+# Per-operation timeouts (seconds). Connect stays short so a dead upstream fails fast.
+TIMEOUTS = {
+    "gemini_text": httpx.Timeout(30.0, connect=10.0),
+    "gemini_image": httpx.Timeout(120.0, connect=10.0),
+    "veo_start": httpx.Timeout(60.0, connect=10.0),
+    "veo_poll": httpx.Timeout(60.0, connect=10.0),
+    "veo_download": httpx.Timeout(300.0, connect=10.0),
+}
+
+_PROVIDERS = {
+    "gemini": {"max_connections": GEMINI_MAX_CONNECTIONS, "follow_redirects": False},
+    "veo": {"max_connections": VEO_MAX_CONNECTIONS, "follow_redirects": False},
+    # Media downloads are redirected to signed storage URLs.
+    "veo_media": {"max_connections": VEO_MAX_CONNECTIONS, "follow_redirects": True},
+}
+
+_CLIENTS: dict[str, httpx.AsyncClient] = {}
+
+# One cassette for all providers, so a recording covers a whole request flow.
+cassette = (
+    Cassette(UPSTREAM_CASSETTE_PATH, UPSTREAM_CASSETTE_MODE, UPSTREAM_CASSETTE_TIME_SCALE)
+    if UPSTREAM_CASSETTE_MODE != "off"
+    else None
+)
+
+
+def _http2_available() -> bool:
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def _build_client(provider: str) -> httpx.AsyncClient:
+    settings = _PROVIDERS.get(provider)
+    if settings is None:
+        raise ValueError(f"Unknown upstream provider: {provider}")
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_connections"],
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SEC,
+    )
+    transport = None
+    if cassette is not None:
+        # A custom transport replaces the client's own pool, so configure it here.
+        transport = CassetteTransport(
+            httpx.AsyncHTTPTransport(limits=limits, http2=_http2_available()), cassette
+        )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        http2=_http2_available(),
+        follow_redirects=settings["follow_redirects"],
+        transport=transport,
+    )
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Returns the shared client for a provider. Clients are normally created at app
+    startup; they are created lazily here so services also work outside the app.
+    """
+    client = _CLIENTS.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(provider)
+        _CLIENTS[provider] = client
+    return client
+
+
+def timeout_for(operation: str) -> httpx.Timeout:
+    return TIMEOUTS[operation]
+
+
+async def start_clients() -> None:
+    for provider in _PROVIDERS:
+        get_client(provider)
+
+
+async def close_clients() -> None:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def clients_info() -> dict:
+    return {
+        "http2": _http2_available(),
+        "open_clients": sorted(p for p, c in _CLIENTS.items() if not c.is_closed),
+        "max_connections": {p: s["max_connections"] for p, s in _PROVIDERS.items()},
+        "keepalive_expiry_sec": HTTP_KEEPALIVE_EXPIRY_SEC,
+        "cassette": cassette.stats() if cassette is not None else None,
+    }
@@ -1,7 +1,101 @@
+import asyncio
+import copy
 import json
-import httpx
+from pathlib import Path
+from typing import AsyncIterator
 
-from backend.app.config import GEMINI_API_KEY, GEMINI_MODEL
+from backend.app.config import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_MODEL,
+    GEMINI_VARIANT_CACHE_PATH,
+    TEXT_BUNDLE_CACHE_MAX_ENTRIES,
+    TEXT_BUNDLE_CACHE_TTL_SEC,
+)
+from backend.app.services.cache import SingleFlightCache
+from backend.app.services.clients import get_client, timeout_for
+from backend.app.services.limiter import upstream_slot
+from backend.app.services.metrics import UPSTREAM_BYTES
+from backend.app.services.resilience import UpstreamError, call_upstream
+from backend.app.services.shared_cache import shared_cache
+
+text_bundle_cache = SingleFlightCache(
+    "text_bundle",
+    ttl_sec=TEXT_BUNDLE_CACHE_TTL_SEC,
+    max_entries=TEXT_BUNDLE_CACHE_MAX_ENTRIES,
+)
+
+# Some models/endpoints differ on the JSON response-mime field name. Try them in
+# this order until one is accepted, then remember the winner per model.
+PAYLOAD_VARIANTS = ("responseMimeType", "response_mime_type", "bare")
+
+_PREFERRED_VARIANTS: dict[str, str] = {}
+_preferred_variants_loaded = False
+
+
+def _load_preferred_variants() -> None:
+    global _preferred_variants_loaded
+    if _preferred_variants_loaded:
+        return
+    _preferred_variants_loaded = True
+    if not GEMINI_VARIANT_CACHE_PATH:
+        return
+    try:
+        stored = json.loads(Path(GEMINI_VARIANT_CACHE_PATH).read_text())
+    except (OSError, ValueError):
+        return
+    if isinstance(stored, dict):
+        for model, variant in stored.items():
+            if variant in PAYLOAD_VARIANTS:
+                _PREFERRED_VARIANTS.setdefault(model, variant)
+
+
+def _save_preferred_variants() -> None:
+    path = Path(GEMINI_VARIANT_CACHE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(_PREFERRED_VARIANTS, indent=2, sort_keys=True))
+    tmp.replace(path)
+
+
+async def _remember_variant(model: str, variant: str) -> None:
+    if _PREFERRED_VARIANTS.get(model) == variant:
+        return
+    _PREFERRED_VARIANTS[model] = variant
+    if GEMINI_VARIANT_CACHE_PATH:
+        try:
+            await asyncio.to_thread(_save_preferred_variants)
+        except OSError:
+            # Persistence is best-effort; the in-process preference still applies.
+            pass
+
+
+def _variant_order(model: str) -> list[str]:
+    _load_preferred_variants()
+    preferred = _PREFERRED_VARIANTS.get(model)
+    if preferred is None:
+        return list(PAYLOAD_VARIANTS)
+    return [preferred] + [v for v in PAYLOAD_VARIANTS if v != preferred]
+
+
+def _rejects_payload(error: UpstreamError) -> bool:
+    # An unknown generationConfig field is a 400 INVALID_ARGUMENT; throttling,
+    # outages and auth failures say nothing about the payload shape.
+    return error.status_code in (400, 422)
+
+
+def _build_variant_payload(base_payload: dict, variant: str) -> dict:
+    if variant == "bare":
+        return base_payload
+    return {**base_payload, "generationConfig": {variant: "application/json"}}
+
+
+def payload_variant_info() -> dict:
+    _load_preferred_variants()
+    return {
+        "preferred": dict(_PREFERRED_VARIANTS),
+        "persisted_to": GEMINI_VARIANT_CACHE_PATH or None,
+    }
 
 
 def _extract_text(resp_json: dict) -> str:
@@ -40,13 +134,172 @@ def _extract_json_object(raw_text: str) -> dict:
     return json.loads(text)
 
 
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+class TopLevelJsonParser:
+    """
+    Incremental parser for a JSON object arriving in text chunks. feed() returns
+    the (key, value) members of the top-level object whose values completed in
+    that chunk, so callers can use "negatives" before "summary" has been
+    generated. Text before the opening brace (e.g. a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key: str | None = None
+        self._value_start: int | None = None
+        self._finished = False
+
+    def _member(self, end: int) -> list[tuple[str, object]]:
+        key, start = self._key, self._value_start
+        self._key = self._value_start = None
+        try:
+            return [(key, json.loads(self.text[start:end]))]
+        except json.JSONDecodeError:
+            return []  # the final parse of the whole text reports the error
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self.text += chunk
+        members: list[tuple[str, object]] = []
+        text = self.text
+        while self._pos < len(text) and not self._finished:
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._key = json.loads(text[self._string_start:i + 1])
+                    elif self._depth == 1:
+                        members += self._member(i + 1)
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    members += self._member(i + 1)
+                elif self._depth == 0:
+                    if self._value_start is not None:
+                        members += self._member(i)  # trailing scalar
+                    self._finished = True
+            elif self._depth == 1 and c == ":" and self._key is not None:
+                self._value_start = i + 1
+            elif self._depth == 1 and c == "," and self._value_start is not None:
+                members += self._member(i)
+        return members
+
+
+class _BundleStream:
+    """
+    Members of a text bundle published while it is being generated, for every
+    streaming caller waiting on the same prompt. Registered in _BUNDLE_STREAMS
+    while it has subscribers.
+    """
+
+    def __init__(self):
+        self.members: dict[str, object] = {}
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+    def publish(self, key: str, value: object) -> None:
+        self.members[key] = value
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+_BUNDLE_STREAMS: dict[tuple[str, str], _BundleStream] = {}
+
+
 async def gemini_generate_text_bundle(prompt: str) -> dict:
     """
     Returns a dict with:
       - negatives: list[str]
       - palette: {primary, secondary, accent, background} each list[str] of hex codes
       - summary: {logline, style, keywords}
+
+    Results are cached per (model, normalized prompt) and concurrent calls for the
+    same key share a single upstream request, also across worker processes.
+    """
+    key = (GEMINI_MODEL, _normalize_prompt(prompt))
+    bundle = await text_bundle_cache.get_or_compute(
+        key,
+        lambda: shared_cache.get_or_compute(
+            shared_cache.make_key("text_bundle", key),
+            lambda: _fetch_text_bundle(prompt),
+            ttl_sec=TEXT_BUNDLE_CACHE_TTL_SEC,
+        ),
+    )
+    # Callers may mutate their copy; keep the cached bundle pristine.
+    return copy.deepcopy(bundle)
+
+
+async def gemini_stream_text_bundle(prompt: str) -> AsyncIterator[tuple[str, object]]:
+    """
+    Like gemini_generate_text_bundle, but yields (key, value) for each top-level
+    bundle member (negatives, palette, summary) as soon as the model has finished
+    generating it. The complete bundle is cached exactly as in the non-streaming
+    path. Cache hits, and calls that join a generation started without streaming,
+    yield every member at once when the bundle is ready.
     """
+    key = (GEMINI_MODEL, _normalize_prompt(prompt))
+    stream = _BUNDLE_STREAMS.get(key)
+    if stream is None:
+        stream = _BUNDLE_STREAMS[key] = _BundleStream()
+    stream.subscribers += 1
+
+    result = asyncio.ensure_future(
+        text_bundle_cache.get_or_compute(
+            key,
+            lambda: shared_cache.get_or_compute(
+                shared_cache.make_key("text_bundle", key),
+                lambda: _fetch_text_bundle(prompt, stream=stream),
+                ttl_sec=TEXT_BUNDLE_CACHE_TTL_SEC,
+            ),
+        )
+    )
+    sent: set[str] = set()
+    try:
+        while True:
+            # Members published before this caller joined are sent right away.
+            for name, value in list(stream.members.items()):
+                if name not in sent:
+                    sent.add(name)
+                    yield name, copy.deepcopy(value)
+            if result.done():
+                break
+            changed = asyncio.ensure_future(stream.changed.wait())
+            try:
+                await asyncio.wait({result, changed}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                changed.cancel()
+        bundle = result.result()
+        for name, value in bundle.items():
+            if name not in sent:
+                yield name, copy.deepcopy(value)
+    finally:
+        result.cancel()  # the generation stops too unless other callers still wait on it
+        stream.subscribers -= 1
+        if stream.subscribers == 0 and _BUNDLE_STREAMS.get(key) is stream:
+            del _BUNDLE_STREAMS[key]
+
+
+async def _fetch_text_bundle(prompt: str, stream: _BundleStream | None = None) -> dict:
     instruction = """
 Return JSON only (no markdown). Schema:
 {
@@ -79,38 +332,90 @@ Rules:
             }
         ]
     }
-    # Some models/endpoints differ on this field name support.
-    payload_variants = [
-        {**base_payload, "generationConfig": {"responseMimeType": "application/json"}},
-        {**base_payload, "generationConfig": {"response_mime_type": "application/json"}},
-        base_payload,
-    ]
-
     headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": GEMINI_API_KEY,  # :contentReference[oaicite:2]{index=2}
     }
 
     errors: list[str] = []
-    resp_json = None
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for payload in payload_variants:
-            r = await client.post(url, headers=headers, json=payload)
+    raw_text = None
+    url = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent"
+    stream_url = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:streamGenerateContent"
+    client = get_client("gemini")
+    # Go straight to the variant this model accepted last time; only re-probe
+    # the others when the provider rejects its payload.
+    for variant in _variant_order(GEMINI_MODEL):
+        payload = _build_variant_payload(base_payload, variant)
+
+        async def attempt(variant: str = variant, payload: dict = payload) -> str:
+            async with upstream_slot("gemini_text", GEMINI_MODEL):
+                r = await client.post(url, headers=headers, json=payload, timeout=timeout_for("gemini_text"))
+            UPSTREAM_BYTES.inc(len(r.content), operation="gemini_text", model=GEMINI_MODEL)
             if r.is_error:
-                errors.append(f"model={GEMINI_MODEL} status={r.status_code}: {r.text[:400]}")
-                continue
-            resp_json = r.json()
-            break
+                raise UpstreamError.from_response(
+                    f"model={GEMINI_MODEL} variant={variant} status={r.status_code}: {r.text[:400]}", r
+                )
+            return _extract_text(r.json())
 
-    if resp_json is None:
+        async def streamed_attempt(variant: str = variant, payload: dict = payload) -> str:
+            parser = TopLevelJsonParser()
+            async with upstream_slot("gemini_text", GEMINI_MODEL), client.stream(
+                "POST",
+                stream_url,
+                params={"alt": "sse"},
+                headers=headers,
+                json=payload,
+                timeout=timeout_for("gemini_text"),
+            ) as r:
+                if r.is_error:
+                    body = (await r.aread())[:400].decode("utf-8", "replace")
+                    raise UpstreamError.from_response(
+                        f"model={GEMINI_MODEL} variant={variant} status={r.status_code}: {body}", r
+                    )
+                async for line in r.aiter_lines():
+                    UPSTREAM_BYTES.inc(len(line) + 1, operation="gemini_text", model=GEMINI_MODEL)
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[len("data:"):])
+                    except json.JSONDecodeError:
+                        event = None
+                    if not isinstance(event, dict):
+                        # A garbled or truncated stream is a bad gateway response.
+                        raise UpstreamError(
+                            f"model={GEMINI_MODEL} variant={variant} malformed stream event: {line[:200]}", 502
+                        )
+                    parts = ((event.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+                    for name, value in parser.feed("".join(p.get("text", "") for p in parts)):
+                        stream.publish(name, value)
+            if not parser.text:
+                raise ValueError("Gemini response text is empty")
+            return parser.text
+
+        try:
+            if stream is not None:
+                # Subscribers already hold the members published so far, and a
+                # second stream (hedge or retry) could publish different ones.
+                raw_text = await call_upstream(
+                    "gemini_text", GEMINI_MODEL, streamed_attempt, can_retry=lambda: not stream.members
+                )
+            else:
+                # Text generation is idempotent, so slow calls may be hedged.
+                raw_text = await call_upstream("gemini_text", GEMINI_MODEL, attempt, hedge=True)
+        except UpstreamError as e:
+            if not _rejects_payload(e):
+                raise
+            errors.append(str(e))
+            continue
+        await _remember_variant(GEMINI_MODEL, variant)
+        break
+
+    if raw_text is None:
         raise ValueError(
-            f"Gemini text API failed for model='{GEMINI_MODEL}' after 3 payload variants. "
+            f"Gemini text API failed for model='{GEMINI_MODEL}' after {len(PAYLOAD_VARIANTS)} payload variants. "
             f"Last errors: {' | '.join(errors[-3:])}"
         )
 
-    raw_text = _extract_text(resp_json)
-
     # raw_text should be JSON because of response mime config, but keep a robust parser.
     try:
         data = _extract_json_object(raw_text)
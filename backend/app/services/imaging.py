@@ -0,0 +1,30 @@
+import os
+import uuid
+from pathlib import Path
+
+# Runs in rendition worker processes: keep imports to the standard library and
+# Pillow, so spawning a worker does not load the application.
+
+
+def render_webp(source: str, dest: str, max_side: int, quality: int) -> int:
+    """
+    Writes a WebP copy of source scaled to fit max_side x max_side (never
+    upscaled) to dest, atomically. Returns the bytes written.
+    """
+    from PIL import Image
+
+    dest_path = Path(dest)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with Image.open(source) as image:
+            image.draft("RGB", (max_side, max_side))  # JPEG: decode at reduced scale
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            if image.mode not in {"RGB", "RGBA"}:
+                has_alpha = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            image.save(tmp_path, "WEBP", quality=quality, method=4)
+        os.replace(tmp_path, dest_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return dest_path.stat().st_size
@@ -0,0 +1,202 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from backend.app.config import UPSTREAM_LIMITS, UPSTREAM_MAX_QUEUE, UPSTREAM_QUEUE_TIMEOUT_SEC
+from backend.app.services.metrics import UPSTREAM_QUEUE_WAIT
+
+# Lower value = served first when a limiter has a queue.
+PRIORITIES = {
+    "interactive": 0,  # previews the user is looking at right now
+    "standard": 1,
+    "final": 2,  # final renders (final image, synchronous Veo)
+    "background": 3,  # background jobs and operation polling
+}
+
+_request_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "upstream_request_priority", default="standard"
+)
+
+
+def set_request_priority(priority: str) -> None:
+    """
+    Sets the priority class for upstream calls made by the current request.
+    Tasks spawned afterwards inherit it.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    _request_priority.set(priority)
+
+
+def current_priority() -> str:
+    return _request_priority.get()
+
+
+class UpstreamOverloaded(ValueError):
+    """
+    Raised instead of queueing when a limiter's queue is full or the wait for a
+    slot exceeds its queue timeout. Routes turn it into 503 + Retry-After.
+    """
+
+    def __init__(self, limiter: str, reason: str, retry_after: int):
+        super().__init__(f"Upstream '{limiter}' is overloaded ({reason}); retry after {retry_after}s")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ProviderLimiter:
+    """
+    Concurrency + rate limiter for one upstream operation and model.
+
+    At most max_concurrency calls run at once and calls start at most max_rps per
+    second (0 disables the rate limit). Callers beyond that wait in a priority
+    queue of at most max_queue entries; a full queue or a wait longer than
+    queue_timeout_sec sheds the call with UpstreamOverloaded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_rps: float,
+        max_queue: int,
+        queue_timeout_sec: float,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_rps = max_rps
+        self.max_queue = max_queue
+        self.queue_timeout_sec = queue_timeout_sec
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._next_start_at = 0.0
+        # Smoothed slot hold time, used to estimate Retry-After.
+        self._hold_sec = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_sec_total = 0.0
+        self.wait_sec_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _retry_after(self) -> int:
+        backlog = self.queue_depth + 1
+        estimate = backlog * self._hold_sec / max(self.max_concurrency, 1)
+        return max(1, math.ceil(estimate))
+
+    def _grant_next(self) -> None:
+        while self._waiters and self._active < self.max_concurrency:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # timed out or cancelled while queued
+            self._active += 1
+            future.set_result(None)
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._grant_next()
+
+    async def _acquire(self, priority: str) -> None:
+        queued_at = time.monotonic()
+        if self._active < self.max_concurrency and not self.queue_depth:
+            self._active += 1
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.rejected += 1
+                raise UpstreamOverloaded(self.name, "queue full", self._retry_after())
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), future))
+            try:
+                await asyncio.wait_for(future, timeout=self.queue_timeout_sec)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise UpstreamOverloaded(self.name, "queue timeout", self._retry_after()) from None
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()  # granted just as we were cancelled
+                raise
+
+        try:
+            if self.max_rps > 0:
+                now = time.monotonic()
+                start_at = max(now, self._next_start_at)
+                self._next_start_at = start_at + 1.0 / self.max_rps
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+        except BaseException:
+            self._release()
+            raise
+
+        waited = time.monotonic() - queued_at
+        self.admitted += 1
+        self.wait_sec_total += waited
+        self.wait_sec_max = max(self.wait_sec_max, waited)
+        UPSTREAM_QUEUE_WAIT.observe(waited, limiter=self.name)
+
+    @asynccontextmanager
+    async def slot(self, priority: str | None = None) -> AsyncIterator[None]:
+        await self._acquire(priority or current_priority())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_sec = 0.8 * self._hold_sec + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_rps": self.max_rps,
+            "max_queue": self.max_queue,
+            "in_flight": self._active,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_sec_avg": self.wait_sec_total / self.admitted if self.admitted else 0.0,
+            "wait_sec_max": self.wait_sec_max,
+        }
+
+
+_LIMITERS: dict[tuple[str, str], ProviderLimiter] = {}
+
+
+def limiter_for(operation: str, model: str) -> ProviderLimiter:
+    """
+    Returns the limiter for an upstream operation (gemini_text, gemini_image,
+    veo_start, veo_poll) and model. Each model gets its own budget.
+    """
+    key = (operation, model)
+    limiter = _LIMITERS.get(key)
+    if limiter is None:
+        limits = UPSTREAM_LIMITS[operation]
+        limiter = ProviderLimiter(
+            f"{operation}:{model}",
+            max_concurrency=limits["concurrency"],
+            max_rps=limits["rps"],
+            max_queue=UPSTREAM_MAX_QUEUE,
+            queue_timeout_sec=UPSTREAM_QUEUE_TIMEOUT_SEC,
+        )
+        _LIMITERS[key] = limiter
+    return limiter
+
+
+def upstream_slot(operation: str, model: str, priority: str | None = None):
+    """
+    async with upstream_slot("gemini_image", model): ...
+    """
+    return limiter_for(operation, model).slot(priority)
+
+
+def limiter_stats() -> dict:
+    return {limiter.name: limiter.stats() for limiter in _LIMITERS.values()}
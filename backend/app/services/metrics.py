@@ -0,0 +1,252 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable
+
+# Latency buckets (seconds) wide enough for both cache hits and Veo renders.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Sample = tuple[str, dict[str, str], float]  # (suffix, labels, value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Current (suffix, labels, value) samples, read at scrape time."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            cumulative += state[len(self.buckets)]
+            yield "_bucket", {**labels, "le": "+Inf"}, cumulative
+            yield "_count", labels, cumulative
+            yield "_sum", labels, state[-1]
+
+
+# A collector returns (name, kind, help, samples) families computed at scrape time,
+# for values that already live elsewhere (cache stats, queue depths, ...).
+Family = tuple[str, str, str, list[Sample]]
+Collector = Callable[[], Iterable[Family]]
+
+
+class Registry:
+    """
+    Minimal Prometheus registry. Recording is a dict update under an uncontended
+    lock, so instrumentation can stay on in production; text rendering happens
+    only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        families: list[Family] = [
+            (m.name, m.kind, m.help, list(m.samples())) for m in self._metrics.values()
+        ]
+        for collector in self._collectors:
+            families.extend(collector())
+
+        lines: list[str] = []
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP routes (recorded by MetricsMiddleware).
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_CANCELLED = registry.counter(
+    "http_requests_cancelled_total",
+    "Requests whose work was cancelled because the client disconnected.",
+    ("method", "route"),
+)
+
+# Upstream provider calls (one sample per attempt, including retries and hedges).
+UPSTREAM_REQUESTS = registry.counter(
+    "upstream_requests_total",
+    "Upstream attempts by operation, model and outcome (ok or error class).",
+    ("operation", "model", "outcome"),
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Upstream attempt latency.",
+    ("operation", "model"),
+)
+UPSTREAM_BYTES = registry.counter(
+    "upstream_response_bytes_total",
+    "Response bytes received from upstream providers.",
+    ("operation", "model"),
+)
+UPSTREAM_QUEUE_WAIT = registry.histogram(
+    "upstream_queue_wait_seconds",
+    "Time spent waiting for an upstream limiter slot.",
+    ("limiter",),
+)
+
+# Local media work.
+MEDIA_DECODE_SECONDS = registry.counter(
+    "media_base64_decode_seconds_total", "Time spent decoding base64 media.", ("kind",)
+)
+MEDIA_WRITE_SECONDS = registry.counter(
+    "media_file_write_seconds_total", "Time spent writing media files.", ("kind",)
+)
+MEDIA_BYTES_WRITTEN = registry.counter(
+    "media_bytes_written_total", "Decoded media bytes written to disk.", ("kind",)
+)
+
+# Veo lifecycle.
+VEO_RENDER_SECONDS = registry.histogram(
+    "veo_render_duration_seconds",
+    "Time from Veo operation start until it was observed done.",
+    buckets=(10, 20, 30, 45, 60, 90, 120, 180, 300, 600, 900),
+)
+VEO_DOWNLOAD_SECONDS = registry.histogram(
+    "veo_download_duration_seconds", "Veo video download and store duration."
+)
@@ -1,14 +1,39 @@
+import asyncio
 import base64
 import binascii
-import mimetypes
+import hashlib
 from pathlib import Path
+import re
+import time
 import uuid
-import httpx
 
-from backend.app.config import GEMINI_API_KEY, GEMINI_IMAGE_MODEL
-
-GENERATED_DIR = Path(__file__).resolve().parents[2] / "static" / "generated"
-STATIC_DIR = Path(__file__).resolve().parents[2] / "static"
+from backend.app.config import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_IMAGE_MAX_CANDIDATES,
+    GEMINI_IMAGE_MODEL,
+    IMAGE_RESULT_CACHE_TTL_SEC,
+)
+from backend.app.services.assets import GENERATED_DIR, asset_store
+from backend.app.services.clients import get_client, timeout_for
+from backend.app.services.limiter import upstream_slot
+from backend.app.services.metrics import (
+    MEDIA_BYTES_WRITTEN,
+    MEDIA_DECODE_SECONDS,
+    MEDIA_WRITE_SECONDS,
+    UPSTREAM_BYTES,
+)
+from backend.app.services.resilience import UpstreamError, call_upstream
+from backend.app.services.references import (
+    encode_static_image_sync,
+    inline_reference_shape,
+    veo_reference_shape,
+)
+from backend.app.services.renditions import renditions
+from backend.app.services.shared_cache import shared_cache
+
+# Decode/write base64 image data off the event loop in blocks of this many characters.
+B64_FLUSH_CHARS = 1024 * 1024
 
 
 def build_moodboard_prompt(user_prompt: str) -> str:
@@ -60,7 +85,8 @@ def _ext_for_mime(mime: str) -> str:
 
 def decode_and_store_data_url(data_url: str, out_dir: Path, prefix: str = "img") -> str:
     """
-    Decodes a data URL (data:<mime>;base64,<data>) to a file and returns its name.
+    Decodes a data URL (data:<mime>;base64,<data>) to a file and returns its path
+    relative to out_dir. Files under the generated dir go through the asset store.
     """
     if not data_url.startswith("data:") or ";base64," not in data_url:
         raise ValueError("Expected base64 data URL (data:<mime>;base64,<data>)")
@@ -74,6 +100,9 @@ def decode_and_store_data_url(data_url: str, out_dir: Path, prefix: str = "img")
     except (binascii.Error, ValueError) as e:
         raise ValueError("Invalid base64 image data from Gemini") from e
 
+    if out_dir.resolve() == asset_store.root.resolve():
+        return asset_store.ingest_bytes(raw, kind=prefix, mime=mime, ext=ext)
+
     out_dir.mkdir(parents=True, exist_ok=True)
     filename = f"{prefix}-{uuid.uuid4().hex}.{ext}"
     (out_dir / filename).write_bytes(raw)
@@ -84,7 +113,7 @@ async def generate_image(prompt: str) -> str:
     """
     Calls Gemini image model and returns a data URL for the generated image.
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_IMAGE_MODEL}:generateContent"
+    url = f"{GEMINI_BASE_URL}/models/{GEMINI_IMAGE_MODEL}:generateContent"
     headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": GEMINI_API_KEY,
@@ -100,96 +129,382 @@ async def generate_image(prompt: str) -> str:
         },
     }
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
+    client = get_client("gemini")
+
+    async def attempt() -> dict:
+        async with upstream_slot("gemini_image", GEMINI_IMAGE_MODEL):
+            r = await client.post(url, headers=headers, json=payload, timeout=timeout_for("gemini_image"))
+        UPSTREAM_BYTES.inc(len(r.content), operation="gemini_image", model=GEMINI_IMAGE_MODEL)
         if r.is_error:
             # Bubble up provider details (including 4xx payload) for easier debugging.
             body = r.text[:1000]
-            raise ValueError(
-                f"Gemini image API error {r.status_code} for model '{GEMINI_IMAGE_MODEL}': {body}"
+            raise UpstreamError.from_response(
+                f"Gemini image API error {r.status_code} for model '{GEMINI_IMAGE_MODEL}': {body}", r
             )
-        resp_json = r.json()
+        return r.json()
+
+    resp_json = await call_upstream("gemini_image", GEMINI_IMAGE_MODEL, attempt)
 
     return _extract_image_data_url(resp_json)
 
 
-async def generate_and_store_image(prompt: str, prefix: str, description: str) -> dict:
-    data_url = await generate_image(prompt)
-    filename = decode_and_store_data_url(
-        data_url=data_url,
-        out_dir=GENERATED_DIR,
-        prefix=prefix,
-    )
-    return {
-        "image_url": f"/static/generated/{filename}",
-        "description": description,
-    }
-
+class _StreamedImage:
+    """
+    One inlineData part being decoded from base64 straight into a temp file, then
+    handed to the asset store.
+    """
 
-def static_image_url_to_reference(image_url: str, reference_type: str = "asset") -> dict:
+    def __init__(self, kind: str, prompt: str | None):
+        self.kind = kind
+        self.prompt = prompt
+        self.tmp_path = asset_store.root / f".{kind}-{uuid.uuid4().hex}.part"
+        self.mime: str | None = None
+        self.pending = bytearray()
+        self.complete = False
+        self.size = 0
+        self._file = None
+        self._digest = hashlib.sha256()
+
+    def _decode_and_write(self, b64_block: bytes) -> None:
+        started = time.perf_counter()
+        try:
+            raw = base64.b64decode(b64_block, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError("Invalid base64 image data from Gemini") from e
+        decoded = time.perf_counter()
+        if self._file is None:
+            self.tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.tmp_path, "wb")
+        self._file.write(raw)
+        self._digest.update(raw)
+        self.size += len(raw)
+        MEDIA_DECODE_SECONDS.inc(decoded - started, kind=self.kind)
+        MEDIA_WRITE_SECONDS.inc(time.perf_counter() - decoded, kind=self.kind)
+        MEDIA_BYTES_WRITTEN.inc(len(raw), kind=self.kind)
+
+    async def flush(self, final: bool = False) -> None:
+        usable = len(self.pending) if final else len(self.pending) - len(self.pending) % 4
+        if usable <= 0:
+            return
+        block = bytes(self.pending[:usable])
+        del self.pending[:usable]
+        await asyncio.to_thread(self._decode_and_write, block)
+
+    async def finish(self) -> str:
+        await self.flush(final=True)
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        if not self.size or not self.mime:
+            raise ValueError("Gemini image response contained an empty inlineData image")
+        return await asyncio.to_thread(
+            asset_store.ingest,
+            self.tmp_path,
+            kind=self.kind,
+            mime=self.mime,
+            ext=_ext_for_mime(self.mime),
+            prompt=self.prompt,
+            sha256=self._digest.hexdigest(),
+        )
+
+    async def discard(self) -> None:
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        await asyncio.to_thread(self.tmp_path.unlink, missing_ok=True)
+
+
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_INLINE_KEYS = {"inlineData", "inline_data"}
+_MIME_KEYS = {"mimeType", "mime_type"}
+_SIMPLE_ESCAPES = {
+    ord('"'): b'"',
+    ord("\\"): b"\\",
+    ord("/"): b"/",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+}
+_HEX4 = re.compile(rb"[0-9A-Fa-f]{4}")
+_BASE64_CHARS = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+
+
+class _InlineImageScanner:
     """
-    Converts a local static URL (e.g. /static/generated/x.png) to a Veo
-    referenceImages item using inlineData.
+    Incremental JSON scanner for generateContent responses. It tracks just enough
+    structure to find inlineData objects and routes their base64 "data" strings to
+    _StreamedImage sinks without materialising the full JSON document.
     """
-    if not image_url.startswith("/static/"):
-        raise ValueError(f"Unsupported static image URL: {image_url}")
 
-    rel = image_url[len("/static/") :]
-    image_path = (STATIC_DIR / rel).resolve()
-    static_root = STATIC_DIR.resolve()
-    if static_root not in image_path.parents and image_path != static_root:
-        raise ValueError(f"Image path escapes static dir: {image_url}")
-    if not image_path.exists():
-        raise ValueError(f"Image file not found for URL: {image_url}")
+    def __init__(self, kind: str, prompt: str | None = None, max_images: int = 1):
+        self.kind = kind
+        self.prompt = prompt
+        self.max_images = max_images
+        self.images: list[_StreamedImage] = []
+        self.head = bytearray()  # first bytes of non-image content, for error messages
+        # Each frame: [is_object, current_key, expecting_key, image_sink]
+        self._stack: list[list] = []
+        self._in_string = False
+        self._escape = False
+        self._unicode: bytearray | None = None  # hex digits of a \uXXXX escape so far
+        self._role = "skip"
+        self._buf = bytearray()
+        self._target: _StreamedImage | None = None
+
+    def feed(self, chunk: bytes) -> None:
+        if len(self.head) < 1000:
+            self.head += chunk[: 1000 - len(self.head)]
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if self._in_string:
+                i = self._scan_string(chunk, i)
+                continue
+            c = chunk[i]
+            i += 1
+            if c == 0x22:  # "
+                self._start_string()
+            elif c == 0x7B:  # {
+                self._open(is_object=True)
+            elif c == 0x5B:  # [
+                self._open(is_object=False)
+            elif c in (0x7D, 0x5D):  # } ]
+                self._close()
+            elif c == 0x3A:  # :
+                if self._stack:
+                    self._stack[-1][2] = False
+            elif c == 0x2C:  # ,
+                if self._stack and self._stack[-1][0]:
+                    self._stack[-1][2] = True
+
+    def _open(self, is_object: bool) -> None:
+        sink = None
+        if is_object and self._stack:
+            parent = self._stack[-1]
+            if parent[0] and parent[1] in _INLINE_KEYS and len(self.images) < self.max_images:
+                sink = _StreamedImage(self.kind, self.prompt)
+                self.images.append(sink)
+        self._stack.append([is_object, None, is_object, sink])
+
+    def _close(self) -> None:
+        if not self._stack:
+            return
+        frame = self._stack.pop()
+        if frame[3] is not None:
+            frame[3].complete = True
+
+    def _start_string(self) -> None:
+        self._in_string = True
+        self._buf.clear()
+        self._target = None
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            self._role = "skip"
+        elif frame[0] and frame[2]:
+            self._role = "key"
+        elif frame[3] is not None and frame[1] in _MIME_KEYS:
+            self._role = "mime"
+        elif frame[3] is not None and frame[1] == "data":
+            self._role = "data"
+            self._target = frame[3]
+        else:
+            self._role = "skip"
+
+    def _scan_string(self, chunk: bytes, i: int) -> int:
+        if self._unicode is not None:
+            # \uXXXX, possibly split across chunks (Google APIs write "=" as \u003d).
+            take = chunk[i : i + 4 - len(self._unicode)]
+            self._unicode += take
+            if len(self._unicode) == 4:
+                if not _HEX4.fullmatch(self._unicode):
+                    raise ValueError("Invalid \\u escape in Gemini response")
+                code_point = int(self._unicode, 16)
+                self._unicode = None
+                self._append_escaped(chr(code_point).encode("utf-8", "surrogatepass"))
+            return i + len(take)
+
+        if self._escape:
+            self._escape = False
+            c = chunk[i]
+            if c == 0x75:  # u
+                self._unicode = bytearray()
+            elif c in _SIMPLE_ESCAPES:
+                self._append_escaped(_SIMPLE_ESCAPES[c])
+            else:
+                raise ValueError("Invalid escape in Gemini response")
+            return i + 1
+
+        m = _STRING_SPECIAL.search(chunk, i)
+        end = m.start() if m else len(chunk)
+        if end > i:
+            self._append(chunk[i:end])
+        if m is None:
+            return len(chunk)
+        if chunk[end] == 0x5C:  # backslash
+            self._escape = True
+            return end + 1
+        self._end_string()
+        return end + 1
+
+    def _append_escaped(self, data: bytes) -> None:
+        # Raw characters are checked when the block is decoded; an escape can
+        # smuggle in anything, so reject non-base64 ones here.
+        if self._role == "data" and not _BASE64_CHARS.issuperset(data):
+            raise ValueError("Invalid base64 image data from Gemini")
+        self._append(data)
+
+    def _append(self, data: bytes) -> None:
+        if self._role == "data":
+            self._target.pending += data
+        elif self._role != "skip":
+            self._buf += data
+
+    def _end_string(self) -> None:
+        self._in_string = False
+        frame = self._stack[-1] if self._stack else None
+        if self._role == "key" and frame is not None:
+            frame[1] = self._buf.decode("utf-8", "replace")
+        elif self._role == "mime" and frame is not None:
+            frame[3].mime = self._buf.decode("utf-8", "replace")
+        self._target = None
+
+
+async def _generate_images_to_files(
+    prompt: str, prefix: str, max_images: int = 1, candidates: int = 1
+) -> list[str]:
+    """
+    Calls the Gemini image model and streams each returned inlineData image
+    into the asset store, then starts rendering their previews. Returns paths
+    relative to GENERATED_DIR. candidates > 1 asks for that many alternatives in
+    the same call (candidateCount).
+    """
+    url = f"{GEMINI_BASE_URL}/models/{GEMINI_IMAGE_MODEL}:generateContent"
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": GEMINI_API_KEY,
+    }
+    payload = {
+        "contents": [
+            {"role": "user", "parts": [{"text": prompt}]}
+        ],
+        # Force image output so we reliably get image parts.
+        "generationConfig": {
+            "responseModalities": ["Image"]
+        },
+    }
+    if candidates > 1:
+        payload["generationConfig"]["candidateCount"] = candidates
+
+    client = get_client("gemini")
+
+    async def attempt() -> list[str]:
+        # A fresh scanner per attempt; a failed attempt leaves no files behind.
+        scanner = _InlineImageScanner(prefix, prompt=prompt, max_images=max_images)
+        try:
+            async with upstream_slot("gemini_image", GEMINI_IMAGE_MODEL), client.stream(
+                "POST", url, headers=headers, json=payload, timeout=timeout_for("gemini_image")
+            ) as r:
+                if r.is_error:
+                    # Bubble up provider details (including 4xx payload) for easier debugging.
+                    body = (await r.aread())[:1000].decode("utf-8", "replace")
+                    raise UpstreamError.from_response(
+                        f"Gemini image API error {r.status_code} for model '{GEMINI_IMAGE_MODEL}': {body}", r
+                    )
+                async for chunk in r.aiter_bytes():
+                    UPSTREAM_BYTES.inc(len(chunk), operation="gemini_image", model=GEMINI_IMAGE_MODEL)
+                    scanner.feed(chunk)
+                    for image in scanner.images:
+                        if len(image.pending) >= B64_FLUSH_CHARS:
+                            await image.flush()
+
+            finished = [image for image in scanner.images if image.complete]
+            if not finished:
+                preview = scanner.head[:500].decode("utf-8", "replace")
+                raise ValueError(f"Gemini image response contained no inlineData image: {preview}")
+            return [await image.finish() for image in finished]
+        finally:
+            # Ingested images are untouched; this only drops leftover partial files.
+            for image in scanner.images:
+                await image.discard()
+
+    relpaths = await call_upstream("gemini_image", GEMINI_IMAGE_MODEL, attempt)
+    renditions.schedule(relpaths)
+    return relpaths
+
+
+def _stored_files_exist(relpaths: list[str]) -> bool:
+    return all((GENERATED_DIR / relpath).exists() for relpath in relpaths)
 
-    mime, _ = mimetypes.guess_type(str(image_path))
-    if not mime:
-        mime = "image/png"
-    data = base64.b64encode(image_path.read_bytes()).decode("ascii")
 
+async def generate_and_store_image(prompt: str, prefix: str, description: str) -> dict:
+    """
+    Generates one image for prompt. Identical prompts arriving within
+    IMAGE_RESULT_CACHE_TTL_SEC, on any worker, share a single generation.
+    """
+    filenames = await shared_cache.get_or_compute(
+        shared_cache.make_key("image", [GEMINI_IMAGE_MODEL, prefix, prompt]),
+        lambda: _generate_images_to_files(prompt, prefix=prefix, max_images=1),
+        ttl_sec=IMAGE_RESULT_CACHE_TTL_SEC,
+        validate=_stored_files_exist,
+    )
+    image_url = f"/static/generated/{filenames[0]}"
     return {
-        "image": {
-            "inlineData": {
-                "mimeType": mime,
-                "data": data,
-            }
-        },
-        "referenceType": reference_type,
+        "image_url": image_url,
+        **renditions.urls_for(image_url),
+        "description": description,
     }
 
 
-def static_image_url_to_veo_reference(image_url: str, reference_type: str = "asset") -> dict:
+async def _generate_image_variants(prompt: str, prefix: str, count: int) -> list[str]:
+    filenames: list[str] = []
+    while len(filenames) < count:
+        # Models may return fewer candidates than asked for; top up with more calls.
+        wanted = min(count - len(filenames), max(GEMINI_IMAGE_MAX_CANDIDATES, 1))
+        filenames += await _generate_images_to_files(
+            prompt, prefix=prefix, max_images=wanted, candidates=wanted
+        )
+    return filenames
+
+
+async def generate_and_store_image_variants(
+    prompt: str, prefix: str, description: str, count: int
+) -> list[dict]:
     """
-    Converts a local static URL to Veo predictLongRunning instances[].referenceImages shape:
-    {
-      image: { bytesBase64Encoded: <base64>, mimeType: <mime> },
-      referenceType: "ASSET" | "STYLE"
-    }
+    Generates count alternative images for prompt, up to GEMINI_IMAGE_MAX_CANDIDATES
+    per upstream call. A single variant shares its result with generate_and_store_image.
     """
-    if not image_url.startswith("/static/"):
-        raise ValueError(f"Unsupported static image URL: {image_url}")
+    if count <= 1:
+        return [await generate_and_store_image(prompt, prefix, description)]
+    filenames = await shared_cache.get_or_compute(
+        shared_cache.make_key("image_variants", [GEMINI_IMAGE_MODEL, prefix, prompt, count]),
+        lambda: _generate_image_variants(prompt, prefix, count),
+        ttl_sec=IMAGE_RESULT_CACHE_TTL_SEC,
+        validate=_stored_files_exist,
+    )
+    return [
+        {
+            "image_url": f"/static/generated/{filename}",
+            **renditions.urls_for(f"/static/generated/{filename}"),
+            "description": f"{description} (variant {i + 1})",
+        }
+        for i, filename in enumerate(filenames)
+    ]
 
-    rel = image_url[len("/static/") :]
-    image_path = (STATIC_DIR / rel).resolve()
-    static_root = STATIC_DIR.resolve()
-    if static_root not in image_path.parents and image_path != static_root:
-        raise ValueError(f"Image path escapes static dir: {image_url}")
-    if not image_path.exists():
-        raise ValueError(f"Image file not found for URL: {image_url}")
 
-    mime, _ = mimetypes.guess_type(str(image_path))
-    if not mime:
-        mime = "image/png"
-    data = base64.b64encode(image_path.read_bytes()).decode("ascii")
+def static_image_url_to_reference(image_url: str, reference_type: str = "asset") -> dict:
+    """
+    Converts a local static URL (e.g. /static/generated/x.png) to a Veo
+    referenceImages item using inlineData. Blocking and uncached; async callers
+    should use reference_encoder.encode with inline_reference_shape instead.
+    """
+    return inline_reference_shape(encode_static_image_sync(image_url), reference_type)
 
-    ref_type = reference_type.upper()
-    if ref_type not in {"ASSET", "STYLE"}:
-        ref_type = "ASSET"
 
-    return {
-        "image": {
-            "bytesBase64Encoded": data,
-            "mimeType": mime,
-        },
-        "referenceType": ref_type,
-    }
+def static_image_url_to_veo_reference(image_url: str, reference_type: str = "asset") -> dict:
+    """
+    Converts a local static URL to Veo predictLongRunning instances[].referenceImages shape.
+    Blocking and uncached; async callers should use reference_encoder.veo_reference instead.
+    """
+    return veo_reference_shape(encode_static_image_sync(image_url), reference_type)
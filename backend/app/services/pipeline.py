@@ -0,0 +1,132 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+StageFn = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class _Stage:
+    name: str
+    fn: StageFn
+    deps: tuple[str, ...]
+
+
+@dataclass
+class StageTiming:
+    status: str = "pending"  # pending | running | ok | failed | cancelled
+    started_at: float | None = None
+    duration_sec: float | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "duration_sec": round(self.duration_sec, 4) if self.duration_sec is not None else None,
+        }
+
+
+class PipelineError(ValueError):
+    """
+    Raised when a stage fails. Carries the outputs of stages that did finish and
+    the per-stage timings so callers can report partial results.
+    """
+
+    def __init__(self, stage: str, error: BaseException, partial: dict, timings: dict):
+        super().__init__(f"Pipeline stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.partial = partial
+        self.timings = timings
+
+    def report(self) -> dict:
+        return {
+            "message": str(self),
+            "stage": self.stage,
+            "completed_stages": sorted(self.partial),
+            "timings": self.timings,
+        }
+
+
+@dataclass
+class Pipeline:
+    """
+    Small dependency-aware async stage runner.
+
+    Each stage starts as soon as its declared dependencies finish and is called with
+    their outputs as keyword arguments. The first failure cancels everything still
+    running and raises PipelineError.
+    """
+
+    name: str
+    _stages: dict[str, _Stage] = field(default_factory=dict)
+
+    def stage(self, name: str, fn: StageFn, deps: tuple[str, ...] | list[str] = ()) -> "Pipeline":
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        for dep in deps:
+            if dep not in self._stages:
+                # Requiring dependencies to be declared first keeps the graph acyclic.
+                raise ValueError(f"Stage '{name}' depends on undeclared stage '{dep}'")
+        self._stages[name] = _Stage(name=name, fn=fn, deps=tuple(deps))
+        return self
+
+    async def run(self) -> tuple[dict[str, Any], dict[str, dict]]:
+        """
+        Runs every stage and returns (outputs by stage name, timings by stage name).
+        """
+        timings = {name: StageTiming() for name in self._stages}
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: _Stage) -> Any:
+            kwargs = {dep: await tasks[dep] for dep in stage.deps}
+            timing = timings[stage.name]
+            timing.status = "running"
+            timing.started_at = time.perf_counter()
+            try:
+                result = await stage.fn(**kwargs)
+            except asyncio.CancelledError:
+                timing.status = "cancelled"
+                raise
+            except Exception:
+                timing.status = "failed"
+                raise
+            finally:
+                timing.duration_sec = time.perf_counter() - timing.started_at
+            timing.status = "ok"
+            return result
+
+        for stage in self._stages.values():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage), name=f"{self.name}:{stage.name}")
+
+        try:
+            pending = set(tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                failed = next((t for t in done if not t.cancelled() and t.exception()), None)
+                if failed is not None:
+                    raise failed.exception()
+        except BaseException as error:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            if not isinstance(error, Exception):
+                raise
+            failed_stage = next(
+                (name for name, t in timings.items() if t.status == "failed"),
+                "unknown",
+            )
+            partial = {
+                name: task.result()
+                for name, task in tasks.items()
+                if task.done() and not task.cancelled() and task.exception() is None
+            }
+            raise PipelineError(
+                failed_stage,
+                error,
+                partial,
+                {name: t.as_dict() for name, t in timings.items()},
+            ) from error
+
+        outputs = {name: task.result() for name, task in tasks.items()}
+        return outputs, {name: t.as_dict() for name, t in timings.items()}
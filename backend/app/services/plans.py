@@ -0,0 +1,109 @@
+import asyncio
+from typing import AsyncIterator
+
+from backend.app.services.gemini import gemini_generate_text_bundle, gemini_stream_text_bundle
+from backend.app.store import create_plan, get_plan, update_plan
+
+
+def _constraints(bundle: dict) -> dict:
+    negatives = bundle.get("negatives")
+    if not isinstance(negatives, list) or not negatives:
+        raise ValueError("Gemini bundle missing required keys")
+    # A single prompt string for UI consumption.
+    return {"negatives": ", ".join(negatives)}
+
+
+def _hexcodes(bundle: dict) -> dict:
+    palette = bundle.get("palette")
+    if palette is None:
+        raise ValueError("Gemini bundle missing palette")
+    return {"hexcodes": palette}
+
+
+def _summary(bundle: dict) -> dict:
+    summary = bundle.get("summary")
+    if summary is None:
+        raise ValueError("Gemini bundle missing summary")
+    return {"summary": summary}
+
+
+# Response body (without plan_id) of each section derived from the text bundle.
+BUNDLE_SECTIONS = {
+    "constraints": _constraints,
+    "hexcodes": _hexcodes,
+    "summary": _summary,
+}
+
+
+class PlanNotFound(LookupError):
+    def __init__(self, plan_id: str):
+        super().__init__(f"Unknown or expired plan: {plan_id}")
+        self.plan_id = plan_id
+
+
+class PlanPromptMismatch(ValueError):
+    def __init__(self, plan_id: str):
+        super().__init__(f"Plan {plan_id} was created for a different prompt")
+        self.plan_id = plan_id
+
+
+async def load_plan(plan_id: str | None) -> dict | None:
+    if not plan_id:
+        return None
+    return await asyncio.to_thread(get_plan, plan_id)
+
+
+async def plan_for_prompt(plan_id: str | None, prompt: str) -> dict | None:
+    """
+    Loads the plan a request refers to. Raises PlanNotFound when plan_id is unknown
+    or expired and PlanPromptMismatch when it was created for another prompt, so
+    stored sections are never silently swapped for (or mixed with) new ones.
+    """
+    if not plan_id:
+        return None
+    plan = await load_plan(plan_id)
+    if plan is None:
+        raise PlanNotFound(plan_id)
+    if (plan.get("prompt") or "").strip() != prompt.strip():
+        raise PlanPromptMismatch(plan_id)
+    return plan
+
+
+async def resolve_bundle(prompt: str, plan_id: str | None = None) -> tuple[str, dict]:
+    """
+    Returns (plan_id, bundle). Reuses the stored bundle when plan_id refers to a
+    plan for this prompt; otherwise generates the bundle and records it in a new
+    plan. See plan_for_prompt for the errors an unusable plan_id raises.
+    """
+    plan = await plan_for_prompt(plan_id, prompt)
+    if plan is not None and isinstance(plan.get("bundle"), dict):
+        return plan_id, plan["bundle"]
+
+    bundle = await gemini_generate_text_bundle(prompt)
+    new_plan_id = await asyncio.to_thread(create_plan, prompt, bundle)
+    return new_plan_id, bundle
+
+
+async def stream_bundle(prompt: str, plan_id: str | None = None) -> AsyncIterator[tuple[str, object]]:
+    """
+    Streaming counterpart of resolve_bundle: yields (key, value) for each bundle
+    member as soon as it is available, then ("plan_id", plan_id) once the whole
+    bundle is known and recorded in a plan.
+    """
+    plan = await plan_for_prompt(plan_id, prompt)
+    if plan is not None and isinstance(plan.get("bundle"), dict):
+        for key, value in plan["bundle"].items():
+            yield key, value
+        yield "plan_id", plan_id
+        return
+
+    bundle = {}
+    async for key, value in gemini_stream_text_bundle(prompt):
+        bundle[key] = value
+        yield key, value
+    yield "plan_id", await asyncio.to_thread(create_plan, prompt, bundle)
+
+
+async def save_to_plan(plan_id: str | None, patch: dict) -> None:
+    if plan_id:
+        await asyncio.to_thread(update_plan, plan_id, patch)
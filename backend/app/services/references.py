@@ -0,0 +1,128 @@
+import asyncio
+import base64
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from backend.app.config import REFERENCE_CACHE_MAX_BYTES, STATIC_DIR as _STATIC_DIR
+from backend.app.services.assets import asset_store
+from backend.app.services.cache import SingleFlightCache
+
+STATIC_DIR = Path(_STATIC_DIR).resolve()
+
+# Content-addressed assets are named by their sha256, which saves hashing them.
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    sha256: str
+    mime: str
+    data: str  # base64
+
+
+def resolve_static_path(image_url: str) -> Path:
+    """
+    Maps a local static URL (e.g. /static/generated/x.png) to a file on disk.
+    """
+    if not image_url.startswith("/static/"):
+        raise ValueError(f"Unsupported static image URL: {image_url}")
+
+    rel = image_url[len("/static/") :]
+    image_path = (STATIC_DIR / rel).resolve()
+    static_root = STATIC_DIR.resolve()
+    if static_root not in image_path.parents and image_path != static_root:
+        raise ValueError(f"Image path escapes static dir: {image_url}")
+    if not image_path.exists():
+        raise ValueError(f"Image file not found for URL: {image_url}")
+    return image_path
+
+
+def _guess_mime(image_path: Path) -> str:
+    mime, _ = mimetypes.guess_type(str(image_path))
+    return mime or "image/png"
+
+
+def _read_and_encode(image_path: Path) -> EncodedImage:
+    raw = image_path.read_bytes()
+    return EncodedImage(
+        sha256=hashlib.sha256(raw).hexdigest(),
+        mime=_guess_mime(image_path),
+        data=base64.b64encode(raw).decode("ascii"),
+    )
+
+
+def encode_static_image_sync(image_url: str) -> EncodedImage:
+    return _read_and_encode(resolve_static_path(image_url))
+
+
+def veo_reference_shape(image: EncodedImage, reference_type: str) -> dict:
+    """
+    Veo predictLongRunning instances[].referenceImages item:
+    { image: { bytesBase64Encoded, mimeType }, referenceType: "ASSET" | "STYLE" }
+    """
+    ref_type = reference_type.upper()
+    if ref_type not in {"ASSET", "STYLE"}:
+        ref_type = "ASSET"
+    return {
+        "image": {
+            "bytesBase64Encoded": image.data,
+            "mimeType": image.mime,
+        },
+        "referenceType": ref_type,
+    }
+
+
+def inline_reference_shape(image: EncodedImage, reference_type: str) -> dict:
+    return {
+        "image": {
+            "inlineData": {
+                "mimeType": image.mime,
+                "data": image.data,
+            }
+        },
+        "referenceType": reference_type,
+    }
+
+
+class ReferenceEncoder:
+    """
+    Reads and base64-encodes reference images off the event loop and caches the
+    encoded payloads by content hash within a memory budget, so a moodboard or
+    storyboard is encoded once no matter how many retries or Veo calls use it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._encoded = SingleFlightCache(
+            "reference_encodings",
+            ttl_sec=float("inf"),
+            max_entries=1024,
+            max_weight=max_bytes,
+            weigh=lambda image: len(image.data),
+        )
+
+    async def encode(self, image_url: str) -> EncodedImage:
+        image_path = await asyncio.to_thread(resolve_static_path, image_url)
+        if _SHA256_NAME.match(image_path.stem):
+            key = image_path.stem
+        else:
+            # Legacy <prefix>-<uuid> files: identify the bytes by path and stat.
+            stat = await asyncio.to_thread(image_path.stat)
+            key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+
+        image = await self._encoded.get_or_compute(
+            key, lambda: asyncio.to_thread(_read_and_encode, image_path)
+        )
+        await asyncio.to_thread(asset_store.touch, image_url)
+        return image
+
+    async def veo_reference(self, image_url: str, reference_type: str = "asset") -> dict:
+        return veo_reference_shape(await self.encode(image_url), reference_type)
+
+    def stats(self) -> dict:
+        return {"encodings": self._encoded.stats()}
+
+
+reference_encoder = ReferenceEncoder(max_bytes=REFERENCE_CACHE_MAX_BYTES)
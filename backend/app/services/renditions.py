@@ -0,0 +1,168 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from backend.app.config import (
+    RENDITION_MEDIUM_PX,
+    RENDITION_THUMB_PX,
+    RENDITION_WEBP_QUALITY,
+    RENDITION_WORKERS,
+    RENDITIONS_ENABLED,
+)
+from backend.app.services.assets import GENERATED_DIR, RENDITIONS_DIR, asset_store
+from backend.app.services.cache import InflightTasks
+from backend.app.services.imaging import render_webp
+
+# Longest side in pixels per rendition.
+RENDITION_SIZES = {"thumb": RENDITION_THUMB_PX, "medium": RENDITION_MEDIUM_PX}
+RENDITION_URL_PREFIX = "/v1/renditions/"
+
+# Content-addressed image URLs: /static/generated/<sha[:2]>/<sha>.<ext>
+_CONTENT_ADDRESSED_URL = re.compile(r"^/static/generated/[0-9a-f]{2}/([0-9a-f]{64})\.[A-Za-z0-9]+$")
+
+
+def _pillow_available() -> bool:
+    return RENDITIONS_ENABLED and importlib.util.find_spec("PIL") is not None
+
+
+class RenditionService:
+    """
+    Downscaled WebP renditions (thumb, medium) of generated images.
+
+    Renditions are rendered in a process pool, so resizing and encoding never
+    block the event loop or hold the GIL of the serving process. They are
+    written to static/generated/renditions/<name>/<sha[:2]>/<sha>.webp, next to
+    their content-addressed source, and deleted with it by the asset store.
+
+    Rendering starts in the background as soon as an image is stored and
+    otherwise on the first request for a rendition; concurrent requests for
+    the same one share a single render. Images stored before the asset store
+    (legacy names) have no renditions.
+    """
+
+    def __init__(self, sizes: dict[str, int], quality: int, workers: int, enabled: bool = True):
+        self.sizes = sizes
+        self.quality = quality
+        self.workers = workers
+        self.enabled = enabled
+        self._pool: ProcessPoolExecutor | None = None
+        self._inflight = InflightTasks()
+        self._background: set[asyncio.Task] = set()
+        self.rendered = 0
+        self.rendered_bytes = 0
+        self.errors = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers only import services/imaging.py, and forking a
+            # process with running threads (asyncio.to_thread, SQLite) is unsafe.
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(self.workers, 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @staticmethod
+    def source_digest(image_url: str) -> str | None:
+        match = _CONTENT_ADDRESSED_URL.match(image_url)
+        return match.group(1) if match else None
+
+    def path_for(self, name: str, digest: str) -> Path:
+        return RENDITIONS_DIR / name / digest[:2] / f"{digest}.webp"
+
+    def urls_for(self, image_url: str) -> dict[str, str]:
+        """
+        {"<name>_url": url} for each rendition of image_url; empty when
+        renditions are unavailable or the image is not content-addressed.
+        """
+        digest = self.source_digest(image_url)
+        if not self.enabled or digest is None:
+            return {}
+        return {f"{name}_url": f"{RENDITION_URL_PREFIX}{name}/{digest}.webp" for name in self.sizes}
+
+    def schedule(self, relpaths: list[str]) -> None:
+        """
+        Starts rendering every rendition of freshly stored images in the
+        background, without delaying the response that stored them.
+        """
+        if not self.enabled:
+            return
+        for relpath in relpaths:
+            digest = self.source_digest(asset_store.url_for(relpath))
+            if digest is None:
+                continue
+            for name in self.sizes:
+                task = asyncio.create_task(self._render_quietly(name, digest))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    async def _render_quietly(self, name: str, digest: str) -> None:
+        try:
+            await self.ensure(name, digest)
+        except Exception:
+            pass  # counted in stats; a request for it renders again
+
+    async def ensure(self, name: str, digest: str) -> Path | None:
+        """
+        Returns the path of a rendition, rendering it first if needed. None if
+        the source image is not in the asset store.
+        """
+        path = self.path_for(name, digest)
+        if await asyncio.to_thread(path.exists):
+            return path
+        key = (name, digest)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight.start(key, self._render(name, digest, path))
+        return await self._inflight.wait(key, task)
+
+    async def _render(self, name: str, digest: str, path: Path) -> Path | None:
+        relpath = await asyncio.to_thread(asset_store.relpath_for, digest)
+        if relpath is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(
+                self._executor(),
+                render_webp,
+                str(GENERATED_DIR / relpath),
+                str(path),
+                self.sizes[name],
+                self.quality,
+            )
+        except Exception:
+            self.errors += 1
+            raise
+        self.rendered += 1
+        self.rendered_bytes += size
+        return path
+
+    async def shutdown(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sizes": self.sizes,
+            "workers": self.workers,
+            "inflight": len(self._inflight),
+            "rendered": self.rendered,
+            "rendered_bytes": self.rendered_bytes,
+            "errors": self.errors,
+        }
+
+
+renditions = RenditionService(
+    sizes=RENDITION_SIZES,
+    quality=RENDITION_WEBP_QUALITY,
+    workers=RENDITION_WORKERS,
+    enabled=_pillow_available(),
+)
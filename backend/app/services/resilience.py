@@ -0,0 +1,347 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from backend.app.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT_SEC,
+    UPSTREAM_HEDGE_ENABLED,
+    UPSTREAM_HEDGE_MIN_DELAY_SEC,
+    UPSTREAM_HEDGE_MIN_SAMPLES,
+    UPSTREAM_HEDGE_PERCENTILE,
+    UPSTREAM_RETRY_BASE_DELAY_SEC,
+    UPSTREAM_RETRY_MAX_ATTEMPTS,
+    UPSTREAM_RETRY_MAX_DELAY_SEC,
+    UPSTREAM_RETRY_MAX_RETRY_AFTER_SEC,
+)
+from backend.app.services.limiter import UpstreamOverloaded
+from backend.app.services.metrics import UPSTREAM_LATENCY, UPSTREAM_REQUESTS
+
+# Worth retrying: the provider may succeed on a later attempt.
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Safe to retry even for non-idempotent calls: the request was not processed.
+UNPROCESSED_STATUSES = {429, 503}
+# Count towards opening the circuit: the provider itself is failing.
+BREAKER_STATUSES = {500, 502, 503, 504}
+
+
+class UpstreamError(ValueError):
+    """
+    An upstream HTTP error response. Keeps the provider's status code and any
+    Retry-After hint so the resilience layer can classify it.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, message: str, response: httpx.Response) -> "UpstreamError":
+        return cls(message, response.status_code, parse_retry_after(response.headers.get("retry-after")))
+
+
+class CircuitOpen(UpstreamOverloaded):
+    """
+    Raised without calling the provider while a model's circuit is open.
+    """
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(error: BaseException) -> str:
+    """
+    Short error class used for retry decisions and metrics.
+    """
+    if isinstance(error, UpstreamError):
+        return f"http_{error.status_code}"
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return "connect"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.TransportError):
+        return "transport"
+    return "other"
+
+
+def _is_retryable(error: BaseException, idempotent: bool) -> bool:
+    if isinstance(error, UpstreamError):
+        statuses = RETRYABLE_STATUSES if idempotent else UNPROCESSED_STATUSES
+        return error.status_code in statuses
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.TransportError):
+        # The request may have reached the provider; only repeat idempotent calls.
+        return idempotent
+    return False
+
+
+def _trips_breaker(error: BaseException) -> bool:
+    if isinstance(error, UpstreamError):
+        return error.status_code in BREAKER_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive provider failures and rejects calls
+    for reset_timeout_sec. Then one trial call is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_sec: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return
+        remaining = self.opened_at + self.reset_timeout_sec - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpen(self.name, "circuit open", max(1, int(remaining + 0.999)))
+
+    def on_abandon(self) -> None:
+        """
+        The call ended without an answer from the provider (cancelled or shed).
+        """
+        self._trial_in_flight = False
+
+    def on_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def on_failure(self, error: BaseException) -> None:
+        self._trial_in_flight = False
+        if not _trips_breaker(error):
+            if self.state == "half_open":
+                self.state = "closed"  # the provider answered; it is not down
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+class _CallStats:
+    """
+    Attempt counters and a latency window for one (operation, model).
+    """
+
+    def __init__(self, operation: str, model: str):
+        self.operation = operation
+        self.model = model
+        self.attempts = 0
+        self.successes = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.errors: dict[str, int] = {}
+        self.latencies: deque[float] = deque(maxlen=200)
+
+    def record(self, duration: float, error: BaseException | None) -> None:
+        self.attempts += 1
+        if error is None:
+            outcome = "ok"
+            self.successes += 1
+            self.latencies.append(duration)
+        else:
+            outcome = classify(error)
+            self.errors[outcome] = self.errors.get(outcome, 0) + 1
+        UPSTREAM_REQUESTS.inc(operation=self.operation, model=self.model, outcome=outcome)
+        UPSTREAM_LATENCY.observe(duration, operation=self.operation, model=self.model)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def as_dict(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "errors": dict(self.errors),
+            "latency_p50_sec": self.percentile(0.5),
+            "latency_p95_sec": self.percentile(0.95),
+        }
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_STATS: dict[tuple[str, str], _CallStats] = {}
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _BREAKERS.get(model)
+    if breaker is None:
+        breaker = CircuitBreaker(model, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT_SEC)
+        _BREAKERS[model] = breaker
+    return breaker
+
+
+def _stats_for(operation: str, model: str) -> _CallStats:
+    key = (operation, model)
+    stats = _STATS.get(key)
+    if stats is None:
+        stats = _CallStats(operation, model)
+        _STATS[key] = stats
+    return stats
+
+
+def backoff_delay(attempt: int, retry_after: float | None) -> float:
+    """
+    Full-jitter exponential backoff for the given retry number (1-based),
+    never shorter than the provider's Retry-After.
+    """
+    ceiling = min(UPSTREAM_RETRY_MAX_DELAY_SEC, UPSTREAM_RETRY_BASE_DELAY_SEC * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def _timed_attempt(stats: _CallStats, attempt: Callable[[], Awaitable[Any]]) -> Any:
+    started = time.monotonic()
+    try:
+        result = await attempt()
+    except UpstreamOverloaded:
+        raise
+    except Exception as e:
+        stats.record(time.monotonic() - started, e)
+        raise
+    stats.record(time.monotonic() - started, None)
+    return result
+
+
+async def _hedged_attempt(stats: _CallStats, attempt: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Runs attempt(); if it is still running after the observed p95 latency, starts
+    a second identical attempt and returns whichever succeeds first.
+    """
+    p95 = stats.percentile(UPSTREAM_HEDGE_PERCENTILE)
+    if p95 is None or len(stats.latencies) < UPSTREAM_HEDGE_MIN_SAMPLES:
+        return await _timed_attempt(stats, attempt)
+
+    primary = asyncio.ensure_future(_timed_attempt(stats, attempt))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=max(p95, UPSTREAM_HEDGE_MIN_DELAY_SEC))
+        if not done:
+            stats.hedges += 1
+            tasks.add(asyncio.ensure_future(_timed_attempt(stats, attempt)))
+        error: BaseException | None = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            # Read every outcome first: a failure finishing alongside the winner
+            # would otherwise be logged as a never-retrieved task exception.
+            errors = {task: task.exception() for task in done}
+            for task in done:
+                if errors[task] is None:
+                    if task is not primary:
+                        stats.hedge_wins += 1
+                    return task.result()
+                error = errors[task]
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_upstream(
+    operation: str,
+    model: str,
+    attempt: Callable[[], Awaitable[Any]],
+    idempotent: bool = True,
+    hedge: bool = False,
+    can_retry: Callable[[], bool] | None = None,
+) -> Any:
+    """
+    Runs one upstream call with classified retries, optional hedging and the
+    model's circuit breaker. attempt() performs a single request (including its
+    limiter slot) and raises UpstreamError or httpx errors on failure.
+
+    Non-idempotent calls are only retried when the provider cannot have acted
+    on the request (connect errors, 429, 503). Hedging is only used when enabled
+    in config and the call is idempotent. can_retry() is asked before each
+    retry; returning False surfaces the error instead (e.g. a streamed call
+    that already handed out partial output).
+    """
+    breaker = breaker_for(model)
+    stats = _stats_for(operation, model)
+    use_hedge = hedge and idempotent and UPSTREAM_HEDGE_ENABLED
+    retry = 0
+    while True:
+        breaker.before_call()
+        try:
+            if use_hedge:
+                result = await _hedged_attempt(stats, attempt)
+            else:
+                result = await _timed_attempt(stats, attempt)
+        except (UpstreamOverloaded, asyncio.CancelledError):
+            # Shed locally or cancelled by the caller; says nothing about the provider.
+            breaker.on_abandon()
+            raise
+        except Exception as e:
+            breaker.on_failure(e)
+            retry += 1
+            if retry >= UPSTREAM_RETRY_MAX_ATTEMPTS or not _is_retryable(e, idempotent):
+                raise
+            if can_retry is not None and not can_retry():
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None and retry_after > UPSTREAM_RETRY_MAX_RETRY_AFTER_SEC:
+                raise  # asked to wait longer than a request should; surface it
+            stats.retries += 1
+            await asyncio.sleep(backoff_delay(retry, retry_after))
+            continue
+        breaker.on_success()
+        return result
+
+
+def resilience_stats() -> dict:
+    return {
+        "calls": {f"{operation}:{model}": s.as_dict() for (operation, model), s in _STATS.items()},
+        "circuit_breakers": {name: b.stats() for name, b in _BREAKERS.items()},
+    }
@@ -0,0 +1,110 @@
+from collections import Counter
+from typing import Iterable
+
+from backend.app.services.gemini import text_bundle_cache
+from backend.app.services.limiter import limiter_stats
+from backend.app.services.metrics import Family, registry
+from backend.app.services.references import reference_encoder
+from backend.app.services.resilience import resilience_stats
+from backend.app.services.shared_cache import shared_cache
+from backend.app.services.veo import veo_poller
+from backend.app.services.veo_jobs import TERMINAL_STATES, veo_jobs
+from backend.app.services.veo_renders import veo_render_cache
+
+_JOB_STATES = ("queued", "preparing", "starting", "polling", "downloading", *sorted(TERMINAL_STATES))
+
+
+def _cache_families() -> Iterable[Family]:
+    caches = [text_bundle_cache.stats(), reference_encoder.stats()["encodings"]]
+    for name, key, kind, help_text in (
+        ("cache_hits_total", "hits", "counter", "In-process cache hits."),
+        ("cache_misses_total", "misses", "counter", "In-process cache misses (upstream computations)."),
+        ("cache_coalesced_total", "coalesced", "counter", "Callers that joined an in-flight computation."),
+        ("cache_evictions_total", "evictions", "counter", "Entries evicted to stay within budget."),
+        ("cache_cancelled_total", "cancelled", "counter", "Computations cancelled after every caller went away."),
+        ("cache_entries", "entries", "gauge", "Entries currently cached."),
+        ("cache_inflight", "inflight", "gauge", "Computations currently in flight."),
+        ("cache_hit_ratio", "hit_ratio", "gauge", "(hits + coalesced) / lookups since start."),
+    ):
+        yield name, kind, help_text, [("", {"cache": c["name"]}, c[key]) for c in caches]
+
+    shared = shared_cache.stats()
+    for key in ("hits", "misses", "waits", "coalesced", "cancelled", "takeovers", "errors"):
+        yield (
+            f"shared_cache_{key}_total",
+            "counter",
+            f"Cross-process cache {key}.",
+            [("", {}, shared[key])],
+        )
+
+
+def _limiter_families() -> Iterable[Family]:
+    limiters = limiter_stats()
+    yield "upstream_in_flight", "gauge", "Upstream calls holding a limiter slot.", [
+        ("", {"limiter": name}, s["in_flight"]) for name, s in limiters.items()
+    ]
+    yield "upstream_queue_depth", "gauge", "Upstream calls waiting for a limiter slot.", [
+        ("", {"limiter": name}, s["queue_depth"]) for name, s in limiters.items()
+    ]
+    yield "upstream_shed_total", "counter", "Upstream calls shed by admission control.", [
+        sample
+        for name, s in limiters.items()
+        for sample in (
+            ("", {"limiter": name, "reason": "queue_full"}, s["rejected"]),
+            ("", {"limiter": name, "reason": "queue_timeout"}, s["timeouts"]),
+        )
+    ]
+
+    resilience = resilience_stats()
+    yield "upstream_retries_total", "counter", "Upstream retries after a failed attempt.", [
+        ("", {"call": name}, s["retries"]) for name, s in resilience["calls"].items()
+    ]
+    yield "upstream_hedges_total", "counter", "Hedged second attempts started.", [
+        ("", {"call": name}, s["hedges"]) for name, s in resilience["calls"].items()
+    ]
+    breakers = resilience["circuit_breakers"]
+    yield "upstream_circuit_open", "gauge", "1 while a model's circuit breaker is not closed.", [
+        ("", {"model": name}, 0 if b["state"] == "closed" else 1) for name, b in breakers.items()
+    ]
+    yield "upstream_circuit_opens_total", "counter", "Times a circuit breaker opened.", [
+        ("", {"model": name}, b["opens"]) for name, b in breakers.items()
+    ]
+
+
+def _veo_families() -> Iterable[Family]:
+    poller = veo_poller.stats()
+    yield "veo_operations_outstanding", "gauge", "Veo operations being polled.", [
+        ("", {}, poller["outstanding"])
+    ]
+    yield "veo_polls_total", "counter", "Veo operation reads issued by the poller.", [
+        ("", {}, poller["polls"])
+    ]
+    yield "veo_expected_render_seconds", "gauge", "Median recent Veo render time used for polling.", [
+        ("", {}, poller["expected_render_sec"])
+    ]
+    # Refreshed off the event loop by the /metrics handler.
+    renders = veo_render_cache.last_stats()
+    yield "veo_render_cache_lookups_total", "counter", "Veo render cache lookups by outcome.", [
+        ("", {"result": result}, renders[key])
+        for result, key in (("hit", "hits"), ("attached", "attached"), ("miss", "misses"))
+    ]
+    yield "veo_render_cache_evictions_total", "counter", "Cached Veo renders evicted.", [
+        ("", {}, renders["evictions"])
+    ]
+    yield "veo_render_cache_bytes", "gauge", "Bytes of staged MP4s held by the render cache.", [
+        ("", {}, renders["bytes"])
+    ]
+    states = Counter(job.status for job in veo_jobs.local_jobs())
+    yield "veo_jobs", "gauge", "Veo jobs run by this worker, by status.", [
+        ("", {"status": state}, states.get(state, 0)) for state in _JOB_STATES
+    ]
+
+
+def register_runtime_collectors() -> None:
+    """
+    Exposes existing component stats (caches, limiters, breakers, Veo) on
+    /metrics. They are read at scrape time, so nothing extra runs per request.
+    """
+    registry.add_collector(_cache_families)
+    registry.add_collector(_limiter_families)
+    registry.add_collector(_veo_families)
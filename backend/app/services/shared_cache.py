@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from backend.app.config import (
+    SHARED_CACHE_ENABLED,
+    SHARED_CACHE_LEASE_SEC,
+    SHARED_CACHE_MAX_ENTRIES,
+    SHARED_CACHE_PATH,
+)
+from backend.app.services.cache import InflightTasks
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Waiters re-check the shared state with a capped exponential backoff.
+_WAIT_MIN_SEC = 0.05
+_WAIT_MAX_SEC = 1.0
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # e.g. EPERM: exists, owned by another user
+    return True
+
+
+class SharedCache:
+    """
+    Result cache and single-flight lock shared by every worker process on one host.
+
+    The first process to miss a key takes a lease on it in a SQLite (WAL) file and
+    does the upstream work; the others poll until the result is written and read
+    it from there. The lease holder renews its lease while it works, so a worker
+    that crashes mid-flight stops renewing and its lease expires (or is taken over
+    at once if its pid is gone). A failed computation releases the lease without
+    caching anything and the next waiter computes instead.
+
+    Callers within one worker share a single attempt per key, which is cancelled
+    (releasing the lease) once all of them are; waiters in other workers then
+    take over. Values must be JSON serializable.
+    """
+
+    def __init__(self, path: Path, lease_sec: float, max_entries: int, enabled: bool = True):
+        self.path = path
+        self.lease_sec = lease_sec
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._local = threading.local()
+        # Every thread's connection, so close() can reach them all.
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._inflight = InflightTasks()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.coalesced = 0
+        self.takeovers = 0
+        self.errors = 0
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Used by one thread only; check_same_thread=False lets close() run anywhere.
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """
+        Closes every thread's connection; the cache reconnects if used again.
+        """
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    @staticmethod
+    def make_key(namespace: str, parts: Any) -> str:
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{namespace}:{digest}"
+
+    def _acquire(
+        self, key: str, owner: str, validate: Callable[[Any], bool] | None
+    ) -> tuple[str, Any]:
+        """
+        Returns ("hit", value), ("owner", None) when this caller now holds the
+        lease, or ("wait", None) when another live process holds it.
+        """
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                if validate is None or validate(value):
+                    return "hit", value
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+            lease = db.execute("SELECT pid, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if lease is not None and lease[1] > now and _pid_alive(lease[0]):
+                return "wait", None
+            if lease is not None:
+                self.takeovers += 1
+            db.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, pid, expires_at) VALUES (?, ?, ?, ?)",
+                (key, owner, os.getpid(), now + self.lease_sec),
+            )
+            return "owner", None
+
+    def _renew(self, key: str, owner: str) -> None:
+        self._db().execute(
+            "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+            (time.time() + self.lease_sec, key, owner),
+        )
+
+    def _complete(self, key: str, owner: str, value: Any, ttl_sec: float) -> None:
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl_sec),
+            )
+            db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+            db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            db.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _release(self, key: str, owner: str) -> None:
+        self._db().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    async def _heartbeat(self, key: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_sec / 3)
+            try:
+                await asyncio.to_thread(self._renew, key, owner)
+            except sqlite3.Error:
+                self.errors += 1
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_sec: float,
+        validate: Callable[[Any], bool] | None = None,
+    ) -> Any:
+        """
+        Returns the cached value for key, or runs compute() in exactly one process
+        and shares its result. validate(value) may reject a cached value (e.g. a
+        file that has since been evicted), which counts as a miss.
+        """
+        if not self.enabled or ttl_sec <= 0:
+            return await compute()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight.start(key, self._get_or_compute(key, compute, ttl_sec, validate))
+        else:
+            self.coalesced += 1
+        return await self._inflight.wait(key, task)
+
+    async def _get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_sec: float,
+        validate: Callable[[Any], bool] | None,
+    ) -> Any:
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        delay = _WAIT_MIN_SEC
+        waited = False
+        while True:
+            try:
+                state, value = await asyncio.to_thread(self._acquire, key, owner, validate)
+            except sqlite3.Error:
+                # The shared layer is an optimization; never fail a request over it.
+                self.errors += 1
+                return await compute()
+            if state == "hit":
+                self.hits += 1
+                return value
+            if state == "owner":
+                break
+            if not waited:
+                waited = True
+                self.waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _WAIT_MAX_SEC)
+
+        self.misses += 1
+        heartbeat = asyncio.create_task(self._heartbeat(key, owner))
+        try:
+            value = await compute()
+        except BaseException:
+            heartbeat.cancel()
+            try:
+                await asyncio.to_thread(self._release, key, owner)
+            except (sqlite3.Error, asyncio.CancelledError):
+                pass  # the lease simply expires
+            raise
+        heartbeat.cancel()
+        try:
+            await asyncio.to_thread(self._complete, key, owner, value, ttl_sec)
+        except sqlite3.Error:
+            self.errors += 1
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path),
+            "lease_sec": self.lease_sec,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "coalesced": self.coalesced,
+            "cancelled": self._inflight.cancelled,
+            "takeovers": self.takeovers,
+            "errors": self.errors,
+        }
+
+
+shared_cache = SharedCache(
+    Path(SHARED_CACHE_PATH),
+    lease_sec=SHARED_CACHE_LEASE_SEC,
+    max_entries=SHARED_CACHE_MAX_ENTRIES,
+    enabled=SHARED_CACHE_ENABLED,
+)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from typing import AsyncIterator
+
+from backend.app.services.nanobanana import (
+    build_moodboard_prompt,
+    build_storyboard_prompt,
+    generate_and_store_image,
+)
+from backend.app.services.plans import BUNDLE_SECTIONS, save_to_plan, stream_bundle
+
+# Bundle member -> starter section it completes.
+_MEMBER_SECTIONS = {"negatives": "constraints", "palette": "hexcodes", "summary": "summary"}
+_IMAGE_SECTIONS = {
+    "moodboard": (build_moodboard_prompt, "Moodboard image"),
+    "storyboard": (build_storyboard_prompt, "Storyboard image"),
+}
+
+
+async def run_starter(prompt: str, plan_id: str | None = None) -> AsyncIterator[dict]:
+    """
+    Produces the five starter sections for one prompt with one text bundle and
+    both images running concurrently. Yields, in completion order:
+
+      {"section": name, "status": "ok", "result": {...}}   per section
+      {"section": name, "status": "error", "error": exc}   per failed section
+      {"plan_id": id}                                      once the plan exists
+      {"done": True, ...}                                  last
+
+    Text sections are sent as soon as their bundle member has been generated.
+    Images are saved to the plan once both are known, so later /v1/final-image
+    and /v1/veo calls can reference it.
+    """
+    started = time.perf_counter()
+    events: asyncio.Queue = asyncio.Queue()
+    plan_ready: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def emit(event: dict) -> None:
+        if "section" in event:
+            event["elapsed_sec"] = round(time.perf_counter() - started, 4)
+        events.put_nowait(event)
+
+    async def text_sections() -> None:
+        pending = set(BUNDLE_SECTIONS)
+        try:
+            async for key, value in stream_bundle(prompt, plan_id):
+                if key == "plan_id":
+                    plan_ready.set_result(value)
+                    emit({"plan_id": value})
+                    continue
+                section = _MEMBER_SECTIONS.get(key)
+                if section not in pending:
+                    continue
+                pending.discard(section)
+                try:
+                    result = BUNDLE_SECTIONS[section]({key: value})
+                except Exception as e:
+                    emit({"section": section, "status": "error", "error": e})
+                else:
+                    emit({"section": section, "status": "ok", "result": result})
+            for section in sorted(pending):
+                error = ValueError(f"Gemini bundle missing {section}")
+                emit({"section": section, "status": "error", "error": error})
+        except Exception as e:
+            for section in sorted(pending):
+                emit({"section": section, "status": "error", "error": e})
+        finally:
+            if not plan_ready.done():
+                plan_ready.set_result(None)
+
+    async def image_section(section: str) -> None:
+        build_prompt, description = _IMAGE_SECTIONS[section]
+        try:
+            image = await generate_and_store_image(build_prompt(prompt), prefix=section, description=description)
+        except Exception as e:
+            emit({"section": section, "status": "error", "error": e})
+            return
+        emit({"section": section, "status": "ok", "result": {section: image}})
+        await save_to_plan(await asyncio.shield(plan_ready), {section: image})
+
+    tasks = [
+        asyncio.create_task(text_sections()),
+        *(asyncio.create_task(image_section(section)) for section in _IMAGE_SECTIONS),
+    ]
+    finished = asyncio.gather(*tasks, return_exceptions=True)
+    finished.add_done_callback(lambda _: events.put_nowait(None))
+
+    errors = 0
+    try:
+        while (event := await events.get()) is not None:
+            errors += event.get("status") == "error"
+            yield event
+    finally:
+        # Client went away (or we are done): stop whatever is still running.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    yield {
+        "done": True,
+        "plan_id": plan_ready.result(),
+        "errors": errors,
+        "duration_sec": round(time.perf_counter() - started, 4),
+    }
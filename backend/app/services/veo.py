@@ -1,11 +1,38 @@
-import httpx
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import hashlib
 from pathlib import Path
+import statistics
+import time
+from typing import Any, Callable
 import uuid
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
-from backend.app.config import VEO_API_KEY, VEO_BASE_URL, VEO_MODEL
+import httpx
+
+from backend.app.config import (
+    VEO_API_KEY,
+    VEO_BASE_URL,
+    VEO_DOWNLOAD_CACHE_TTL_SEC,
+    VEO_DOWNLOAD_MAX_RESUMES,
+    VEO_EXPECTED_RENDER_SEC,
+    VEO_MODEL,
+    VEO_POLL_MAX_INTERVAL_SEC,
+    VEO_POLL_MAX_RPS,
+    VEO_POLL_MIN_INTERVAL_SEC,
+    VEO_START_DEDUP_TTL_SEC,
+)
+from backend.app.services.assets import GENERATED_DIR, GENERATED_URL_PREFIX, asset_store
+from backend.app.services.clients import get_client, timeout_for
+from backend.app.services.limiter import UpstreamOverloaded, upstream_slot
+from backend.app.services.metrics import UPSTREAM_BYTES, VEO_DOWNLOAD_SECONDS, VEO_RENDER_SECONDS
+from backend.app.services.resilience import UpstreamError, call_upstream
+from backend.app.services.shared_cache import shared_cache
 
-GENERATED_DIR = Path(__file__).resolve().parents[2] / "static" / "generated"
+
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+MIN_VIDEO_BYTES = 1024
 
 
 def _normalize_download_url(video_url: str) -> str:
@@ -26,35 +53,92 @@ def _normalize_download_url(video_url: str) -> str:
     return urlunparse((parsed.scheme, parsed.netloc, path, parsed.params, query, parsed.fragment))
 
 
-async def veo_start_generation(prompt: str, reference_images: list[dict] | None = None) -> dict:
+def _collect_candidate_urls(node: Any, out: list[str]) -> None:
+    if isinstance(node, dict):
+        for k, v in node.items():
+            key = str(k).lower()
+            if isinstance(v, str) and key in {"uri", "videouri", "downloaduri"} and v.startswith("http"):
+                out.append(v)
+            _collect_candidate_urls(v, out)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_candidate_urls(item, out)
+
+
+def extract_video_url(operation: dict) -> str | None:
+    """
+    Finds the generated video URL inside a finished Veo operation payload.
+    """
+    candidates: list[str] = []
+    _collect_candidate_urls(operation, candidates)
+    if not candidates:
+        return None
+    for url in candidates:
+        lower = url.lower()
+        if ".mp4" in lower or ":download" in lower or "/download/" in lower:
+            return url
+    return candidates[0]
+
+
+async def veo_start_generation(
+    prompt: str, reference_images: list[dict] | None = None, force: bool = False
+) -> dict:
     """
-    Starts a long-running Veo generation operation.
+    Starts a long-running Veo generation operation. Identical requests (same
+    prompt and reference images) within VEO_START_DEDUP_TTL_SEC, on any worker,
+    get the operation started by the first one instead of a second render,
+    unless force is set.
     """
+    if not reference_images:
+        raise ValueError("Veo requires reference images for this endpoint, none provided")
+    if force:
+        return await _start_generation(prompt, reference_images)
+    key = await asyncio.to_thread(
+        shared_cache.make_key, "veo_start", [VEO_MODEL, prompt, reference_images]
+    )
+    return await shared_cache.get_or_compute(
+        key,
+        lambda: _start_generation(prompt, reference_images),
+        ttl_sec=VEO_START_DEDUP_TTL_SEC,
+    )
+
+
+async def _start_generation(prompt: str, reference_images: list[dict]) -> dict:
     predict_long_running_url = f"{VEO_BASE_URL}/models/{VEO_MODEL}:predictLongRunning"
     headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": VEO_API_KEY,
     }
-    if not reference_images:
-        raise ValueError("Veo requires reference images for this endpoint, none provided")
+    payload = {
+        "instances": [
+            {
+                "prompt": prompt,
+                "referenceImages": reference_images,
+            }
+        ]
+    }
+    client = get_client("veo")
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        payload = {
-            "instances": [
-                {
-                    "prompt": prompt,
-                    "referenceImages": reference_images,
-                }
-            ]
-        }
-        r = await client.post(predict_long_running_url, headers=headers, json=payload)
+    async def attempt() -> dict:
+        async with upstream_slot("veo_start", VEO_MODEL):
+            r = await client.post(
+                predict_long_running_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout_for("veo_start"),
+            )
+        UPSTREAM_BYTES.inc(len(r.content), operation="veo_start", model=VEO_MODEL)
         if r.is_error:
-            raise ValueError(
+            raise UpstreamError.from_response(
                 f"Veo image-conditioned start error {r.status_code} for model '{VEO_MODEL}': "
-                f"{r.text[:1200]}"
+                f"{r.text[:1200]}",
+                r,
             )
         return r.json()
 
+    # Starting a render is not idempotent: only retried when it cannot have started.
+    return await call_upstream("veo_start", VEO_MODEL, attempt, idempotent=False)
+
 
 async def veo_get_operation(operation_name: str) -> dict:
     """
@@ -64,48 +148,379 @@ async def veo_get_operation(operation_name: str) -> dict:
     headers = {
         "x-goog-api-key": VEO_API_KEY,
     }
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        r = await client.get(url, headers=headers)
+    client = get_client("veo")
+
+    async def attempt() -> dict:
+        async with upstream_slot("veo_poll", VEO_MODEL, priority="background"):
+            r = await client.get(url, headers=headers, timeout=timeout_for("veo_poll"))
+        UPSTREAM_BYTES.inc(len(r.content), operation="veo_poll", model=VEO_MODEL)
         if r.is_error:
-            raise ValueError(
-                f"Veo operation read error {r.status_code} for '{operation_name}': {r.text[:1000]}"
+            raise UpstreamError.from_response(
+                f"Veo operation read error {r.status_code} for '{operation_name}': {r.text[:1000]}", r
             )
         return r.json()
 
+    return await call_upstream("veo_poll", VEO_MODEL, attempt)
+
+
+class _MediaHTTPError(ValueError):
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Veo media download failed {status_code}: {body}")
+        self.status_code = status_code
 
-async def download_and_store_veo_video(video_url: str, prefix: str = "veo") -> str:
+
+async def _stream_media_to_file(client, url: str, headers: dict, tmp_path: Path) -> tuple[int, str]:
     """
-    Downloads a Veo media URL with API key auth and stores it under /static/generated.
-    Returns local static URL.
+    Streams a media response into tmp_path with constant memory. Interrupted
+    transfers are resumed with HTTP Range requests. Returns (bytes written, sha256).
+    """
+    written = 0
+    digest = hashlib.sha256()
+    resumes = 0
+    while True:
+        request_headers = dict(headers)
+        if written:
+            request_headers["Range"] = f"bytes={written}-"
+        try:
+            async with client.stream(
+                "GET", url, headers=request_headers, timeout=timeout_for("veo_download")
+            ) as r:
+                if r.is_error:
+                    body = (await r.aread())[:1000].decode("utf-8", "replace")
+                    raise _MediaHTTPError(r.status_code, body)
+
+                content_type = (r.headers.get("content-type") or "").lower()
+                if "video" not in content_type and "octet-stream" not in content_type:
+                    preview = (await r.aread())[:500].decode("utf-8", "replace")
+                    raise ValueError(
+                        f"Veo media response is not video. content-type={content_type or 'unknown'} body={preview}"
+                    )
+
+                content_length = r.headers.get("content-length")
+                if not written and content_length and int(content_length) < MIN_VIDEO_BYTES:
+                    raise ValueError("Veo media response is unexpectedly small and likely invalid")
+
+                if written and r.status_code != 206:
+                    # Server ignored the Range header; start over.
+                    written = 0
+                    digest = hashlib.sha256()
+
+                f = await asyncio.to_thread(open, tmp_path, "ab" if written else "wb")
+                try:
+                    buffer = bytearray()
+                    async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                        UPSTREAM_BYTES.inc(len(chunk), operation="veo_download", model=VEO_MODEL)
+                        buffer += chunk
+                        if len(buffer) >= DOWNLOAD_CHUNK_BYTES:
+                            block = bytes(buffer)
+                            await asyncio.to_thread(f.write, block)
+                            digest.update(block)
+                            written += len(block)
+                            buffer.clear()
+                    if buffer:
+                        block = bytes(buffer)
+                        await asyncio.to_thread(f.write, block)
+                        digest.update(block)
+                        written += len(block)
+                finally:
+                    await asyncio.to_thread(f.close)
+            return written, digest.hexdigest()
+        except httpx.TransportError:
+            if resumes >= VEO_DOWNLOAD_MAX_RESUMES:
+                raise
+            resumes += 1
+            # Only flushed (and hashed) bytes are on disk; resume from there.
+
+
+def _stored_url_exists(url: str) -> bool:
+    if not url.startswith(GENERATED_URL_PREFIX):
+        return False
+    return (GENERATED_DIR / url[len(GENERATED_URL_PREFIX):]).exists()
+
+
+async def download_and_store_veo_video(video_url: str, prefix: str = "veo", prompt: str | None = None) -> str:
+    """
+    Streams a Veo media URL to disk and stores it in the generated asset store.
+    Returns local static URL. Each media URL is downloaded by one worker only.
     """
     download_url = _normalize_download_url(video_url)
+    return await shared_cache.get_or_compute(
+        shared_cache.make_key("veo_download", download_url),
+        lambda: _download_and_store(download_url, prefix, prompt),
+        ttl_sec=VEO_DOWNLOAD_CACHE_TTL_SEC,
+        validate=_stored_url_exists,
+    )
 
-    async with httpx.AsyncClient(timeout=300.0, follow_redirects=True) as client:
-        # Some Veo URLs are pre-signed and should be downloaded without API key.
-        r = await client.get(download_url, headers={"Accept": "video/*"})
-        if r.is_error:
+
+async def _download_and_store(download_url: str, prefix: str, prompt: str | None) -> str:
+    started = time.perf_counter()
+    client = get_client("veo_media")
+
+    await asyncio.to_thread(GENERATED_DIR.mkdir, parents=True, exist_ok=True)
+    tmp_path = GENERATED_DIR / f".{prefix}-{uuid.uuid4().hex}.part"
+
+    try:
+        try:
+            # Some Veo URLs are pre-signed and should be downloaded without API key.
+            written, sha256 = await _stream_media_to_file(
+                client, download_url, {"Accept": "video/*"}, tmp_path
+            )
+        except _MediaHTTPError:
             # Fallback to API key authenticated download for endpoints that require it.
-            r = await client.get(
+            written, sha256 = await _stream_media_to_file(
+                client,
                 download_url,
-                headers={
-                    "x-goog-api-key": VEO_API_KEY,
-                    "Accept": "video/*",
-                },
+                {"x-goog-api-key": VEO_API_KEY, "Accept": "video/*"},
+                tmp_path,
             )
-        if r.is_error:
-            raise ValueError(f"Veo media download failed {r.status_code}: {r.text[:1000]}")
 
-    content_type = (r.headers.get("content-type") or "").lower()
-    if "video" not in content_type and "octet-stream" not in content_type:
-        preview = r.text[:500] if isinstance(r.text, str) else "non-text response"
-        raise ValueError(
-            f"Veo media response is not video. content-type={content_type or 'unknown'} body={preview}"
+        if written < MIN_VIDEO_BYTES:
+            raise ValueError("Veo media response is unexpectedly small and likely invalid")
+
+        relpath = await asyncio.to_thread(
+            asset_store.ingest,
+            tmp_path,
+            kind=prefix,
+            mime="video/mp4",
+            ext="mp4",
+            prompt=prompt,
+            sha256=sha256,
         )
+    finally:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+    VEO_DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+    return asset_store.url_for(relpath)
+
+
+OperationCallback = Callable[[dict], None]
+
+
+@dataclass
+class _TrackedOperation:
+    name: str
+    started_at: float
+    next_poll_at: float
+    future: asyncio.Future
+    latest: dict | None = None
+    waiters: int = 0
+    failures: int = 0
+    polling: bool = False
+    callbacks: list[OperationCallback] = field(default_factory=list)
+
+
+class VeoOperationPoller:
+    """
+    Polls every outstanding Veo operation from one shared loop.
+
+    Poll intervals adapt to elapsed time and to the durations of recently finished
+    renders: sparse early on, dense around the expected completion time. All polls
+    share a global requests-per-second budget. Waiters get the finished operation
+    through a future; callbacks receive every intermediate operation payload.
+    """
+
+    def __init__(
+        self,
+        max_rps: float,
+        min_interval_sec: float,
+        max_interval_sec: float,
+        expected_render_sec: float,
+        history_size: int = 50,
+        max_failures: int = 3,
+    ):
+        self.max_rps = max_rps
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.default_expected_sec = expected_render_sec
+        self.max_failures = max_failures
+        self._history: deque[float] = deque(maxlen=history_size)
+        self._ops: dict[str, _TrackedOperation] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # In-flight _poll tasks; the loop only keeps weak references otherwise.
+        self._polls: set[asyncio.Task] = set()
+        self._last_request_at = 0.0
+        self.polls = 0
+        self.completed = 0
+
+    def expected_duration(self) -> float:
+        if not self._history:
+            return self.default_expected_sec
+        return statistics.median(self._history)
+
+    def next_interval(self, elapsed: float) -> float:
+        expected = self.expected_duration()
+        remaining = expected - elapsed
+        if remaining > 0:
+            # Halve the distance to the expected finish: sparse early, dense near it.
+            interval = remaining / 2
+        else:
+            # Overdue: start dense and back off slowly.
+            interval = self.min_interval_sec + (-remaining) * 0.1
+        return min(max(interval, self.min_interval_sec), self.max_interval_sec)
+
+    def watch(
+        self,
+        operation_name: str,
+        on_update: OperationCallback | None = None,
+        started_at: float | None = None,
+    ) -> asyncio.Future:
+        """
+        Tracks an operation (idempotently) and returns a future resolving to the
+        finished operation payload.
+        """
+        tracked = self._ops.get(operation_name)
+        if tracked is None:
+            now = time.monotonic()
+            started = started_at if started_at is not None else now
+            tracked = _TrackedOperation(
+                name=operation_name,
+                started_at=started,
+                next_poll_at=now + self.next_interval(now - started),
+                future=asyncio.get_running_loop().create_future(),
+            )
+            self._ops[operation_name] = tracked
+            self._ensure_running()
+            self._wakeup.set()
+        if on_update is not None:
+            tracked.callbacks.append(on_update)
+        return tracked.future
+
+    async def wait(
+        self,
+        operation_name: str,
+        timeout: float | None = None,
+        on_update: OperationCallback | None = None,
+        started_at: float | None = None,
+    ) -> dict | None:
+        """
+        Waits for an operation to finish. On timeout returns the latest observed
+        payload (not done) instead of raising; None if it was never read.
+        """
+        future = self.watch(operation_name, on_update=on_update, started_at=started_at)
+        tracked = self._ops[operation_name]
+        tracked.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            return tracked.latest
+        finally:
+            tracked.waiters -= 1
+            if on_update is not None and on_update in tracked.callbacks:
+                tracked.callbacks.remove(on_update)
+            if tracked.waiters <= 0 and not future.done():
+                # Nobody is interested anymore; stop spending poll budget on it.
+                self._ops.pop(operation_name, None)
+                future.cancel()
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._polls):
+            task.cancel()
+        await asyncio.gather(*self._polls, return_exceptions=True)
+        for tracked in self._ops.values():
+            if not tracked.future.done():
+                tracked.future.cancel()
+        self._ops.clear()
+
+    def stats(self) -> dict:
+        return {
+            "outstanding": len(self._ops),
+            "polls": self.polls,
+            "completed": self.completed,
+            "expected_render_sec": self.expected_duration(),
+            "history_size": len(self._history),
+            "max_rps": self.max_rps,
+        }
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._ops:
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            due = sorted(
+                (t for t in self._ops.values() if not t.polling and t.next_poll_at <= now),
+                key=lambda t: t.next_poll_at,
+            )
+            for tracked in due:
+                await self._throttle()
+                tracked.polling = True
+                task = asyncio.create_task(self._poll(tracked))
+                self._polls.add(task)
+                task.add_done_callback(self._polls.discard)
+
+            pending = [t.next_poll_at for t in self._ops.values() if not t.polling]
+            sleep_for = max(min(pending) - time.monotonic(), 0.0) if pending else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _throttle(self) -> None:
+        if self.max_rps <= 0:
+            return
+        gap = 1.0 / self.max_rps
+        delay = self._last_request_at + gap - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._last_request_at = time.monotonic()
+
+    async def _poll(self, tracked: _TrackedOperation) -> None:
+        try:
+            self.polls += 1
+            operation = await veo_get_operation(tracked.name)
+        except UpstreamOverloaded as e:
+            # Shed by our own limiter, not an upstream failure; just try later.
+            tracked.next_poll_at = time.monotonic() + e.retry_after
+            return
+        except Exception as e:
+            tracked.failures += 1
+            if tracked.failures >= self.max_failures:
+                self._finish(tracked, error=e)
+            else:
+                tracked.next_poll_at = time.monotonic() + self.min_interval_sec
+            return
+        finally:
+            tracked.polling = False
+            self._wakeup.set()
+
+        tracked.failures = 0
+        tracked.latest = operation
+        for callback in list(tracked.callbacks):
+            callback(operation)
+
+        now = time.monotonic()
+        if operation.get("done"):
+            self._history.append(now - tracked.started_at)
+            VEO_RENDER_SECONDS.observe(now - tracked.started_at)
+            self.completed += 1
+            self._finish(tracked, result=operation)
+        else:
+            tracked.next_poll_at = now + self.next_interval(now - tracked.started_at)
+
+    def _finish(self, tracked: _TrackedOperation, result: dict | None = None, error: Exception | None = None) -> None:
+        self._ops.pop(tracked.name, None)
+        if tracked.future.done():
+            return
+        if error is not None:
+            tracked.future.set_exception(error)
+        else:
+            tracked.future.set_result(result)
 
-    if len(r.content) < 1024:
-        raise ValueError("Veo media response is unexpectedly small and likely invalid")
 
-    GENERATED_DIR.mkdir(parents=True, exist_ok=True)
-    filename = f"{prefix}-{uuid.uuid4().hex}.mp4"
-    (GENERATED_DIR / filename).write_bytes(r.content)
-    return f"/static/generated/{filename}"
+veo_poller = VeoOperationPoller(
+    max_rps=VEO_POLL_MAX_RPS,
+    min_interval_sec=VEO_POLL_MIN_INTERVAL_SEC,
+    max_interval_sec=VEO_POLL_MAX_INTERVAL_SEC,
+    expected_render_sec=VEO_EXPECTED_RENDER_SEC,
+)
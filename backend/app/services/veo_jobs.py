@@ -0,0 +1,430 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from backend.app.config import VEO_JOB_MAX_WAIT_SEC, VEO_JOB_RETENTION, VEO_JOB_STORE_PATH
+from backend.app.services.limiter import set_request_priority
+from backend.app.services.veo import (
+    download_and_store_veo_video,
+    extract_video_url,
+    veo_poller,
+    veo_start_generation,
+)
+from backend.app.services.veo_renders import veo_render_cache
+
+# Job lifecycle: queued -> preparing -> starting -> polling -> downloading -> succeeded
+# Any state may move to failed.
+TERMINAL_STATES = {"succeeded", "failed"}
+
+# prepare(prompt) -> {"prompt": veo_prompt, "reference_images": [...], "render_key": str, "inputs": {...}}
+PrepareFn = Callable[[str], Awaitable[dict]]
+
+# Workers refresh the heartbeat of the jobs they run; a running job whose
+# heartbeat is older than STALE_AFTER_SEC belonged to a worker that is gone.
+HEARTBEAT_SEC = 10.0
+STALE_AFTER_SEC = 3 * HEARTBEAT_SEC
+# How often a worker that does not run a job checks it for an event stream.
+REMOTE_POLL_SEC = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    snapshot TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+"""
+
+
+@dataclass
+class VeoJob:
+    id: str
+    prompt: str
+    status: str = "queued"
+    version: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    operation_name: str | None = None
+    operation: dict | None = None
+    veo_prompt: str | None = None
+    inputs: dict | None = None
+    plan_id: str | None = None
+    timings: dict | None = None
+    video_url: str | None = None
+    local_video_url: str | None = None
+    render_cache: str | None = None
+    error: str | None = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _on_update: Callable[["VeoJob"], None] | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def update(self, **changes: Any) -> None:
+        for key, value in changes.items():
+            setattr(self, key, value)
+        self.version += 1
+        self.updated_at = time.time()
+        # Wake current subscribers and arm a fresh event for the next transition.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self._on_update is not None:
+            self._on_update(self)
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "version": self.version,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "prompt": self.prompt,
+            "operation_name": self.operation_name,
+            "plan_id": self.plan_id,
+            "error": self.error,
+            "veo": {
+                "prompt": self.veo_prompt,
+                "operation": self.operation,
+                "video_url": self.video_url,
+                "local_video_url": self.local_video_url,
+                "render_cache": self.render_cache,
+                "inputs": self.inputs,
+                "timings": self.timings,
+            },
+        }
+
+
+class VeoJobStore:
+    """
+    Job snapshots in one SQLite (WAL) file shared by every worker on the host,
+    so any worker can answer GET /v1/veo/jobs/{id} and its event stream, and
+    finished jobs survive restarts. A job is only run by the worker that
+    accepted it; that worker writes a snapshot on every transition and
+    refreshes the job's heartbeat while it runs. A running job whose heartbeat
+    has expired is reported as failed: its worker exited mid-render. That
+    verdict is only made when reading and never written, so a worker that was
+    merely late keeps its job and its next write is stored as usual.
+
+    The newest `retention` finished (or lost) jobs are kept. All methods block
+    on SQLite; call them from a worker thread.
+    """
+
+    def __init__(self, path: Path, retention: int, stale_after_sec: float):
+        self.path = path
+        self.retention = retention
+        self.stale_after_sec = stale_after_sec
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """
+        Closes the SQLite connection; the store reconnects if used again.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def save(self, snapshot: dict) -> None:
+        """
+        Writes a snapshot unless a newer version of the job is already stored
+        (writes from worker threads may land out of order).
+        """
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO jobs (id, status, version, created_at, heartbeat_at, snapshot) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, version = excluded.version, "
+                "heartbeat_at = excluded.heartbeat_at, snapshot = excluded.snapshot "
+                "WHERE excluded.version > jobs.version",
+                (
+                    snapshot["id"],
+                    snapshot["status"],
+                    snapshot["version"],
+                    snapshot["created_at"],
+                    time.time(),
+                    json.dumps(snapshot),
+                ),
+            )
+            if snapshot["status"] in TERMINAL_STATES:
+                self._prune(db)
+
+    def heartbeat(self, job_ids: list[str]) -> None:
+        with self._lock:
+            self._db().executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(time.time(), job_id) for job_id in job_ids]
+            )
+
+    def load(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT snapshot, heartbeat_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._checked(*row) if row is not None else None
+
+    def recent(self, limit: int) -> list[dict]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT snapshot, heartbeat_at FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._checked(*row) for row in rows]
+
+    def _checked(self, snapshot_json: str, heartbeat_at: float) -> dict:
+        snapshot = json.loads(snapshot_json)
+        if snapshot["status"] in TERMINAL_STATES or heartbeat_at >= time.time() - self.stale_after_sec:
+            return snapshot
+        # Same version: if the owner was only late, its next write supersedes this.
+        return {**snapshot, "status": "failed", "error": "Job was lost: the worker running it stopped"}
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        # Keep every live job; drop the oldest finished or lost ones beyond retention.
+        db.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs "
+            "WHERE status IN ('succeeded', 'failed') OR heartbeat_at < ? "
+            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (time.time() - self.stale_after_sec, self.retention),
+        )
+
+
+class VeoJobEngine:
+    """
+    Scheduler for Veo renders. Jobs run as background tasks that own
+    preparation, polling, download and staging, so HTTP requests return at once
+    and clients can reconnect to a job by id (e.g. after a page reload).
+
+    Each job runs in the worker that accepted it; its state is mirrored to the
+    shared VeoJobStore, so every worker can report and stream it.
+    """
+
+    def __init__(self, max_wait_sec: float, retention: int, store: VeoJobStore):
+        self.max_wait_sec = max_wait_sec
+        self.retention = retention
+        self.store = store
+        self._jobs: OrderedDict[str, VeoJob] = OrderedDict()
+        self._writes: set[asyncio.Task] = set()
+        self._heartbeat_task: asyncio.Task | None = None
+
+    def submit(self, prompt: str, prepare: PrepareFn, force: bool = False) -> VeoJob:
+        job = VeoJob(id=uuid.uuid4().hex, prompt=prompt, _on_update=self._persist)
+        self._jobs[job.id] = job
+        self._persist(job)
+        job._task = asyncio.create_task(self._run(job, prepare, force))
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> VeoJob | None:
+        """A job run by this worker."""
+        return self._jobs.get(job_id)
+
+    def local_jobs(self) -> list[VeoJob]:
+        """Jobs run by this worker, newest first."""
+        return list(reversed(self._jobs.values()))
+
+    async def load(self, job_id: str) -> dict | None:
+        """The current snapshot of a job run by any worker."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return await asyncio.to_thread(self.store.load, job_id)
+
+    async def recent(self) -> list[dict]:
+        """Snapshots of the retained jobs of every worker, newest first."""
+        snapshots = await asyncio.to_thread(self.store.recent, self.retention)
+        # This worker's own jobs may be ahead of their last write.
+        return [self._jobs[s["id"]].snapshot() if s["id"] in self._jobs else s for s in snapshots]
+
+    async def subscribe(self, job_id: str, heartbeat_sec: float = 15.0) -> AsyncIterator[dict | None]:
+        """
+        Yields a snapshot for the current state and then one per transition until the
+        job finishes. Yields None when nothing changed within heartbeat_sec. Jobs run
+        by another worker are followed through the store.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            async for snapshot in self._follow_remote(job_id, heartbeat_sec):
+                yield snapshot
+            return
+
+        last_version = -1
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                yield job.snapshot()
+                if job.done:
+                    return
+            changed = job._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat_sec)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def _follow_remote(self, job_id: str, heartbeat_sec: float) -> AsyncIterator[dict | None]:
+        # A lost job keeps its version (see VeoJobStore), so compare the status too.
+        last_seen = None
+        quiet_since = time.monotonic()
+        while True:
+            snapshot = await asyncio.to_thread(self.store.load, job_id)
+            if snapshot is None:
+                return  # pruned
+            if (snapshot["version"], snapshot["status"]) != last_seen:
+                last_seen = (snapshot["version"], snapshot["status"])
+                quiet_since = time.monotonic()
+                yield snapshot
+                if snapshot["status"] in TERMINAL_STATES:
+                    return
+            elif time.monotonic() - quiet_since >= heartbeat_sec:
+                quiet_since = time.monotonic()
+                yield None
+            await asyncio.sleep(REMOTE_POLL_SEC)
+
+    async def shutdown(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        tasks = [job._task for job in self._jobs.values() if job._task and not job._task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Cancelled jobs are now failed; make sure the store says so too.
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _persist(self, job: VeoJob) -> None:
+        task = asyncio.create_task(self._save(job.snapshot()))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _save(self, snapshot: dict) -> None:
+        try:
+            await asyncio.to_thread(self.store.save, snapshot)
+        except sqlite3.Error:
+            pass  # the job's next transition writes it again
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SEC)
+            running = [job.id for job in self._jobs.values() if not job.done]
+            if not running:
+                return  # the next submit starts a new one
+            try:
+                await asyncio.to_thread(self.store.heartbeat, running)
+            except sqlite3.Error:
+                pass
+
+    def _prune(self) -> None:
+        # Keep every running job; drop the oldest finished ones beyond retention.
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        while len(self._jobs) > self.retention and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+    async def _run(self, job: VeoJob, prepare: PrepareFn, force: bool = False) -> None:
+        # Runs in its own task, so this does not affect the submitting request.
+        set_request_priority("background")
+        try:
+            job.update(status="preparing")
+            request = await prepare(job.prompt)
+            job.update(
+                status="starting",
+                veo_prompt=request["prompt"],
+                inputs=request.get("inputs"),
+                plan_id=request.get("plan_id"),
+                timings=request.get("timings"),
+            )
+
+            render_key = request["render_key"]
+            cached = None if force else await asyncio.to_thread(veo_render_cache.lookup, render_key)
+            if cached is not None and cached["status"] == "done":
+                job.update(
+                    status="succeeded",
+                    render_cache="hit",
+                    operation_name=cached["operation_name"],
+                    operation={"name": cached["operation_name"], "done": True},
+                    video_url=cached["video_url"],
+                    local_video_url=cached["local_video_url"],
+                )
+                return
+
+            if cached is not None:
+                # Same prompt package already rendering: follow that operation.
+                operation = {"name": cached["operation_name"]}
+                job.update(render_cache="attached")
+            else:
+                operation = await veo_start_generation(
+                    request["prompt"],
+                    reference_images=request["reference_images"],
+                    force=force,
+                )
+                job.update(render_cache="bypass" if force else "miss")
+            operation_name = operation.get("name")
+            if not operation_name:
+                raise ValueError("Veo did not return operation name")
+            if cached is None:
+                await asyncio.to_thread(veo_render_cache.record_started, render_key, operation_name)
+            job.update(status="polling", operation_name=operation_name, operation=operation)
+
+            if not operation.get("done"):
+                latest = await veo_poller.wait(
+                    operation_name,
+                    timeout=self.max_wait_sec,
+                    on_update=lambda op: job.update(operation=op),
+                )
+                if not latest or not latest.get("done"):
+                    raise ValueError(f"Veo operation did not finish within {self.max_wait_sec:.0f}s")
+                operation = latest
+
+            if operation.get("error"):
+                await asyncio.to_thread(veo_render_cache.forget, render_key, operation_name)
+                raise ValueError(f"Veo operation failed: {operation['error']}")
+
+            video_url = extract_video_url(operation)
+            if not video_url:
+                raise ValueError("Veo operation finished without a video URL")
+            job.update(status="downloading", video_url=video_url)
+
+            local_video_url = await download_and_store_veo_video(
+                video_url, prefix="veo", prompt=job.prompt
+            )
+            await asyncio.to_thread(
+                veo_render_cache.record_done, render_key, operation_name, video_url, local_video_url
+            )
+            job.update(status="succeeded", local_video_url=local_video_url)
+        except asyncio.CancelledError:
+            job.update(status="failed", error="Job cancelled")
+            raise
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+        finally:
+            self._prune()
+
+
+veo_jobs = VeoJobEngine(
+    max_wait_sec=VEO_JOB_MAX_WAIT_SEC,
+    retention=VEO_JOB_RETENTION,
+    store=VeoJobStore(
+        path=Path(VEO_JOB_STORE_PATH),
+        retention=VEO_JOB_RETENTION,
+        stale_after_sec=STALE_AFTER_SEC,
+    ),
+)
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from backend.app.config import (
+    VEO_JOB_MAX_WAIT_SEC,
+    VEO_MODEL,
+    VEO_RENDER_CACHE_ENABLED,
+    VEO_RENDER_CACHE_MAX_AGE_SEC,
+    VEO_RENDER_CACHE_MAX_BYTES,
+    VEO_RENDER_CACHE_PATH,
+)
+from backend.app.services.assets import GENERATED_DIR, GENERATED_URL_PREFIX, asset_store
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    key TEXT PRIMARY KEY,
+    operation_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    video_url TEXT,
+    local_video_url TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used);
+"""
+
+_COLUMNS = (
+    "key",
+    "operation_name",
+    "status",
+    "video_url",
+    "local_video_url",
+    "size",
+    "created_at",
+    "last_used",
+)
+
+
+def _stored_file_exists(url: str | None) -> bool:
+    if not url or not url.startswith(GENERATED_URL_PREFIX):
+        return False
+    return (GENERATED_DIR / url[len(GENERATED_URL_PREFIX):]).exists()
+
+
+class VeoRenderCache:
+    """
+    Index of Veo renders by prompt package: the model, the Veo prompt text and
+    the sha256 of each reference image. Entries are either
+
+      running  an operation was started for this package and may still finish
+      done     the video was downloaded and staged in the asset store
+
+    A done entry answers an identical request with the local MP4 at once; a
+    running one lets the caller attach to that operation instead of starting a
+    second render. Running entries older than running_ttl_sec are ignored. Done
+    entries are evicted (index row and MP4) by last use once they are older than
+    max_age_sec or the cached videos exceed max_bytes.
+
+    The index is one SQLite (WAL) file, shared by every worker on the host. All
+    methods block on disk and SQLite; call them from a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int,
+        max_age_sec: float,
+        running_ttl_sec: float,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.running_ttl_sec = running_ttl_sec
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.hits = 0
+        self.attached = 0
+        self.misses = 0
+        self.evictions = 0
+        # Index figures from the last index_stats() call, for last_stats().
+        self._index = {"done": 0, "running": 0, "bytes": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """
+        Closes the SQLite connection; the cache reconnects if used again.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def render_key(veo_prompt: str, reference_hashes: list[str], model: str = VEO_MODEL) -> str:
+        parts = json.dumps([model, veo_prompt, reference_hashes], separators=(",", ":"))
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> dict | None:
+        """
+        Returns the usable entry for key (see class docstring) or None. Done
+        entries whose MP4 is gone and stale running entries are dropped.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+            entry = dict(zip(_COLUMNS, row)) if row is not None else None
+            if entry is not None and entry["status"] == "running":
+                if entry["created_at"] < now - self.running_ttl_sec:
+                    db.execute("DELETE FROM renders WHERE key = ? AND status = 'running'", (key,))
+                    entry = None
+            elif entry is not None:
+                if not _stored_file_exists(entry["local_video_url"]):
+                    db.execute("DELETE FROM renders WHERE key = ? AND status = 'done'", (key,))
+                    entry = None
+                else:
+                    db.execute("UPDATE renders SET last_used = ? WHERE key = ?", (now, key))
+                    entry["last_used"] = now
+
+        if entry is None:
+            self.misses += 1
+        elif entry["status"] == "running":
+            self.attached += 1
+        else:
+            self.hits += 1
+            asset_store.touch(entry["local_video_url"])
+        return entry
+
+    def record_started(self, key: str, operation_name: str) -> None:
+        """
+        Marks a render as in flight. A done entry is kept until the new render
+        replaces it, so a forced re-render that fails does not lose the old one.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO renders (key, operation_name, status, created_at, last_used) "
+                "VALUES (?, ?, 'running', ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET operation_name = excluded.operation_name, "
+                "created_at = excluded.created_at, last_used = excluded.last_used "
+                "WHERE renders.status = 'running'",
+                (key, operation_name, now, now),
+            )
+
+    def record_done(self, key: str, operation_name: str, video_url: str | None, local_video_url: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        asset = asset_store.lookup(local_video_url)
+        size = asset["size"] if asset else 0
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO renders "
+                "(key, operation_name, status, video_url, local_video_url, size, created_at, last_used) "
+                "VALUES (?, ?, 'done', ?, ?, ?, ?, ?)",
+                (key, operation_name, video_url, local_video_url, size, now, now),
+            )
+        self.evict()
+
+    def forget(self, key: str, operation_name: str) -> None:
+        """
+        Drops a running entry whose operation failed, so the next request renders again.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM renders WHERE key = ? AND operation_name = ? AND status = 'running'",
+                (key, operation_name),
+            )
+
+    def evict(self) -> dict:
+        """
+        Evicts done renders unused for max_age_sec, then the least recently used
+        ones until the cached videos fit in max_bytes. Their MP4s are removed
+        from the asset store unless another entry still points at the same file.
+        """
+        removed = 0
+        freed = 0
+        with self._lock:
+            db = self._db()
+            victims: list[tuple[str, str, int]] = []
+            if self.max_age_sec > 0:
+                victims += db.execute(
+                    "SELECT key, local_video_url, size FROM renders "
+                    "WHERE status = 'done' AND last_used < ?",
+                    (time.time() - self.max_age_sec,),
+                ).fetchall()
+            total = db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM renders WHERE status = 'done'"
+            ).fetchone()[0]
+            total -= sum(v[2] for v in victims)
+            if self.max_bytes > 0 and total > self.max_bytes:
+                stale = {v[0] for v in victims}
+                for row in db.execute(
+                    "SELECT key, local_video_url, size FROM renders WHERE status = 'done' ORDER BY last_used"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    if row[0] in stale:
+                        continue
+                    victims.append(row)
+                    total -= row[2]
+
+            urls = set()
+            for key, local_video_url, size in victims:
+                db.execute("DELETE FROM renders WHERE key = ?", (key,))
+                urls.add(local_video_url)
+                removed += 1
+                freed += size
+            shared = {
+                row[0]
+                for row in db.execute(
+                    "SELECT DISTINCT local_video_url FROM renders WHERE status = 'done'"
+                ).fetchall()
+            }
+        for url in urls - shared:
+            asset_store.remove(url)
+        self.evictions += removed
+        return {"removed": removed, "freed_bytes": freed}
+
+    def index_stats(self) -> dict:
+        """
+        Entry counts and cached bytes across all workers, read from the index.
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT status, COUNT(*), COALESCE(SUM(size), 0) FROM renders GROUP BY status"
+            ).fetchall()
+        counts = {status: (count, size) for status, count, size in rows}
+        self._index = {
+            "done": counts.get("done", (0, 0))[0],
+            "running": counts.get("running", (0, 0))[0],
+            "bytes": counts.get("done", (0, 0))[1],
+        }
+        return self._index
+
+    def stats(self) -> dict:
+        self.index_stats()
+        return self.last_stats()
+
+    def last_stats(self) -> dict:
+        """
+        stats() without touching SQLite, so it is safe on the event loop. The
+        index figures are those of the last index_stats() call.
+        """
+        return {
+            "enabled": self.enabled,
+            **self._index,
+            "max_bytes": self.max_bytes,
+            "max_age_sec": self.max_age_sec,
+            "hits": self.hits,
+            "attached": self.attached,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+veo_render_cache = VeoRenderCache(
+    path=Path(VEO_RENDER_CACHE_PATH),
+    max_bytes=VEO_RENDER_CACHE_MAX_BYTES,
+    max_age_sec=VEO_RENDER_CACHE_MAX_AGE_SEC,
+    running_ttl_sec=VEO_JOB_MAX_WAIT_SEC,
+    enabled=VEO_RENDER_CACHE_ENABLED,
+)
@@ -1,23 +1,261 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
 import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
 from typing import Any, Dict
 
-_PLANS: Dict[str, Dict[str, Any]] = {}
+from backend.app.config import (
+    PLAN_STORE_BACKEND,
+    PLAN_STORE_MAX_PLANS,
+    PLAN_STORE_PATH,
+    PLAN_TTL_SEC,
+)
+
+
+class PlanStore(ABC):
+    """
+    Interface for plan storage. A plan is a flat dict of top-level fields
+    (prompt, bundle, moodboard, storyboard, ...); update() patches fields in place.
+    get() and update() return a copy: changing it does not change the stored plan.
+    """
+
+    @abstractmethod
+    def create(self, prompt: str, bundle: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    def get(self, plan_id: str) -> Dict[str, Any] | None: ...
+
+    @abstractmethod
+    def update(self, plan_id: str, patch: Dict[str, Any]) -> Dict[str, Any] | None: ...
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """
+        Removes expired plans and returns how many were removed.
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]: ...
+
+    def close(self) -> None:
+        """
+        Releases the store's connections; it reconnects if used again.
+        """
+
+
+class MemoryPlanStore(PlanStore):
+    """
+    Per-process store, bounded by LRU eviction and a sliding TTL.
+    """
+
+    def __init__(self, max_plans: int, ttl_sec: float):
+        self.max_plans = max_plans
+        self.ttl_sec = ttl_sec
+        self._plans: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, prompt: str, bundle: Dict[str, Any]) -> str:
+        plan_id = uuid.uuid4().hex
+        with self._lock:
+            self._plans[plan_id] = (
+                time.time() + self.ttl_sec,
+                {
+                    "prompt": prompt,
+                    "bundle": copy.deepcopy(bundle),  # contains negatives, palette, summary
+                },
+            )
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan_id
+
+    def _live(self, plan_id: str) -> Dict[str, Any] | None:
+        entry = self._plans.get(plan_id)
+        if entry is None:
+            return None
+        expires_at, plan = entry
+        if expires_at <= time.time():
+            del self._plans[plan_id]
+            return None
+        self._plans[plan_id] = (time.time() + self.ttl_sec, plan)
+        self._plans.move_to_end(plan_id)
+        return plan
+
+    def get(self, plan_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            plan = self._live(plan_id)
+            return copy.deepcopy(plan) if plan is not None else None
+
+    def update(self, plan_id: str, patch: Dict[str, Any]) -> Dict[str, Any] | None:
+        with self._lock:
+            plan = self._live(plan_id)
+            if plan is None:
+                return None
+            plan.update(copy.deepcopy(patch))
+            return copy.deepcopy(plan)
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [plan_id for plan_id, (expires_at, _) in self._plans.items() if expires_at <= now]
+            for plan_id in expired:
+                del self._plans[plan_id]
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "plans": len(self._plans), "max_plans": self.max_plans}
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_expires_at ON plans (expires_at);
+CREATE TABLE IF NOT EXISTS plan_fields (
+    plan_id TEXT NOT NULL REFERENCES plans (plan_id) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (plan_id, field)
+);
+"""
+
+
+class SqlitePlanStore(PlanStore):
+    """
+    SQLite (WAL) store that several worker processes on one host can share.
+    Each top-level field is its own row, so update() only rewrites patched fields.
+    Bounded like the memory store: past max_plans, the least recently used
+    plans (earliest sliding expiry) are dropped.
+    """
+
+    def __init__(self, path: Path, max_plans: int, ttl_sec: float):
+        self.path = path
+        self.max_plans = max_plans
+        self.ttl_sec = ttl_sec
+        self._local = threading.local()
+        # Every thread's connection, so close() can reach them all.
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Used by one thread only; check_same_thread=False lets close() run anywhere.
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(_SQLITE_SCHEMA)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    def _write_fields(self, db: sqlite3.Connection, plan_id: str, fields: Dict[str, Any]) -> None:
+        db.executemany(
+            "INSERT OR REPLACE INTO plan_fields (plan_id, field, value) VALUES (?, ?, ?)",
+            [(plan_id, key, json.dumps(value)) for key, value in fields.items()],
+        )
+
+    def _read_fields(self, db: sqlite3.Connection, plan_id: str) -> Dict[str, Any]:
+        rows = db.execute("SELECT field, value FROM plan_fields WHERE plan_id = ?", (plan_id,))
+        return {field: json.loads(value) for field, value in rows}
+
+    def _enforce_cap(self, db: sqlite3.Connection) -> int:
+        # get() and update() extend expires_at, so it orders plans by last use.
+        return db.execute(
+            "DELETE FROM plans WHERE plan_id IN "
+            "(SELECT plan_id FROM plans ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_plans,),
+        ).rowcount
+
+    def create(self, prompt: str, bundle: Dict[str, Any]) -> str:
+        plan_id = uuid.uuid4().hex
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO plans (plan_id, created_at, expires_at) VALUES (?, ?, ?)",
+                (plan_id, now, now + self.ttl_sec),
+            )
+            self._write_fields(db, plan_id, {"prompt": prompt, "bundle": bundle})
+            self._enforce_cap(db)
+        return plan_id
+
+    def get(self, plan_id: str) -> Dict[str, Any] | None:
+        db = self._db()
+        now = time.time()
+        touched = db.execute(
+            "UPDATE plans SET expires_at = ? WHERE plan_id = ? AND expires_at > ?",
+            (now + self.ttl_sec, plan_id, now),
+        ).rowcount
+        if not touched:
+            return None
+        return self._read_fields(db, plan_id)
+
+    def update(self, plan_id: str, patch: Dict[str, Any]) -> Dict[str, Any] | None:
+        db = self._db()
+        now = time.time()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            touched = db.execute(
+                "UPDATE plans SET expires_at = ? WHERE plan_id = ? AND expires_at > ?",
+                (now + self.ttl_sec, plan_id, now),
+            ).rowcount
+            if not touched:
+                return None
+            self._write_fields(db, plan_id, patch)
+        return self._read_fields(db, plan_id)
+
+    def sweep(self) -> int:
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            expired = db.execute("DELETE FROM plans WHERE expires_at <= ?", (time.time(),)).rowcount
+            return expired + self._enforce_cap(db)
+
+    def stats(self) -> Dict[str, Any]:
+        count = self._db().execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        return {"backend": "sqlite", "plans": count, "max_plans": self.max_plans, "path": str(self.path)}
+
+
+def _build_store() -> PlanStore:
+    if PLAN_STORE_BACKEND == "sqlite":
+        return SqlitePlanStore(Path(PLAN_STORE_PATH), max_plans=PLAN_STORE_MAX_PLANS, ttl_sec=PLAN_TTL_SEC)
+    if PLAN_STORE_BACKEND == "memory":
+        return MemoryPlanStore(max_plans=PLAN_STORE_MAX_PLANS, ttl_sec=PLAN_TTL_SEC)
+    raise RuntimeError(f"Unknown PLAN_STORE_BACKEND: {PLAN_STORE_BACKEND}")
+
+
+plan_store = _build_store()
+
 
 def create_plan(prompt: str, bundle: Dict[str, Any]) -> str:
-    plan_id = uuid.uuid4().hex
-    _PLANS[plan_id] = {
-        "prompt": prompt,
-        "bundle": bundle,  # contains negatives, palette, summary
-    }
-    return plan_id
+    return plan_store.create(prompt, bundle)
+
 
 def get_plan(plan_id: str) -> Dict[str, Any] | None:
-    return _PLANS.get(plan_id)
+    return plan_store.get(plan_id)
 
 
 def update_plan(plan_id: str, patch: Dict[str, Any]) -> Dict[str, Any] | None:
-    plan = _PLANS.get(plan_id)
-    if plan is None:
-        return None
-    plan.update(patch)
-    return plan
+    return plan_store.update(plan_id, patch)
+
+
+def sweep_plans() -> int:
+    return plan_store.sweep()
@@ -0,0 +1,355 @@
+"""
+Offline load generator for the backend.
+
+By default it starts the mock upstream (backend.bench.mock_upstream) and the
+service itself on free local ports, points the service at the mock, runs each
+scenario and prints p50/p95/p99 latency, RPS, peak RSS of the service process
+tree and the upstream calls it made. No real quota is used.
+
+    python -m backend.bench.loadgen --scenario all --concurrency 16 --requests 200
+    python -m backend.bench.loadgen --scenario image --env GEMINI_IMAGE_MAX_CONCURRENCY=16
+    python -m backend.bench.loadgen --target http://127.0.0.1:8000 --mock http://127.0.0.1:8900
+
+Use --json to write the results for comparison between builds. To replay real
+provider traffic instead of the mock, record it once with
+UPSTREAM_CASSETTE_MODE=record and run against a service started with
+UPSTREAM_CASSETTE_MODE=replay (see services/cassette.py).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import cycle
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Scenario -> list of (path, payload builder). Requests cycle through the list.
+SCENARIOS = {
+    "text": [("/v1/constraints", lambda p: {"prompt": p})],
+    "image": [("/v1/moodboard", lambda p: {"prompt": p})],
+    "veo": [("/v1/veo", lambda p: {"prompt": p, "wait": True, "max_wait_sec": 120})],
+    "mixed": [
+        ("/v1/constraints", lambda p: {"prompt": p}),
+        ("/v1/hexcodes", lambda p: {"prompt": p}),
+        ("/v1/summary", lambda p: {"prompt": p}),
+        ("/v1/moodboard", lambda p: {"prompt": p}),
+        ("/v1/storyboard", lambda p: {"prompt": p}),
+    ],
+}
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int
+    concurrency: int
+    errors: int
+    status_counts: dict[str, int]
+    duration_sec: float
+    rps: float
+    latency_ms: dict[str, float]
+    peak_rss_mb: float | None
+    upstream_calls: dict[str, int] = field(default_factory=dict)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    children_file = Path(f"/proc/{pid}/task/{pid}/children")
+    try:
+        children = children_file.read_text().split()
+    except OSError:
+        return pids
+    for child in children:
+        pids.extend(_process_tree(int(child)))
+    return pids
+
+
+def _tree_rss_bytes(pid: int) -> int | None:
+    total = 0
+    for p in _process_tree(pid):
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total or None
+
+
+async def _sample_peak_rss(pid: int | None, stop: asyncio.Event) -> float | None:
+    if pid is None:
+        return None
+    peak = 0
+    while not stop.is_set():
+        rss = await asyncio.to_thread(_tree_rss_bytes, pid)
+        if rss is None:
+            return None  # no /proc (non-Linux)
+        peak = max(peak, rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.1)
+        except asyncio.TimeoutError:
+            pass
+    return round(peak / 1024**2, 1)
+
+
+async def _upstream_calls(client: httpx.AsyncClient, mock_url: str | None) -> dict[str, int]:
+    if not mock_url:
+        return {}
+    r = await client.get(f"{mock_url}/_stats")
+    return r.json().get("calls", {})
+
+
+async def run_scenario(
+    name: str,
+    target: str,
+    mock_url: str | None,
+    requests: int,
+    concurrency: int,
+    distinct_prompts: int,
+    service_pid: int | None,
+) -> ScenarioResult:
+    steps = cycle(SCENARIOS[name])
+    run_id = os.urandom(4).hex()
+    timeout = httpx.Timeout(300.0, connect=10.0)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        if mock_url:
+            await client.post(f"{mock_url}/_reset")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(requests):
+            path, build = next(steps)
+            prompt_id = i if distinct_prompts <= 0 else i % distinct_prompts
+            queue.put_nowait((path, build(f"benchmark {name} {run_id} prompt {prompt_id}")))
+
+        latencies: list[float] = []
+        statuses: dict[str, int] = {}
+
+        async def worker() -> None:
+            while True:
+                try:
+                    path, payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    r = await client.post(f"{target}{path}", json=payload)
+                    status = str(r.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        stop = asyncio.Event()
+        rss_task = asyncio.create_task(_sample_peak_rss(service_pid, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+        stop.set()
+        peak_rss = await rss_task
+        calls = await _upstream_calls(client, mock_url)
+
+    errors = sum(n for status, n in statuses.items() if not status.startswith("2"))
+    return ScenarioResult(
+        scenario=name,
+        requests=requests,
+        concurrency=concurrency,
+        errors=errors,
+        status_counts=statuses,
+        duration_sec=round(duration, 3),
+        rps=round(requests / duration, 2) if duration else 0.0,
+        latency_ms={
+            "p50": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        peak_rss_mb=peak_rss,
+        upstream_calls=calls,
+    )
+
+
+async def _wait_healthy(url: str, process: subprocess.Popen, timeout_sec: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_sec
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Process for {url} exited with {process.returncode}")
+            try:
+                r = await client.get(url)
+                if r.status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _uvicorn(app_path: str, port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", app_path, "--host", "127.0.0.1", "--port", str(port)]
+    cmd += ["--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+
+
+def _service_env(mock_url: str, data_dir: str, args: argparse.Namespace) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "GEMINI_API_KEY": "bench-key",
+            "VEO_API_KEY": "bench-key",
+            "GEMINI_BASE_URL": f"{mock_url}/v1beta",
+            "VEO_BASE_URL": f"{mock_url}/v1beta",
+            "ASSET_INDEX_PATH": os.path.join(data_dir, "assets.sqlite3"),
+            "PLAN_STORE_PATH": os.path.join(data_dir, "plans.sqlite3"),
+            "SHARED_CACHE_PATH": os.path.join(data_dir, "shared_cache.sqlite3"),
+            "IDEMPOTENCY_STORE_PATH": os.path.join(data_dir, "idempotency.sqlite3"),
+            "VEO_RENDER_CACHE_PATH": os.path.join(data_dir, "veo_renders.sqlite3"),
+            "VEO_JOB_STORE_PATH": os.path.join(data_dir, "veo_jobs.sqlite3"),
+            "STATIC_DIR": os.path.join(data_dir, "static"),
+            "VEO_EXPECTED_RENDER_SEC": str(args.veo_render_sec),
+            "VEO_POLL_MIN_INTERVAL_SEC": "0.5",
+        }
+    )
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def _mock_env(args: argparse.Namespace) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "MOCK_TEXT_LATENCY_MS": str(args.text_latency_ms),
+            "MOCK_IMAGE_LATENCY_MS": str(args.image_latency_ms),
+            "MOCK_IMAGE_BYTES": str(args.image_bytes),
+            "MOCK_VEO_RENDER_SEC": str(args.veo_render_sec),
+            "MOCK_VIDEO_BYTES": str(args.video_bytes),
+            "MOCK_ERROR_RATE": str(args.error_rate),
+        }
+    )
+    return env
+
+
+def _print_result(result: ScenarioResult) -> None:
+    lat = result.latency_ms
+    rss = f"{result.peak_rss_mb} MB" if result.peak_rss_mb is not None else "n/a"
+    print(
+        f"[{result.scenario}] {result.requests} req @ c={result.concurrency}: "
+        f"{result.rps} req/s, p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms, "
+        f"errors={result.errors} {result.status_counts}, peak RSS={rss}"
+    )
+    if result.upstream_calls:
+        print(f"    upstream calls: {json.dumps(result.upstream_calls, sort_keys=True)}")
+
+
+async def main_async(args: argparse.Namespace) -> list[ScenarioResult]:
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    processes: list[subprocess.Popen] = []
+    target, mock_url, service_pid = args.target, args.mock, None
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-") as data_dir:
+            if target is None:
+                mock_port, service_port = _free_port(), _free_port()
+                mock_url = f"http://127.0.0.1:{mock_port}"
+                mock = _uvicorn("backend.bench.mock_upstream:app", mock_port, _mock_env(args))
+                processes.append(mock)
+                await _wait_healthy(f"{mock_url}/_stats", mock)
+
+                target = f"http://127.0.0.1:{service_port}"
+                service = _uvicorn(
+                    "backend.app.main:app",
+                    service_port,
+                    _service_env(mock_url, data_dir, args),
+                    workers=args.workers,
+                )
+                processes.append(service)
+                service_pid = service.pid
+                await _wait_healthy(f"{target}/health", service)
+
+            results = []
+            for name in scenarios:
+                result = await run_scenario(
+                    name,
+                    target,
+                    mock_url,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    distinct_prompts=args.distinct_prompts,
+                    service_pid=service_pid,
+                )
+                _print_result(result)
+                results.append(result)
+            return results
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--distinct-prompts",
+        type=int,
+        default=0,
+        help="cycle through this many prompts (exercises caching); 0 = every prompt unique",
+    )
+    parser.add_argument("--target", help="existing service URL; default spawns one")
+    parser.add_argument("--mock", help="mock upstream URL used by --target (for call counts)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned service")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE", help="extra env for the spawned service"
+    )
+    parser.add_argument("--text-latency-ms", type=float, default=300)
+    parser.add_argument("--image-latency-ms", type=float, default=1500)
+    parser.add_argument("--image-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--veo-render-sec", type=float, default=5)
+    parser.add_argument("--video-bytes", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock calls failing with 503")
+    parser.add_argument("--json", help="write results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(main_async(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps([asdict(r) for r in results], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stand-in for the Gemini and Veo HTTP APIs, for offline benchmarks.
+
+Point the service at it with
+    GEMINI_BASE_URL=http://127.0.0.1:<port>/v1beta
+    VEO_BASE_URL=http://127.0.0.1:<port>/v1beta
+
+Run:
+    python -m uvicorn backend.bench.mock_upstream:app --port 8900
+
+Response sizes and latencies come from MOCK_* environment variables (see
+MockSettings). GET /_stats returns upstream call counts, POST /_reset clears them.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+@dataclass(frozen=True)
+class MockSettings:
+    text_latency_sec: float
+    image_latency_sec: float
+    image_bytes: int
+    veo_start_latency_sec: float
+    veo_render_sec: float
+    video_bytes: int
+    error_rate: float
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        return cls(
+            text_latency_sec=float(os.getenv("MOCK_TEXT_LATENCY_MS", "300")) / 1000,
+            image_latency_sec=float(os.getenv("MOCK_IMAGE_LATENCY_MS", "1500")) / 1000,
+            image_bytes=int(os.getenv("MOCK_IMAGE_BYTES", str(1024 * 1024))),
+            veo_start_latency_sec=float(os.getenv("MOCK_VEO_START_LATENCY_MS", "200")) / 1000,
+            veo_render_sec=float(os.getenv("MOCK_VEO_RENDER_SEC", "5")),
+            video_bytes=int(os.getenv("MOCK_VIDEO_BYTES", str(8 * 1024 * 1024))),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+        )
+
+
+settings = MockSettings.from_env()
+app = FastAPI(title="Mock Gemini/Veo upstream")
+
+_calls: Counter[str] = Counter()
+_operations: dict[str, float] = {}  # operation id -> started_at
+
+TEXT_BUNDLE = {
+    "negatives": [
+        "blurry", "low resolution", "watermark", "text artifacts", "extra limbs",
+        "oversaturated", "jpeg artifacts", "distorted faces",
+    ],
+    "palette": {
+        "primary": ["#1B263B", "#415A77"],
+        "secondary": ["#778DA9"],
+        "accent": ["#E0A458"],
+        "background": ["#0D1B2A"],
+    },
+    "summary": {
+        "logline": "A benchmark scene rendered entirely offline.",
+        "style": "cinematic, moody, high contrast",
+        "keywords": ["benchmark", "offline", "mock", "cinematic", "night"],
+    },
+}
+
+
+@lru_cache(maxsize=8)
+def _image_b64(size: int) -> str:
+    # PNG signature + incompressible filler, like a real generated image.
+    return base64.b64encode(b"\x89PNG\r\n\x1a\n" + os.urandom(max(size - 8, 0))).decode("ascii")
+
+
+@lru_cache(maxsize=4)
+def _video_bytes(size: int) -> bytes:
+    return b"\x00\x00\x00\x18ftypmp42" + os.urandom(max(size - 12, 0))
+
+
+def _maybe_fail(kind: str) -> None:
+    if settings.error_rate and (uuid.uuid4().int % 10_000) / 10_000 < settings.error_rate:
+        _calls[f"{kind}_error"] += 1
+        raise HTTPException(status_code=503, detail="mock upstream unavailable", headers={"Retry-After": "1"})
+
+
+def _text_response(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+@app.post("/v1beta/models/{target}")
+async def model_action(target: str, request: Request):
+    model, _, action = target.partition(":")
+    body = await request.json()
+
+    if action == "predictLongRunning":
+        _calls["veo_start"] += 1
+        _maybe_fail("veo_start")
+        await asyncio.sleep(settings.veo_start_latency_sec)
+        op_id = uuid.uuid4().hex
+        _operations[op_id] = time.monotonic()
+        return {"name": f"models/{model}/operations/{op_id}"}
+
+    generation_config = body.get("generationConfig") or {}
+    wants_image = bool(generation_config.get("responseModalities"))
+
+    if action == "generateContent" and wants_image:
+        _calls["gemini_image"] += 1
+        _maybe_fail("gemini_image")
+        await asyncio.sleep(settings.image_latency_sec)
+        count = int(generation_config.get("candidateCount") or 1)
+        data = _image_b64(settings.image_bytes)
+        part = {"inlineData": {"mimeType": "image/png", "data": data}}
+        payload = json.dumps(
+            {"candidates": [{"content": {"role": "model", "parts": [part]}} for _ in range(count)]}
+        )
+        return Response(payload, media_type="application/json")
+
+    if action == "generateContent":
+        _calls["gemini_text"] += 1
+        _maybe_fail("gemini_text")
+        await asyncio.sleep(settings.text_latency_sec)
+        return _text_response(json.dumps(TEXT_BUNDLE))
+
+    if action == "streamGenerateContent":
+        _calls["gemini_text_stream"] += 1
+        _maybe_fail("gemini_text_stream")
+        text = json.dumps(TEXT_BUNDLE)
+        pieces = [text[i : i + 64] for i in range(0, len(text), 64)]
+        step = settings.text_latency_sec / max(len(pieces), 1)
+
+        async def events():
+            for piece in pieces:
+                await asyncio.sleep(step)
+                yield f"data: {json.dumps(_text_response(piece))}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    raise HTTPException(status_code=404, detail=f"Unsupported mock action: {target}")
+
+
+@app.get("/v1beta/models/{model}/operations/{op_id}")
+async def get_operation(model: str, op_id: str, request: Request):
+    _calls["veo_poll"] += 1
+    started_at = _operations.get(op_id)
+    if started_at is None:
+        raise HTTPException(status_code=404, detail="Unknown operation")
+    name = f"models/{model}/operations/{op_id}"
+    if time.monotonic() - started_at < settings.veo_render_sec:
+        return {"name": name, "done": False}
+    video_uri = f"{str(request.base_url).rstrip('/')}/media/{op_id}.mp4"
+    return {
+        "name": name,
+        "done": True,
+        "response": {
+            "generateVideoResponse": {"generatedSamples": [{"video": {"uri": video_uri}}]}
+        },
+    }
+
+
+@app.get("/media/{op_id}.mp4")
+async def get_media(op_id: str, request: Request):
+    _calls["veo_download"] += 1
+    if op_id not in _operations:
+        raise HTTPException(status_code=404, detail="Unknown media")
+    data = _video_bytes(settings.video_bytes)
+    range_header = request.headers.get("range", "")
+    if range_header.startswith("bytes="):
+        start = int(range_header[len("bytes="):].split("-", 1)[0] or 0)
+        return Response(
+            data[start:],
+            status_code=206,
+            media_type="video/mp4",
+            headers={"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"},
+        )
+    return Response(data, media_type="video/mp4")
+
+
+@app.get("/_stats")
+async def stats():
+    return JSONResponse({"calls": dict(_calls), "operations": len(_operations)})
+
+
+@app.post("/_reset")
+async def reset():
+    _calls.clear()
+    _operations.clear()
+    return {"status": "ok"}
@@ -0,0 +1,24 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# The app reads its configuration at import time: give it a key and keep every
+# on-disk store and the static media tree in a throwaway directory. Run with
+#   python -m unittest discover -s backend/tests -t .
+_STATE_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("UPSTREAM_RETRY_BASE_DELAY_SEC", "0")
+for _name, _filename in (
+    ("ASSET_INDEX_PATH", "assets.sqlite3"),
+    ("PLAN_STORE_PATH", "plans.sqlite3"),
+    ("SHARED_CACHE_PATH", "shared_cache.sqlite3"),
+    ("IDEMPOTENCY_STORE_PATH", "idempotency.sqlite3"),
+    ("VEO_RENDER_CACHE_PATH", "veo_renders.sqlite3"),
+    ("VEO_JOB_STORE_PATH", "veo_jobs.sqlite3"),
+    ("GEMINI_VARIANT_CACHE_PATH", "gemini_variants.json"),
+    ("STATIC_DIR", "static"),
+):
+    os.environ.setdefault(_name, os.path.join(_STATE_DIR, _filename))
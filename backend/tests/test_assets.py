@@ -0,0 +1,55 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.app.services.assets import AssetStore
+
+
+class AccessTrackingTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        self.store = AssetStore(
+            root=root / "generated",
+            index_path=root / "assets.sqlite3",
+            max_bytes=0,
+            max_age_sec=0,
+            gc_interval_sec=3600,
+        )
+        self.addCleanup(self.store.close)
+
+    def ingest(self, data: bytes) -> str:
+        relpath = self.store.ingest_bytes(data, kind="image", mime="image/png", ext="png")
+        return self.store.url_for(relpath)
+
+    def test_accesses_are_written_in_one_flush(self):
+        url = self.ingest(b"first")
+        digest = Path(url).stem
+        created = self.store.lookup(url)["last_accessed"]
+
+        with mock.patch.object(time, "time", return_value=created + 100):
+            self.store.record_access(digest)
+            self.store.record_access("0" * 64)  # unknown assets are ignored
+        self.assertEqual(self.store.flush_access(), 2)
+        self.assertEqual(self.store.flush_access(), 0)
+
+        self.assertEqual(self.store.lookup(url)["last_accessed"], created + 100)
+
+    def test_gc_keeps_recently_served_assets(self):
+        served = self.ingest(b"served")
+        idle = self.ingest(b"idle")
+        with mock.patch.object(time, "time", return_value=time.time() + 100):
+            self.store.record_access(Path(served).stem)
+        self.store.max_bytes = len(b"served")
+
+        # gc() flushes pending accesses before choosing victims.
+        self.assertEqual(self.store.gc(), {"removed": 1, "freed_bytes": len(b"idle")})
+        self.assertIsNotNone(self.store.lookup(served))
+        self.assertIsNone(self.store.lookup(idle))
+
+
+if __name__ == "__main__":
+    unittest.main()
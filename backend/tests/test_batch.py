@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+from backend.app.services import batch
+from backend.app.services.batch import run_batch
+
+_BUNDLE = {"negatives": ["blurry"], "palette": {"primary": ["#112233"]}, "summary": {"logline": "x"}}
+
+
+class RunBatchTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.bundle_calls: list[str] = []
+        self.image_calls: list[tuple[str, int]] = []
+        self.saved: list[tuple[str | None, dict]] = []
+        self.failing_prompts: set[str] = set()
+        for name, fake in (
+            ("resolve_bundle", self.resolve_bundle),
+            ("generate_and_store_image_variants", self.generate_images),
+            ("save_to_plan", self.save_to_plan),
+        ):
+            patch = mock.patch.object(batch, name, fake)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def resolve_bundle(self, prompt: str) -> tuple[str, dict]:
+        self.bundle_calls.append(prompt)
+        if prompt in self.failing_prompts:
+            raise ValueError(f"no bundle for {prompt}")
+        return f"plan-{prompt}", _BUNDLE
+
+    async def generate_images(self, prompt: str, prefix: str, description: str, count: int) -> list[dict]:
+        self.image_calls.append((prefix, count))
+        return [{"image_url": f"/static/generated/{prefix}-{i}.png"} for i in range(count)]
+
+    async def save_to_plan(self, plan_id: str | None, patch: dict) -> None:
+        self.saved.append((plan_id, patch))
+
+    async def collect(self, prompts: list[str], sections: list[str], **kwargs) -> tuple[list[dict], dict]:
+        lines = [line async for line in run_batch(prompts, sections, **kwargs)]
+        return lines[:-1], lines[-1]
+
+    async def test_work_is_deduplicated_across_prompts_and_sections(self):
+        items, summary = await self.collect(
+            ["harbour at dawn", "  harbour at dawn ", "desert road"],
+            ["summary", "hexcodes", "moodboard", "summary"],
+            variants=2,
+        )
+
+        self.assertEqual(sorted(self.bundle_calls), ["desert road", "harbour at dawn"])
+        self.assertEqual(self.image_calls, [("moodboard", 2), ("moodboard", 2)])
+        self.assertEqual(len(items), 9)
+        self.assertEqual(sorted(item["index"] for item in items), list(range(9)))
+        self.assertEqual({item["status"] for item in items}, {"ok"})
+        by_index = {item["index"]: item for item in items}
+        self.assertEqual(by_index[0]["result"], {"summary": {"logline": "x"}, "plan_id": "plan-harbour at dawn"})
+        self.assertEqual((by_index[5]["prompt_index"], by_index[5]["section"]), (1, "moodboard"))
+        self.assertEqual(len(by_index[5]["result"]["moodboard_variants"]), 2)
+        saved = {key: value for key, value in by_index[8]["result"].items() if key != "plan_id"}
+        self.assertIn(("plan-desert road", saved), self.saved)
+        self.assertEqual(
+            {key: summary[key] for key in ("done", "items", "errors", "unique_prompts", "upstream_work_units")},
+            {"done": True, "items": 9, "errors": 0, "unique_prompts": 2, "upstream_work_units": 4},
+        )
+
+    async def test_failed_work_unit_only_fails_its_own_items(self):
+        self.failing_prompts.add("desert road")
+
+        items, summary = await self.collect(["harbour at dawn", "desert road"], ["constraints", "storyboard"])
+
+        statuses = {(item["prompt_index"], item["section"]): item["status"] for item in items}
+        self.assertEqual(
+            statuses,
+            {
+                (0, "constraints"): "ok",
+                (0, "storyboard"): "ok",
+                (1, "constraints"): "error",
+                (1, "storyboard"): "ok",
+            },
+        )
+        failed = next(item for item in items if item["status"] == "error")
+        self.assertIsInstance(failed["error"], ValueError)
+        storyboard = next(item for item in items if item["prompt_index"] == 1 and item["section"] == "storyboard")
+        self.assertIsNone(storyboard["result"]["plan_id"])
+        self.assertEqual((summary["errors"], summary["upstream_work_units"]), (1, 4))
+
+    async def test_image_only_batch_creates_no_plans(self):
+        items, summary = await self.collect(["harbour at dawn"], ["moodboard"])
+
+        self.assertEqual(self.bundle_calls, [])
+        self.assertIsNone(items[0]["result"]["plan_id"])
+        self.assertNotIn("moodboard_variants", items[0]["result"])
+        self.assertEqual(summary["upstream_work_units"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import base64
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from backend.app.services import cassette as cassette_module
+from backend.app.services.cassette import BLOB_MIN_CHARS, Cassette, CassetteTransport
+
+_IMAGE = bytes(range(256)) * 64
+_VIDEO = b"\x00\x00\x00\x18ftypmp42" + bytes(range(256)) * 256
+_URL = "https://upstream.test/v1beta/models/m:generateContent"
+
+
+class _Body(httpx.AsyncByteStream):
+    """Streamed body, like a real connection; MockTransport reads content= bodies eagerly."""
+
+    def __init__(self, data: bytes, chunk_size: int = 1024):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    async def __aiter__(self):
+        for i in range(0, len(self.data), self.chunk_size):
+            yield self.data[i : i + self.chunk_size]
+
+
+def _streamed(data: bytes, content_type: str, **headers: str) -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": content_type, **headers}, stream=_Body(data))
+
+
+def _json(value) -> bytes:
+    return json.dumps(value).encode()
+
+
+class CassetteRoundTripTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "cassette"
+        self.upstream_calls = 0
+        self.polls = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.upstream_calls += 1
+        if request.url.path.endswith(":generateContent"):
+            data = base64.b64encode(_IMAGE).decode()
+            body = _json({"candidates": [{"content": {"parts": [{"inlineData": {"data": data}}]}}]})
+            return _streamed(body, "application/json", **{"x-request-id": "abc"})
+        if request.url.path.endswith("/operations/op-1"):
+            self.polls += 1
+            return _streamed(_json({"name": "op-1", "done": self.polls > 1}), "application/json")
+        if request.url.path.endswith("/empty.mp4"):
+            return _streamed(b"", "video/mp4")
+        return _streamed(_VIDEO, "video/mp4")
+
+    def client(self, mode: str) -> tuple[httpx.AsyncClient, Cassette]:
+        cassette = Cassette(str(self.path), mode, time_scale=0)
+        client = httpx.AsyncClient(transport=CassetteTransport(httpx.MockTransport(self.handler), cassette))
+        self.addAsyncCleanup(client.aclose)
+        return client, cassette
+
+    async def record_session(self) -> list[httpx.Response]:
+        client, cassette = self.client("record")
+        responses = [
+            await client.post(_URL, params={"key": "secret"}, json={"prompt": "x", "n": 1}),
+            await client.get("https://upstream.test/v1beta/operations/op-1"),
+            await client.get("https://upstream.test/v1beta/operations/op-1"),
+            await client.get("https://upstream.test/files/video.mp4"),
+        ]
+        self.assertEqual(cassette.recorded, 4)
+        return responses
+
+    async def test_replay_returns_the_recorded_exchanges(self):
+        recorded = await self.record_session()
+        calls = self.upstream_calls
+
+        client, cassette = self.client("replay")
+        # Same request with another key and a different JSON key order.
+        image = await client.post(_URL, params={"key": "other"}, content=b'{"n": 1, "prompt": "x"}')
+        first_poll = await client.get("https://upstream.test/v1beta/operations/op-1")
+        second_poll = await client.get("https://upstream.test/v1beta/operations/op-1")
+        video = await client.get("https://upstream.test/files/video.mp4")
+
+        self.assertEqual(self.upstream_calls, calls)
+        self.assertEqual(cassette.replayed, 4)
+        self.assertEqual(image.content, recorded[0].content)
+        self.assertEqual(image.headers["content-type"], "application/json")
+        self.assertNotIn("x-request-id", image.headers)
+        self.assertEqual([first_poll.json()["done"], second_poll.json()["done"]], [False, True])
+        self.assertEqual(video.content, _VIDEO)
+
+    async def test_index_keeps_no_secrets_or_large_payloads(self):
+        await self.record_session()
+
+        index = (self.path / "exchanges.jsonl").read_text()
+        self.assertNotIn("secret", index)
+        self.assertLess(len(index), BLOB_MIN_CHARS)
+        blobs = {path.read_bytes() for path in (self.path / "blobs").iterdir()}
+        self.assertEqual(blobs, {_IMAGE, _VIDEO})
+
+    async def test_replay_miss_is_a_501_without_network(self):
+        await self.record_session()
+        calls = self.upstream_calls
+
+        client, cassette = self.client("replay")
+        response = await client.post(_URL, json={"prompt": "unrecorded"})
+
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.json()["error"]["status"], "CASSETTE_MISS")
+        self.assertEqual(cassette.misses, 1)
+        self.assertEqual(self.upstream_calls, calls)
+
+    async def test_auto_mode_goes_to_the_network_after_the_recording(self):
+        await self.record_session()
+
+        client, cassette = self.client("auto")
+        polls = [(await client.get("https://upstream.test/v1beta/operations/op-1")).json() for _ in range(3)]
+
+        self.assertEqual([poll["done"] for poll in polls], [False, True, True])
+        self.assertEqual((cassette.replayed, cassette.recorded), (2, 1))
+        lines = (self.path / "exchanges.jsonl").read_text().splitlines()
+        self.assertEqual(len(lines), 5)
+
+    async def test_abandoned_stream_is_not_recorded(self):
+        client, cassette = self.client("record")
+        async with client.stream("GET", "https://upstream.test/files/video.mp4"):
+            pass
+
+        self.assertEqual(cassette.recorded, 0)
+        self.assertFalse((self.path / "exchanges.jsonl").exists())
+        self.assertEqual(list((self.path / "blobs").iterdir()), [])
+
+    async def test_media_bodies_are_spooled_to_disk(self):
+        client, cassette = self.client("record")
+        with mock.patch.object(cassette_module, "_SPOOL_FLUSH_BYTES", 1000):
+            spooled = []
+            async with client.stream("GET", "https://upstream.test/files/video.mp4") as response:
+                async for _ in response.aiter_raw():
+                    spooled += [path.stat().st_size for path in (self.path / "blobs").glob(".*.part")]
+            await client.get("https://upstream.test/files/empty.mp4")
+
+        self.assertGreater(max(spooled), 0)  # written while the body was still arriving
+        blobs = list((self.path / "blobs").iterdir())
+        self.assertEqual([blob.read_bytes() for blob in blobs], [_VIDEO])
+        exchanges = [json.loads(line) for line in (self.path / "exchanges.jsonl").read_text().splitlines()]
+        self.assertEqual([exchange["body"] for exchange in exchanges], [[{"bin": blobs[0].name}], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
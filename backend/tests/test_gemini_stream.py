@@ -0,0 +1,109 @@
+import asyncio
+import json
+import unittest
+import uuid
+from unittest import mock
+
+import httpx
+
+from backend.app.config import UPSTREAM_RETRY_MAX_ATTEMPTS
+from backend.app.services import gemini
+from backend.app.services.resilience import UpstreamError
+
+_BUNDLE = {"negatives": ["blurry"], "palette": {"primary": ["#112233"]}, "summary": {"logline": "x"}}
+
+
+def _sse(text: str) -> bytes:
+    event = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    return f"data: {json.dumps(event)}\n\n".encode()
+
+
+class _Body(httpx.AsyncByteStream):
+    """SSE body that can wait before its last chunks or break after them."""
+
+    def __init__(self, chunks: list[bytes], gate: asyncio.Event | None = None, fail: bool = False):
+        self.chunks = chunks
+        self.gate = gate
+        self.fail = fail
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if self.gate is not None and i == len(self.chunks) - 1:
+                await self.gate.wait()
+            yield chunk
+        if self.fail:
+            raise httpx.ReadError("connection reset")
+
+
+class BundleStreamTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # A model of its own keeps the caches, streams and breaker isolated.
+        self.model = f"test-model-{uuid.uuid4().hex[:8]}"
+        self.prompt = f"a lighthouse at dusk {uuid.uuid4().hex}"
+        self.requests = 0
+        for patch in (
+            mock.patch.object(gemini, "GEMINI_MODEL", self.model),
+            mock.patch.object(gemini, "GEMINI_VARIANT_CACHE_PATH", ""),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def use_upstream(self, body) -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests += 1
+            return httpx.Response(200, stream=body())
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.addAsyncCleanup(client.aclose)
+        patch = mock.patch.object(gemini, "get_client", lambda provider: client)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def test_no_retry_after_members_were_published(self):
+        text = json.dumps(_BUNDLE)
+        self.use_upstream(lambda: _Body([_sse(text[: text.index('"palette"')])], fail=True))
+
+        received = []
+        with self.assertRaises(httpx.ReadError):
+            async for name, value in gemini.gemini_stream_text_bundle(self.prompt):
+                received.append(name)
+
+        self.assertEqual(received, ["negatives"])
+        self.assertEqual(self.requests, 1)
+
+    async def test_malformed_event_is_an_upstream_error(self):
+        self.use_upstream(lambda: _Body([b"data: {\"candidates\": [\n\n"]))
+
+        with self.assertRaises(UpstreamError) as raised:
+            async for _ in gemini.gemini_stream_text_bundle(self.prompt):
+                pass
+
+        self.assertEqual(raised.exception.status_code, 502)
+        # Nothing was published yet, so the stream was retried.
+        self.assertEqual(self.requests, UPSTREAM_RETRY_MAX_ATTEMPTS)
+
+    async def test_stream_stays_registered_until_last_subscriber_leaves(self):
+        gate = asyncio.Event()
+        text = json.dumps(_BUNDLE)
+        split = text.index('"palette"')
+        self.use_upstream(lambda: _Body([_sse(text[:split]), _sse(text[split:])], gate=gate))
+        key = (self.model, gemini._normalize_prompt(self.prompt))
+
+        first = gemini.gemini_stream_text_bundle(self.prompt)
+        second = gemini.gemini_stream_text_bundle(self.prompt)
+        self.assertEqual(await anext(first), ("negatives", ["blurry"]))
+        self.assertEqual(await anext(second), ("negatives", ["blurry"]))
+        stream = gemini._BUNDLE_STREAMS[key]
+
+        await first.aclose()  # the subscriber that created the stream leaves
+        self.assertIs(gemini._BUNDLE_STREAMS.get(key), stream)
+
+        gate.set()
+        rest = [item async for item in second]
+        self.assertEqual(rest, [("palette", _BUNDLE["palette"]), ("summary", _BUNDLE["summary"])])
+        self.assertNotIn(key, gemini._BUNDLE_STREAMS)
+        self.assertEqual(self.requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
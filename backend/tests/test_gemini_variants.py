@@ -0,0 +1,76 @@
+import json
+import unittest
+import uuid
+from unittest import mock
+
+import httpx
+
+from backend.app.config import UPSTREAM_RETRY_MAX_ATTEMPTS
+from backend.app.services import gemini
+from backend.app.services.resilience import UpstreamError
+
+_BUNDLE = {"negatives": ["blurry"], "palette": {}, "summary": {}}
+
+
+def _variant_of(request: httpx.Request) -> str:
+    config = json.loads(request.content).get("generationConfig") or {}
+    return next(iter(config), "bare")
+
+
+def _ok() -> httpx.Response:
+    return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": json.dumps(_BUNDLE)}]}}]})
+
+
+class PayloadVariantTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # A model of its own keeps the learned variant and breaker isolated.
+        self.model = f"test-model-{uuid.uuid4().hex[:8]}"
+        self.seen: list[str] = []
+        patches = [
+            mock.patch.object(gemini, "GEMINI_MODEL", self.model),
+            mock.patch.object(gemini, "GEMINI_VARIANT_CACHE_PATH", ""),
+            mock.patch.dict(gemini._PREFERRED_VARIANTS, {self.model: "response_mime_type"}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def use_upstream(self, handler) -> None:
+        def record(request: httpx.Request) -> httpx.Response:
+            self.seen.append(_variant_of(request))
+            return handler(request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        self.addAsyncCleanup(client.aclose)
+        patch = mock.patch.object(gemini, "get_client", lambda provider: client)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def test_transient_error_keeps_learned_variant(self):
+        self.use_upstream(lambda request: httpx.Response(503, json={"error": {"status": "UNAVAILABLE"}}))
+
+        with self.assertRaises(UpstreamError) as raised:
+            await gemini._fetch_text_bundle("a lighthouse at dusk")
+
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(gemini._PREFERRED_VARIANTS[self.model], "response_mime_type")
+        # Retried on the learned variant only; the others were never probed.
+        self.assertEqual(self.seen, ["response_mime_type"] * UPSTREAM_RETRY_MAX_ATTEMPTS)
+
+    async def test_rejected_payload_falls_through_and_is_learned(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if _variant_of(request) == "response_mime_type":
+                return httpx.Response(400, json={"error": {"status": "INVALID_ARGUMENT"}})
+            return _ok()
+
+        self.use_upstream(handler)
+
+        bundle = await gemini._fetch_text_bundle("a lighthouse at dusk")
+
+        self.assertEqual(bundle, _BUNDLE)
+        self.assertEqual(self.seen, ["response_mime_type", "responseMimeType"])
+        self.assertEqual(gemini._PREFERRED_VARIANTS[self.model], "responseMimeType")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import uuid
+from unittest import mock
+
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from backend.app.routes.idempotency import REPLAYED_HEADER, run_idempotent
+from backend.app.services.shared_cache import shared_cache
+
+
+class PromptIn(BaseModel):
+    prompt: str
+
+
+class IdempotencyKeyTests(unittest.TestCase):
+    def setUp(self):
+        self.runs = 0
+        app = FastAPI()
+
+        @app.post("/generate")
+        async def generate(payload: PromptIn, request: Request, response: Response):
+            async def work() -> dict:
+                self.runs += 1
+                return {"run": self.runs, "prompt": payload.prompt}
+
+            return await run_idempotent(request, response, payload, work)
+
+        self.client = TestClient(app)
+        self.headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    def test_honoured_with_shared_cache_disabled(self):
+        with mock.patch.object(shared_cache, "enabled", False):
+            first = self.client.post("/generate", json={"prompt": "fox"}, headers=self.headers)
+            second = self.client.post("/generate", json={"prompt": "fox"}, headers=self.headers)
+
+        self.assertEqual(first.json(), {"run": 1, "prompt": "fox"})
+        self.assertNotIn(REPLAYED_HEADER, first.headers)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers[REPLAYED_HEADER], "true")
+        self.assertEqual(self.runs, 1)
+
+    def test_key_reused_with_different_body(self):
+        self.client.post("/generate", json={"prompt": "fox"}, headers=self.headers)
+        reused = self.client.post("/generate", json={"prompt": "owl"}, headers=self.headers)
+
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(self.runs, 1)
+
+    def test_without_key_every_request_runs(self):
+        self.client.post("/generate", json={"prompt": "fox"})
+        self.client.post("/generate", json={"prompt": "fox"})
+
+        self.assertEqual(self.runs, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import ProviderLimiter, UpstreamOverloaded
+
+
+def _limiter(max_queue: int = 8, queue_timeout_sec: float = 5.0) -> ProviderLimiter:
+    return ProviderLimiter(
+        "test:model", max_concurrency=1, max_rps=0, max_queue=max_queue, queue_timeout_sec=queue_timeout_sec
+    )
+
+
+class ProviderLimiterTests(unittest.IsolatedAsyncioTestCase):
+    async def hold(self, limiter: ProviderLimiter, release: asyncio.Event, started: asyncio.Event) -> None:
+        async with limiter.slot("standard"):
+            started.set()
+            await release.wait()
+
+    async def occupy(self, limiter: ProviderLimiter) -> asyncio.Event:
+        """Takes the only slot until the returned event is set."""
+        release, started = asyncio.Event(), asyncio.Event()
+        task = asyncio.create_task(self.hold(limiter, release, started))
+        self.addAsyncCleanup(lambda: task)
+        self.addCleanup(release.set)
+        await started.wait()
+        return release
+
+    async def test_queued_calls_are_served_by_priority_then_arrival(self):
+        limiter = _limiter()
+        release = await self.occupy(limiter)
+        order = []
+
+        async def call(name: str, priority: str) -> None:
+            async with limiter.slot(priority):
+                order.append(name)
+
+        tasks = []
+        for name, priority in (
+            ("background", "background"),
+            ("standard-1", "standard"),
+            ("final", "final"),
+            ("interactive", "interactive"),
+            ("standard-2", "standard"),
+        ):
+            tasks.append(asyncio.create_task(call(name, priority)))
+            await asyncio.sleep(0)
+        self.assertEqual(limiter.queue_depth, 5)
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order, ["interactive", "standard-1", "standard-2", "final", "background"])
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+        self.assertEqual(limiter.stats()["admitted"], 6)
+
+    async def test_full_queue_sheds_with_retry_after(self):
+        limiter = _limiter(max_queue=1)
+        await self.occupy(limiter)
+        queued = asyncio.create_task(limiter._acquire("standard"))
+        self.addCleanup(queued.cancel)
+        await asyncio.sleep(0)
+
+        with self.assertRaises(UpstreamOverloaded) as raised:
+            async with limiter.slot("interactive"):
+                pass
+
+        self.assertEqual(raised.exception.reason, "queue full")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(limiter.rejected, 1)
+        error = upstream_http_error(raised.exception)
+        self.assertEqual(error.status_code, 503)
+        self.assertEqual(error.headers, {"Retry-After": str(raised.exception.retry_after)})
+
+    async def test_queue_timeout_sheds_and_frees_the_queue(self):
+        limiter = _limiter(queue_timeout_sec=0.01)
+        release = await self.occupy(limiter)
+
+        with self.assertRaises(UpstreamOverloaded) as raised:
+            async with limiter.slot("standard"):
+                pass
+
+        self.assertEqual(raised.exception.reason, "queue timeout")
+        self.assertEqual(limiter.timeouts, 1)
+        self.assertEqual(limiter.queue_depth, 0)
+        release.set()
+        async with limiter.slot("standard"):
+            self.assertEqual(limiter.stats()["in_flight"], 1)
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        limiter = _limiter()
+        release = await self.occupy(limiter)
+        queued = asyncio.create_task(limiter._acquire("standard"))
+        await asyncio.sleep(0)
+
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        release.set()
+        await asyncio.sleep(0)
+
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+        self.assertEqual(limiter.queue_depth, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
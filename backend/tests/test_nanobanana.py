@@ -0,0 +1,143 @@
+import base64
+import json
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from backend.app.services import nanobanana
+from backend.app.services.assets import AssetStore
+
+_PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 3
+_OTHER_PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(255, -1, -1)) * 2
+
+
+def _image_part(data: bytes, mime: str = "image/png") -> dict:
+    return {"inlineData": {"mimeType": mime, "data": base64.b64encode(data).decode()}}
+
+
+def _response(*candidate_parts: list[dict]) -> bytes:
+    return json.dumps({"candidates": [{"content": {"parts": parts}} for parts in candidate_parts]}).encode()
+
+
+def _split(body: bytes, size: int) -> list[bytes]:
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+class _Body(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class InlineImageScannerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        self.store = AssetStore(
+            root=root / "generated",
+            index_path=root / "assets.sqlite3",
+            max_bytes=0,
+            max_age_sec=0,
+            gc_interval_sec=3600,
+        )
+        self.addCleanup(self.store.close)
+        self.prompt = f"a lighthouse at dusk {uuid.uuid4().hex}"
+        for patch in (
+            # A model of its own keeps the breaker isolated.
+            mock.patch.object(nanobanana, "GEMINI_IMAGE_MODEL", f"test-image-{uuid.uuid4().hex[:8]}"),
+            mock.patch.object(nanobanana, "asset_store", self.store),
+            mock.patch.object(nanobanana.renditions, "schedule"),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def use_upstream(self, chunks: list[bytes]) -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, stream=_Body(chunks))
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.addAsyncCleanup(client.aclose)
+        patch = mock.patch.object(nanobanana, "get_client", lambda provider: client)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def generate(self, max_images: int = 1) -> list[bytes]:
+        relpaths = await nanobanana._generate_images_to_files(self.prompt, "img", max_images=max_images)
+        return [(self.store.root / relpath).read_bytes() for relpath in relpaths]
+
+    def assertNoPartialFiles(self):
+        self.assertEqual(list(self.store.root.glob(".*.part")), [])
+
+    async def test_image_split_into_tiny_chunks(self):
+        self.use_upstream(_split(_response([{"text": "here you go"}, _image_part(_PNG)]), 7))
+
+        self.assertEqual(await self.generate(), [_PNG])
+        self.assertNoPartialFiles()
+
+    async def test_escaped_padding_is_decoded(self):
+        body = _response([_image_part(_PNG[:-1])])  # 767 bytes, so the data ends in "="
+        self.assertIn(b'="', body)
+        self.use_upstream([body.replace(b'="', b'\\u003d"').replace(b"/", b"\\/")])
+
+        self.assertEqual(await self.generate(), [_PNG[:-1]])
+
+    async def test_escape_split_across_chunks(self):
+        body = _response([_image_part(_PNG[:-1])]).replace(b'="', b'\\u003d"')
+        for cut in (body.index(b"\\u003d") + offset for offset in (1, 2, 4)):
+            with self.subTest(cut=cut):
+                self.use_upstream([body[:cut], body[cut:]])
+                self.assertEqual(await self.generate(), [_PNG[:-1]])
+
+    async def test_escaped_non_base64_character_is_rejected(self):
+        body = _response([_image_part(_PNG)])
+        data = base64.b64encode(_PNG)
+        self.use_upstream([body.replace(data, data[:8] + b"\\n" + data[8:])])
+
+        with self.assertRaisesRegex(ValueError, "Invalid base64"):
+            await self.generate()
+        self.assertNoPartialFiles()
+
+    async def test_invalid_unicode_escape_is_rejected(self):
+        self.use_upstream([_response([{"text": "abc"}]).replace(b"abc", b"\\u00zz")])
+
+        with self.assertRaisesRegex(ValueError, "Invalid"):
+            await self.generate()
+
+    async def test_missing_inline_data(self):
+        self.use_upstream([_response([{"text": "no image"}, {"fileData": {"fileUri": "gs://x"}}])])
+
+        with self.assertRaisesRegex(ValueError, "no inlineData image"):
+            await self.generate()
+
+    async def test_text_only_candidates(self):
+        body = _response([{"text": "one"}], [{"text": 'two = "quoted"'}]).replace(b"=", b"\\u003d")
+        self.use_upstream(_split(body, 5))
+
+        with self.assertRaisesRegex(ValueError, "no inlineData image"):
+            await self.generate()
+
+    async def test_multiple_candidates(self):
+        self.use_upstream(
+            _split(_response([_image_part(_PNG)], [{"text": "skip"}], [_image_part(_OTHER_PNG)]), 64)
+        )
+
+        self.assertEqual(await self.generate(max_images=2), [_PNG, _OTHER_PNG])
+        self.assertNoPartialFiles()
+
+    async def test_images_beyond_max_images_are_ignored(self):
+        self.use_upstream([_response([_image_part(_PNG)], [_image_part(_OTHER_PNG)])])
+
+        self.assertEqual(await self.generate(max_images=1), [_PNG])
+        self.assertNoPartialFiles()
+
+
+if __name__ == "__main__":
+    unittest.main()
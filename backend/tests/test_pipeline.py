@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+
+from backend.app.routes.errors import upstream_http_error
+from backend.app.services.limiter import UpstreamOverloaded
+from backend.app.services.pipeline import Pipeline, PipelineError
+
+
+class PipelineTests(unittest.IsolatedAsyncioTestCase):
+    async def test_stages_get_their_dependencies_outputs(self):
+        started = []
+
+        async def plan():
+            started.append("plan")
+            return "p"
+
+        async def left(plan):
+            started.append("left")
+            await asyncio.sleep(0.01)
+            return plan + "l"
+
+        async def right(plan):
+            started.append("right")
+            return plan + "r"
+
+        async def join(left, right):
+            return left + right
+
+        outputs, timings = await (
+            Pipeline("test")
+            .stage("plan", plan)
+            .stage("left", left, deps=("plan",))
+            .stage("right", right, deps=("plan",))
+            .stage("join", join, deps=("left", "right"))
+            .run()
+        )
+
+        self.assertEqual(outputs, {"plan": "p", "left": "pl", "right": "pr", "join": "plpr"})
+        self.assertEqual(started, ["plan", "left", "right"])  # right did not wait for left
+        self.assertEqual({timing["status"] for timing in timings.values()}, {"ok"})
+
+    async def test_failure_reports_partial_results(self):
+        cancelled = asyncio.Event()
+
+        async def plan():
+            return {"plan_id": "p-1"}
+
+        async def bundle(plan):
+            return "bundle"
+
+        async def moodboard(plan):
+            await asyncio.sleep(0)
+            raise ValueError("image model unavailable")
+
+        async def storyboard(plan):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def prompt(bundle, moodboard):
+            raise AssertionError("must not run")
+
+        pipeline = (
+            Pipeline("test")
+            .stage("plan", plan)
+            .stage("bundle", bundle, deps=("plan",))
+            .stage("moodboard", moodboard, deps=("plan",))
+            .stage("storyboard", storyboard, deps=("plan",))
+            .stage("prompt", prompt, deps=("bundle", "moodboard"))
+        )
+        with self.assertRaises(PipelineError) as raised:
+            await pipeline.run()
+
+        error = raised.exception
+        self.assertEqual(error.stage, "moodboard")
+        self.assertIsInstance(error.error, ValueError)
+        self.assertEqual(error.partial, {"plan": {"plan_id": "p-1"}, "bundle": "bundle"})
+        self.assertTrue(cancelled.is_set())
+        statuses = {name: timing["status"] for name, timing in error.timings.items()}
+        self.assertEqual(
+            statuses,
+            {"plan": "ok", "bundle": "ok", "moodboard": "failed", "storyboard": "cancelled", "prompt": "pending"},
+        )
+        report = error.report()
+        self.assertEqual(report["stage"], "moodboard")
+        self.assertEqual(report["completed_stages"], ["bundle", "plan"])
+
+    async def test_http_error_carries_the_report_and_the_cause(self):
+        async def start():
+            raise UpstreamOverloaded("veo_start:m", "queue full", 7)
+
+        with self.assertRaises(PipelineError) as raised:
+            await Pipeline("test").stage("start", start).run()
+
+        error = upstream_http_error(raised.exception)
+        self.assertEqual(error.status_code, 503)
+        self.assertEqual(error.headers, {"Retry-After": "7"})
+        self.assertEqual(error.detail["stage"], "start")
+
+    def test_stages_must_be_declared_once_after_their_dependencies(self):
+        async def noop(**_):
+            return None
+
+        pipeline = Pipeline("test").stage("a", noop)
+        with self.assertRaises(ValueError):
+            pipeline.stage("a", noop)
+        with self.assertRaises(ValueError):
+            pipeline.stage("b", noop, deps=("c",))
+
+
+if __name__ == "__main__":
+    unittest.main()
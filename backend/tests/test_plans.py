@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.routes import constraints
+from backend.app.services import plans
+from backend.app.services.plans import PlanNotFound, PlanPromptMismatch, resolve_bundle, stream_bundle
+from backend.app.store import MemoryPlanStore
+
+_BUNDLE = {"negatives": ["blurry"], "palette": {"primary": ["#112233"]}, "summary": {"logline": "x"}}
+
+
+class _StoredPlan(unittest.IsolatedAsyncioTestCase):
+    """Patches the plans service onto a memory store holding one plan."""
+
+    def setUp(self):
+        self.store = MemoryPlanStore(max_plans=10, ttl_sec=3600)
+        self.generated: list[str] = []
+        for name, fake in (
+            ("get_plan", self.store.get),
+            ("create_plan", self.store.create),
+            ("gemini_generate_text_bundle", self.generate),
+            ("gemini_stream_text_bundle", self.stream),
+        ):
+            patch = mock.patch.object(plans, name, fake)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.plan_id = self.store.create("harbour at dawn", _BUNDLE)
+
+    async def generate(self, prompt: str) -> dict:
+        self.generated.append(prompt)
+        return {**_BUNDLE, "summary": {"logline": prompt}}
+
+    async def stream(self, prompt: str):
+        bundle = await self.generate(prompt)
+        for item in bundle.items():
+            yield item
+
+
+class PlanReuseTests(_StoredPlan):
+    async def test_stored_bundle_is_reused_for_the_same_prompt(self):
+        self.assertEqual(await resolve_bundle(" harbour at dawn ", self.plan_id), (self.plan_id, _BUNDLE))
+        streamed = [item async for item in stream_bundle("harbour at dawn", self.plan_id)]
+        self.assertEqual(streamed[-1], ("plan_id", self.plan_id))
+        self.assertEqual(self.generated, [])
+
+    async def test_without_a_plan_id_a_new_plan_is_created(self):
+        plan_id, bundle = await resolve_bundle("desert road")
+
+        self.assertNotEqual(plan_id, self.plan_id)
+        self.assertEqual(self.store.get(plan_id)["prompt"], "desert road")
+        self.assertEqual(bundle["summary"], {"logline": "desert road"})
+
+    async def test_unknown_plan_is_not_replaced(self):
+        with self.assertRaises(PlanNotFound):
+            await resolve_bundle("harbour at dawn", "expired")
+        with self.assertRaises(PlanNotFound):
+            [item async for item in stream_bundle("harbour at dawn", "expired")]
+        self.assertEqual(self.generated, [])
+        self.assertEqual(self.store.stats()["plans"], 1)
+
+    async def test_plan_for_another_prompt_is_rejected(self):
+        with self.assertRaises(PlanPromptMismatch):
+            await resolve_bundle("desert road", self.plan_id)
+        self.assertEqual(self.generated, [])
+
+
+class PlanRouteErrorTests(_StoredPlan):
+    def setUp(self):
+        super().setUp()
+        app = FastAPI()
+        app.include_router(constraints.router)
+        self.client = TestClient(app)
+
+    def post(self, prompt: str, plan_id: str):
+        return self.client.post("/v1/constraints", json={"prompt": prompt, "plan_id": plan_id})
+
+    def test_unknown_plan_is_a_404(self):
+        response = self.post("harbour at dawn", "expired")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["detail"], "Unknown or expired plan: expired")
+
+    def test_plan_for_another_prompt_is_a_409(self):
+        self.assertEqual(self.post("desert road", self.plan_id).status_code, 409)
+
+    def test_matching_plan_is_reused(self):
+        response = self.post("harbour at dawn", self.plan_id)
+
+        self.assertEqual(response.json(), {"negatives": "blurry", "plan_id": self.plan_id})
+
+
+if __name__ == "__main__":
+    unittest.main()
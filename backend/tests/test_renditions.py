@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.routes import renditions as renditions_route
+from backend.app.services.assets import AssetStore
+from backend.app.services.renditions import renditions
+from backend.app.static_files import IMMUTABLE
+
+_IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+
+class RenditionRouteTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.store = AssetStore(
+            root=self.root / "generated",
+            index_path=self.root / "assets.sqlite3",
+            max_bytes=0,
+            max_age_sec=0,
+            gc_interval_sec=3600,
+        )
+        self.addCleanup(self.store.close)
+        self.relpath = self.store.ingest_bytes(_IMAGE, kind="moodboard", mime="image/png", ext="png")
+        self.digest = Path(self.relpath).stem
+        self.ensured: list[tuple[str, str]] = []
+        self.rendered: Path | Exception | None = None
+        for patch in (
+            mock.patch.object(renditions_route, "asset_store", self.store),
+            mock.patch.object(renditions, "enabled", True),
+            mock.patch.object(renditions, "ensure", self.ensure),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        app = FastAPI()
+        app.include_router(renditions_route.router)
+        self.client = TestClient(app, follow_redirects=False)
+
+    async def ensure(self, name: str, digest: str) -> Path | None:
+        self.ensured.append((name, digest))
+        if isinstance(self.rendered, Exception):
+            raise self.rendered
+        return self.rendered
+
+    def get(self, name: str = "thumb", digest: str | None = None, ext: str = "webp", **headers: str):
+        return self.client.get(f"/v1/renditions/{name}/{digest or self.digest}.{ext}", headers=headers)
+
+    def assertRedirectsToOriginal(self, response) -> None:
+        self.assertEqual(response.status_code, 307)
+        self.assertEqual(response.headers["location"], f"/static/generated/{self.relpath}")
+
+    def test_rendered_preview_is_served_immutable(self):
+        self.rendered = self.root / "preview.webp"
+        self.rendered.write_bytes(b"RIFF....WEBP")
+
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"RIFF....WEBP")
+        self.assertEqual(response.headers["content-type"], "image/webp")
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE)
+        self.assertEqual(response.headers["etag"], f'"{self.digest}-thumb"')
+        self.assertEqual(self.ensured, [("thumb", self.digest)])
+        self.assertEqual(self.store.flush_access(), 1)
+
+        cached = self.get(**{"If-None-Match": response.headers["etag"]})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_redirects_to_the_original_when_rendering_fails(self):
+        self.rendered = RuntimeError("cannot identify image file")
+
+        self.assertRedirectsToOriginal(self.get("medium"))
+        self.assertEqual(self.ensured, [("medium", self.digest)])
+
+    def test_redirects_to_the_original_when_renditions_are_disabled(self):
+        with mock.patch.object(renditions, "enabled", False):
+            self.assertRedirectsToOriginal(self.get())
+
+        self.assertEqual(self.ensured, [])
+
+    def test_unknown_image_or_rendition(self):
+        with mock.patch.object(renditions, "enabled", False):
+            self.assertEqual(self.get(digest="0" * 64).status_code, 404)
+        for response in (self.get(name="huge"), self.get(ext="png"), self.get(digest="not-a-digest")):
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.ensured, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
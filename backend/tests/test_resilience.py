@@ -0,0 +1,195 @@
+import asyncio
+import time
+import unittest
+import uuid
+from unittest import mock
+
+import httpx
+
+from backend.app.services import resilience
+from backend.app.services.resilience import CircuitBreaker, CircuitOpen, UpstreamError, call_upstream
+
+
+class _Upstream:
+    """attempt() callable that raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class RetryClassificationTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # A model of its own keeps the breaker and call stats isolated.
+        self.model = f"test-model-{uuid.uuid4().hex[:8]}"
+        patch = mock.patch.object(resilience, "UPSTREAM_RETRY_MAX_ATTEMPTS", 3)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def call(self, upstream: _Upstream, idempotent: bool):
+        return await call_upstream("test_op", self.model, upstream, idempotent=idempotent)
+
+    async def test_non_idempotent_calls_retry_only_unprocessed_requests(self):
+        for error in (UpstreamError("busy", 429), UpstreamError("unavailable", 503), httpx.ConnectError("refused")):
+            with self.subTest(error=error):
+                upstream = _Upstream(error)
+                self.assertEqual(await self.call(upstream, idempotent=False), "ok")
+                self.assertEqual(upstream.calls, 2)
+
+        for error in (UpstreamError("boom", 500), UpstreamError("gateway", 504), httpx.ReadError("reset")):
+            with self.subTest(error=error):
+                upstream = _Upstream(error)
+                with self.assertRaises(type(error)):
+                    await self.call(upstream, idempotent=False)
+                self.assertEqual(upstream.calls, 1)
+
+    async def test_idempotent_calls_retry_provider_failures_up_to_the_limit(self):
+        upstream = _Upstream(UpstreamError("boom", 500), httpx.ReadError("reset"))
+        self.assertEqual(await self.call(upstream, idempotent=True), "ok")
+        self.assertEqual(upstream.calls, 3)
+
+        upstream = _Upstream(*(UpstreamError("boom", 502) for _ in range(3)))
+        with self.assertRaises(UpstreamError):
+            await self.call(upstream, idempotent=True)
+        self.assertEqual(upstream.calls, 3)
+
+    async def test_client_errors_and_long_retry_after_are_not_retried(self):
+        for error in (UpstreamError("bad request", 400), UpstreamError("slow down", 429, retry_after=3600)):
+            with self.subTest(error=error):
+                upstream = _Upstream(error)
+                with self.assertRaises(UpstreamError):
+                    await self.call(upstream, idempotent=True)
+                self.assertEqual(upstream.calls, 1)
+
+
+class HedgedAttemptTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.stats = resilience._CallStats("test_op", f"test-model-{uuid.uuid4().hex[:8]}")
+        self.stats.latencies.extend([0.001] * 20)
+        for patch in (
+            mock.patch.object(resilience, "UPSTREAM_HEDGE_MIN_SAMPLES", 20),
+            mock.patch.object(resilience, "UPSTREAM_HEDGE_MIN_DELAY_SEC", 0.01),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_hedge_wins_and_the_slow_attempt_is_cancelled(self):
+        cancelled = asyncio.Event()
+        calls = 0
+
+        async def attempt() -> str:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return f"attempt-{calls}"
+
+        self.assertEqual(await resilience._hedged_attempt(self.stats, attempt), "attempt-2")
+        await asyncio.wait_for(cancelled.wait(), 1)
+        self.assertEqual((self.stats.hedges, self.stats.hedge_wins), (1, 1))
+
+    async def test_fast_primary_is_not_hedged(self):
+        upstream = _Upstream()
+        self.assertEqual(await resilience._hedged_attempt(self.stats, upstream), "ok")
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(self.stats.hedges, 0)
+
+    async def test_failed_hedge_falls_back_to_the_primary(self):
+        release = asyncio.Event()
+        calls = 0
+
+        async def attempt() -> str:
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                release.set()
+                raise UpstreamError("boom", 500)
+            await release.wait()
+            return "primary"
+
+        self.assertEqual(await resilience._hedged_attempt(self.stats, attempt), "primary")
+        self.assertEqual((self.stats.hedges, self.stats.hedge_wins), (1, 0))
+
+    async def test_too_few_samples_means_no_hedge(self):
+        self.stats.latencies.clear()
+        upstream = _Upstream(UpstreamError("boom", 500))
+        with self.assertRaises(UpstreamError):
+            await resilience._hedged_attempt(self.stats, upstream)
+        self.assertEqual(upstream.calls, 1)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patch = mock.patch.object(time, "monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_sec=30)
+
+    def open_circuit(self) -> None:
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.on_failure(UpstreamError("boom", 503))
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_opens_after_consecutive_provider_failures(self):
+        self.breaker.on_failure(UpstreamError("boom", 500))
+        self.breaker.on_failure(UpstreamError("bad request", 400))  # the provider answered
+        self.breaker.on_failure(UpstreamError("boom", 500))
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.on_failure(httpx.ReadError("reset"))
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpen) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_half_open_trial_success_closes(self):
+        self.open_circuit()
+        self.now += 30
+
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, "half_open")
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()  # one trial at a time
+        self.breaker.on_success()
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_call()
+
+    def test_half_open_trial_failure_reopens(self):
+        self.open_circuit()
+        self.now += 30
+
+        self.breaker.before_call()
+        self.breaker.on_failure(UpstreamError("boom", 502))
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.opens, 2)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+    def test_abandoned_trial_lets_the_next_call_through(self):
+        self.open_circuit()
+        self.now += 30
+
+        self.breaker.before_call()
+        self.breaker.on_abandon()
+        self.breaker.before_call()
+        self.breaker.on_failure(UpstreamError("bad request", 400))
+
+        self.assertEqual(self.breaker.state, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
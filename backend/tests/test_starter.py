@@ -0,0 +1,105 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.routes.starter import router
+from backend.app.services import starter
+from backend.app.services.limiter import UpstreamOverloaded
+
+
+def _parse_sse(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.split("\n\n"):
+        if not block:
+            continue
+        name, data = block.split("\n")
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class StarterRouteTests(unittest.TestCase):
+    def setUp(self):
+        self.saved: list[tuple[str | None, dict]] = []
+        self.image_error: Exception | None = None
+        for name, fake in (
+            ("stream_bundle", self.stream_bundle),
+            ("generate_and_store_image", self.generate_image),
+            ("save_to_plan", self.save_to_plan),
+        ):
+            patch = mock.patch.object(starter, name, fake)
+            patch.start()
+            self.addCleanup(patch.stop)
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+
+    async def stream_bundle(self, prompt: str, plan_id: str | None = None):
+        yield "negatives", ["blurry", "text"]
+        yield "palette", {"primary": ["#112233"]}
+        yield "summary", {"logline": prompt}
+        yield "plan_id", plan_id or "plan-1"
+
+    async def generate_image(self, prompt: str, prefix: str, description: str) -> dict:
+        await asyncio.sleep(0.01)
+        if prefix == "storyboard" and self.image_error is not None:
+            raise self.image_error
+        return {"image_url": f"/static/generated/{prefix}.png", "description": description}
+
+    async def save_to_plan(self, plan_id: str | None, patch: dict) -> None:
+        self.saved.append((plan_id, patch))
+
+    def test_server_sent_events(self):
+        response = self.client.post("/v1/starter", json={"prompt": "harbour at dawn"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        events = _parse_sse(response.text)
+        names = [name for name, _ in events]
+        self.assertEqual(names[:4], ["constraints", "hexcodes", "summary", "plan"])
+        self.assertEqual(sorted(names[4:6]), ["moodboard", "storyboard"])
+        self.assertEqual(names[6:], ["done"])
+        data = dict(events)
+        self.assertEqual(data["constraints"]["result"], {"negatives": "blurry, text"})
+        self.assertEqual(data["plan"], {"plan_id": "plan-1"})
+        self.assertEqual(data["moodboard"]["result"]["moodboard"]["image_url"], "/static/generated/moodboard.png")
+        self.assertEqual((data["done"]["plan_id"], data["done"]["errors"]), ("plan-1", 0))
+        self.assertEqual(sorted(key for _, patch in self.saved for key in patch), ["moodboard", "storyboard"])
+        self.assertEqual({plan_id for plan_id, _ in self.saved}, {"plan-1"})
+
+    def test_failed_section_is_an_error_event(self):
+        self.image_error = UpstreamOverloaded("gemini_image:m", "queue full", 4)
+
+        response = self.client.post("/v1/starter", json={"prompt": "harbour at dawn", "plan_id": "plan-7"})
+
+        events = _parse_sse(response.text)
+        errors = [data for name, data in events if name == "error"]
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]["section"], "storyboard")
+        self.assertEqual(errors[0]["error"]["status_code"], 503)
+        self.assertEqual(errors[0]["error"]["retry_after"], "4")
+        self.assertEqual(events[-1][1]["errors"], 1)
+        self.assertEqual(events[-1][1]["plan_id"], "plan-7")
+        self.assertEqual([(plan_id, list(patch)) for plan_id, patch in self.saved], [("plan-7", ["moodboard"])])
+
+    def test_ndjson_on_request(self):
+        response = self.client.post(
+            "/v1/starter",
+            json={"prompt": "harbour at dawn"},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[0]["section"], "constraints")
+        self.assertIn({"plan_id": "plan-1"}, lines)
+        self.assertTrue(lines[-1]["done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
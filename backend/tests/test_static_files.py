@@ -0,0 +1,96 @@
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from backend.app.static_files import IMMUTABLE, MediaStaticFiles
+
+_VIDEO = bytes(range(256)) * 4
+
+
+class MediaStaticFilesTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        self.digest = hashlib.sha256(_VIDEO).hexdigest()
+        self.url = f"/static/generated/{self.digest[:2]}/{self.digest}.mp4"
+        self.etag = f'"{self.digest}"'
+        for relpath in (
+            f"generated/{self.digest[:2]}/{self.digest}.mp4",
+            "generated/veo-3f2a9c1e.mp4",
+            f"generated/.{self.digest}.part",
+        ):
+            (root / relpath).parent.mkdir(parents=True, exist_ok=True)
+            (root / relpath).write_bytes(_VIDEO)
+
+        app = Starlette(routes=[Mount("/static", MediaStaticFiles(directory=root))])
+        self.client = TestClient(app)
+
+    def get(self, url: str | None = None, **headers: str):
+        return self.client.get(url or self.url, headers={k.replace("_", "-"): v for k, v in headers.items()})
+
+    def test_content_addressed_file_is_immutable_with_strong_etag(self):
+        r = self.get()
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, _VIDEO)
+        self.assertEqual(r.headers["cache-control"], IMMUTABLE)
+        self.assertEqual(r.headers["etag"], self.etag)
+
+    def test_matching_if_none_match_is_not_modified(self):
+        r = self.get(if_none_match=self.etag)
+
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.content, b"")
+        self.assertEqual(r.headers["etag"], self.etag)
+
+    def test_single_byte_range(self):
+        r = self.get(range="bytes=10-19")
+
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.content, _VIDEO[10:20])
+        self.assertEqual(r.headers["content-range"], f"bytes 10-19/{len(_VIDEO)}")
+
+    def test_suffix_range(self):
+        r = self.get(range="bytes=-100")
+
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.content, _VIDEO[-100:])
+        self.assertEqual(
+            r.headers["content-range"], f"bytes {len(_VIDEO) - 100}-{len(_VIDEO) - 1}/{len(_VIDEO)}"
+        )
+
+    def test_if_range_with_current_etag_resumes(self):
+        r = self.get(range="bytes=512-", if_range=self.etag)
+
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.content, _VIDEO[512:])
+
+    def test_if_range_with_stale_etag_sends_whole_file(self):
+        r = self.get(range="bytes=512-", if_range='"0000"')
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, _VIDEO)
+
+    def test_unsatisfiable_range(self):
+        r = self.get(range=f"bytes={len(_VIDEO)}-{len(_VIDEO) + 100}")
+
+        self.assertEqual(r.status_code, 416)
+        self.assertEqual(r.headers["content-range"], f"bytes */{len(_VIDEO)}")
+
+    def test_other_generated_files_are_revalidated(self):
+        for url in ("/static/generated/veo-3f2a9c1e.mp4", f"/static/generated/.{self.digest}.part"):
+            with self.subTest(url=url):
+                r = self.get(url)
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(r.headers["cache-control"], "no-cache")
+                self.assertNotEqual(r.headers["etag"], self.etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
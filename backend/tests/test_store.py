@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend.app.store import MemoryPlanStore, PlanStore, SqlitePlanStore
+
+
+class PlanStoreContractTests:
+    """Behaviour both backends share; subclasses provide make_store()."""
+
+    def make_store(self, max_plans: int = 10) -> PlanStore:
+        raise NotImplementedError
+
+    def test_get_returns_a_copy(self):
+        store = self.make_store()
+        plan_id = store.create("a lighthouse", {"negatives": ["blurry"]})
+
+        plan = store.get(plan_id)
+        plan["bundle"]["negatives"].append("grainy")
+        plan["moodboard"] = {"image_url": "/static/x.png"}
+
+        self.assertEqual(store.get(plan_id), {"prompt": "a lighthouse", "bundle": {"negatives": ["blurry"]}})
+
+    def test_update_patches_fields(self):
+        store = self.make_store()
+        plan_id = store.create("a lighthouse", {})
+
+        updated = store.update(plan_id, {"storyboard": {"image_url": "/static/s.png"}})
+
+        self.assertEqual(updated["storyboard"], {"image_url": "/static/s.png"})
+        self.assertEqual(store.get(plan_id), updated)
+        self.assertIsNone(store.update("missing", {"storyboard": {}}))
+
+    def test_least_recently_used_plans_beyond_cap_are_dropped(self):
+        store = self.make_store(max_plans=2)
+        first = store.create("first", {})
+        second = store.create("second", {})
+        store.get(first)  # first is now more recently used than second
+        third = store.create("third", {})
+
+        self.assertIsNone(store.get(second))
+        self.assertIsNotNone(store.get(first))
+        self.assertIsNotNone(store.get(third))
+        self.assertEqual(store.stats()["plans"], 2)
+
+
+class MemoryPlanStoreTests(PlanStoreContractTests, unittest.TestCase):
+    def make_store(self, max_plans: int = 10) -> PlanStore:
+        return MemoryPlanStore(max_plans=max_plans, ttl_sec=3600)
+
+
+class SqlitePlanStoreTests(PlanStoreContractTests, unittest.TestCase):
+    def make_store(self, max_plans: int = 10) -> PlanStore:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = SqlitePlanStore(Path(directory.name) / "plans.sqlite3", max_plans=max_plans, ttl_sec=3600)
+        self.addCleanup(store.close)
+        return store
+
+    def test_sweep_enforces_cap_for_plans_written_elsewhere(self):
+        store = self.make_store(max_plans=5)
+        for i in range(3):
+            store.create(f"plan {i}", {})
+        # Another worker configured with a smaller cap shares the same file.
+        store.max_plans = 1
+
+        self.assertEqual(store.sweep(), 2)
+        self.assertEqual(store.stats()["plans"], 1)
+
+
+class PlanStoreInterfaceTests(unittest.TestCase):
+    def test_incomplete_store_cannot_be_instantiated(self):
+        class NoStats(PlanStore):
+            def create(self, prompt, bundle):
+                return ""
+
+        with self.assertRaises(TypeError):
+            NoStats()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.app.services import veo_jobs as veo_jobs_module
+from backend.app.services.veo_jobs import VeoJobEngine, VeoJobStore
+
+
+class SharedJobStateTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "veo_jobs.sqlite3"
+
+    def store(self) -> VeoJobStore:
+        store = VeoJobStore(self.path, retention=10, stale_after_sec=30)
+        self.addCleanup(store.close)
+        return store
+
+    def worker(self) -> VeoJobEngine:
+        # Each engine has its own connection, like a separate worker process.
+        store = self.store()
+        return VeoJobEngine(max_wait_sec=5, retention=10, store=store)
+
+    async def test_other_worker_sees_and_streams_job(self):
+        owner, other = self.worker(), self.worker()
+        release = asyncio.Event()
+
+        async def prepare(prompt: str) -> dict:
+            await release.wait()
+            raise ValueError("no reference images")
+
+        job = owner.submit("a lighthouse at dusk", prepare)
+        await asyncio.sleep(0.05)
+        snapshot = await other.load(job.id)
+        self.assertEqual(snapshot["status"], "preparing")
+        self.assertEqual([s["id"] for s in await other.recent()], [job.id])
+
+        with mock.patch.object(veo_jobs_module, "REMOTE_POLL_SEC", 0.01):
+            events = other.subscribe(job.id)
+            self.assertEqual((await anext(events))["status"], "preparing")
+            release.set()
+            final = await anext(events)
+
+        self.assertEqual(final["status"], "failed")
+        self.assertEqual(final["error"], "no reference images")
+        self.assertEqual(await other.load(job.id), job.snapshot())
+        await owner.shutdown()
+
+    async def test_unknown_job(self):
+        self.assertIsNone(await self.worker().load("missing"))
+
+    async def test_job_of_stopped_worker_is_reported_lost(self):
+        store = self.store()
+        snapshot = {"id": "j1", "status": "polling", "version": 3, "created_at": time.time()}
+        store.save(snapshot)
+        with mock.patch.object(time, "time", return_value=time.time() + 60):
+            lost = store.load("j1")
+            self.assertEqual([s["status"] for s in store.recent(10)], ["failed"])
+
+        self.assertEqual(lost["status"], "failed")
+        self.assertEqual(lost["version"], 3)
+        self.assertEqual(store.load("j1")["status"], "polling")  # nothing was written
+
+    async def test_late_owner_keeps_its_job(self):
+        store = self.store()
+        store.save({"id": "j1", "status": "polling", "version": 3, "created_at": time.time()})
+        with mock.patch.object(time, "time", return_value=time.time() + 60):
+            self.assertEqual(store.load("j1")["status"], "failed")
+            store.save({"id": "j1", "status": "downloading", "version": 4, "created_at": time.time()})
+
+            self.assertEqual(store.load("j1")["status"], "downloading")
+
+    async def test_lost_jobs_are_pruned_like_finished_ones(self):
+        store = VeoJobStore(self.path, retention=1, stale_after_sec=30)
+        self.addCleanup(store.close)
+        now = time.time()
+        store.save({"id": "lost", "status": "polling", "version": 1, "created_at": now - 120})
+        store.save({"id": "running", "status": "polling", "version": 1, "created_at": now - 60})
+        with mock.patch.object(time, "time", return_value=now + 60):
+            store.heartbeat(["running"])
+            store.save({"id": "done", "status": "succeeded", "version": 5, "created_at": now})
+
+        self.assertIsNone(store.load("lost"))
+        self.assertEqual(store.load("running")["status"], "polling")
+        self.assertEqual(store.load("done")["status"], "succeeded")
+
+    async def test_follower_sees_a_job_become_lost(self):
+        store = self.store()
+        store.save({"id": "j1", "status": "polling", "version": 3, "created_at": time.time()})
+        follower = VeoJobEngine(max_wait_sec=5, retention=10, store=store)
+
+        with mock.patch.object(veo_jobs_module, "REMOTE_POLL_SEC", 0.01):
+            events = follower.subscribe("j1")
+            self.assertEqual((await anext(events))["status"], "polling")
+            with mock.patch.object(time, "time", return_value=time.time() + 60):
+                final = await anext(events)
+
+        self.assertEqual((final["status"], final["version"]), ("failed", 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from backend.app.services import veo
+from backend.app.services.limiter import UpstreamOverloaded
+from backend.app.services.veo import VeoOperationPoller
+
+
+def _poller(**overrides) -> VeoOperationPoller:
+    options = dict(
+        max_rps=0,
+        min_interval_sec=0.01,
+        max_interval_sec=0.05,
+        expected_render_sec=0.02,
+        max_failures=3,
+    )
+    options.update(overrides)
+    return VeoOperationPoller(**options)
+
+
+class PollIntervalTests(unittest.TestCase):
+    def test_polls_halve_the_distance_to_the_expected_finish(self):
+        poller = _poller(min_interval_sec=2, max_interval_sec=20, expected_render_sec=60)
+
+        self.assertEqual(poller.next_interval(0), 20)  # capped
+        self.assertEqual(poller.next_interval(40), 10)
+        self.assertEqual(poller.next_interval(58), 2)  # floored
+
+    def test_overdue_operations_back_off_slowly(self):
+        poller = _poller(min_interval_sec=2, max_interval_sec=20, expected_render_sec=60)
+
+        self.assertEqual(poller.next_interval(60), 2)
+        self.assertAlmostEqual(poller.next_interval(90), 5)
+        self.assertEqual(poller.next_interval(1000), 20)
+
+    def test_expected_duration_follows_finished_renders(self):
+        poller = _poller(expected_render_sec=60)
+        poller._history.extend([30, 40, 200])
+
+        self.assertEqual(poller.expected_duration(), 40)
+
+
+class OperationPollerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.poller = _poller()
+        self.addAsyncCleanup(self.poller.shutdown)
+        self.reads: dict[str, int] = {}
+        self.results: dict[str, list] = {}
+
+    def use_upstream(self, name: str, *results) -> None:
+        """veo_get_operation returns (or raises) results in turn; the last one repeats."""
+        self.results[name] = list(results)
+        self.reads.setdefault(name, 0)
+
+        async def get_operation(operation_name: str) -> dict:
+            self.reads[operation_name] += 1
+            pending = self.results[operation_name]
+            result = pending.pop(0) if len(pending) > 1 else pending[0]
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        patch = mock.patch.object(veo, "veo_get_operation", get_operation)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def test_waiters_get_the_finished_operation(self):
+        running, done = {"name": "op", "done": False}, {"name": "op", "done": True}
+        self.use_upstream("op", running, running, done)
+        updates = []
+
+        result = await self.poller.wait("op", timeout=2, on_update=updates.append)
+
+        self.assertEqual(result, done)
+        self.assertEqual(updates, [running, running, done])
+        self.assertEqual((self.poller.completed, len(self.poller._history)), (1, 1))
+        self.assertEqual(self.poller.stats()["outstanding"], 0)
+
+    async def test_failures_retry_then_fail_the_operation(self):
+        self.use_upstream("op", RuntimeError("boom"))
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            await self.poller.wait("op", timeout=2)
+        self.assertEqual(self.reads["op"], 3)
+
+    async def test_a_successful_read_resets_the_failure_count(self):
+        running, done = {"name": "op", "done": False}, {"name": "op", "done": True}
+        self.use_upstream("op", RuntimeError("a"), RuntimeError("b"), running, RuntimeError("c"), RuntimeError("d"), done)
+
+        self.assertEqual(await self.poller.wait("op", timeout=2), done)
+        self.assertEqual(self.reads["op"], 6)
+
+    async def test_shed_polls_wait_for_retry_after_without_counting_as_failures(self):
+        self.use_upstream("op", UpstreamOverloaded("veo_poll", "queue full", 60), {"name": "op", "done": True})
+
+        latest = await self.poller.wait("op", timeout=0.2)
+
+        self.assertIsNone(latest)
+        self.assertEqual(self.reads["op"], 1)
+
+    async def test_operation_is_dropped_when_the_last_waiter_leaves(self):
+        running = {"name": "op", "done": False}
+        self.use_upstream("op", running)
+
+        first = asyncio.create_task(self.poller.wait("op", timeout=0.05))
+        second = asyncio.create_task(self.poller.wait("op", timeout=0.2))
+        self.assertEqual(await first, running)
+        self.assertEqual(self.poller.stats()["outstanding"], 1)  # second is still waiting
+
+        self.assertEqual(await second, running)
+        self.assertEqual(self.poller.stats()["outstanding"], 0)
+        reads = self.reads["op"]
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.reads["op"], reads)
+
+    async def test_shutdown_cancels_in_flight_polls(self):
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def get_operation(operation_name: str) -> dict:
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {"name": operation_name, "done": True}
+
+        with mock.patch.object(veo, "veo_get_operation", get_operation):
+            future = self.poller.watch("op")
+            await asyncio.wait_for(started.wait(), 1)
+            await self.poller.shutdown()
+
+        self.assertTrue(cancelled.is_set())
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.poller._polls, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
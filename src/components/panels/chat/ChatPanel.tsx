@@ -89,7 +89,7 @@ export function ChatPanel({ focusTab, onOpenSettings }: ChatPanelProps) {
     }
     try {
       setLoading(true, 'Generating video')
-      const { output, bundle, localVideoError } = await apiClient.generateVeoVideo(latestPrompt)
+      const { output, bundle } = await apiClient.generateVeoVideo(latestPrompt)
       const [moodAssets, storyAssets] = await Promise.all([
         mapImageAssets('mood-board', bundle.moodBoard),
         mapImageAssets('storyboard', bundle.storyboard),
@@ -100,13 +100,6 @@ export function ChatPanel({ focusTab, onOpenSettings }: ChatPanelProps) {
       setSectionData('moodBoard', moodAssets)
       setSectionData('storyboard', storyAssets)
       addFinalOutput(output)
-      if (localVideoError) {
-        addToast({
-          type: 'warning',
-          message:
-            'Video generated, but backend could not proxy-download it for local playback. Check API enablement for your key project.',
-        })
-      }
       addToast({ type: 'success', message: 'Video ready' })
       await persistSnapshot()
       focusTab('final')
@@ -125,7 +125,6 @@ export interface PromptBundle {
 export interface VeoGenerationResult {
   output: FinalOutput
   bundle: PromptBundle
-  localVideoError?: string
 }
 
 export interface FinalImageContextPayload {
@@ -187,10 +186,6 @@ export const apiClient = {
     const veo = (response.veo ?? {}) as Record<string, unknown>
     const remoteVideoUrl = String(veo.video_url ?? '')
     const localVideoUrl = String(veo.local_video_url ?? '')
-    const localVideoError =
-      typeof veo.local_video_error === 'string' && veo.local_video_error.trim().length > 0
-        ? veo.local_video_error
-        : undefined
     const videoUrl = localVideoUrl || remoteVideoUrl
     if (!videoUrl) {
       throw new Error('Veo response missing video_url')
@@ -215,7 +210,6 @@ export const apiClient = {
         moodBoard: toMoodBoard(inputs.moodboard),
         storyboard: toStoryboard(inputs.storyboard),
       },
-      localVideoError,
     }
   },
 